@@ -0,0 +1,46 @@
+"""add background job timestamps
+
+Revision ID: b41f0c2d7e9a
+Revises: 7d6caadb03a3
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b41f0c2d7e9a"
+down_revision: Union[str, Sequence[str], None] = "7d6caadb03a3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "background_jobs",
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.add_column(
+        "background_jobs",
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    # Воркеры забирают задачи запросом по (queue_name, id) среди pending
+    op.create_index(
+        "ix_background_jobs_pending",
+        "background_jobs",
+        ["queue_name", "id"],
+        unique=False,
+        postgresql_where=sa.text("status = 'pending'"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_background_jobs_pending", table_name="background_jobs")
+    op.drop_column("background_jobs", "finished_at")
+    op.drop_column("background_jobs", "started_at")
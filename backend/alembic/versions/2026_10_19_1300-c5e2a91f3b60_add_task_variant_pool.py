@@ -0,0 +1,74 @@
+"""add task variant pool
+
+Revision ID: c5e2a91f3b60
+Revises: b41f0c2d7e9a
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c5e2a91f3b60"
+down_revision: Union[str, Sequence[str], None] = "b41f0c2d7e9a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "task_variants",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("original_task_id", sa.Integer(), nullable=False),
+        sa.Column("question", sa.Text(), nullable=False),
+        sa.Column("correct_answer", sa.Text(), nullable=False),
+        sa.Column("explanation", sa.Text(), nullable=False),
+        sa.Column("question_hash", sa.String(length=64), nullable=False),
+        sa.Column("served_task_id", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True),
+        sa.Column("served_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["original_task_id"], ["tasks.id"],
+            name=op.f("fk_task_variants_original_task_id_tasks"), ondelete="CASCADE",
+        ),
+        sa.ForeignKeyConstraint(
+            ["served_task_id"], ["tasks.id"],
+            name=op.f("fk_task_variants_served_task_id_tasks"), ondelete="SET NULL",
+        ),
+        sa.PrimaryKeyConstraint("id", name=op.f("pk_task_variants")),
+        sa.UniqueConstraint("original_task_id", "question_hash", name="uq_task_variants_original_hash"),
+    )
+    op.create_index(op.f("ix_task_variants_id"), "task_variants", ["id"], unique=False)
+    # Выдача из пула ищет невыданные варианты конкретной задачи
+    op.create_index(
+        "ix_task_variants_available",
+        "task_variants",
+        ["original_task_id", "id"],
+        unique=False,
+        postgresql_where=sa.text("served_at IS NULL"),
+    )
+
+    op.create_table(
+        "task_variant_demand",
+        sa.Column("task_id", sa.Integer(), nullable=False),
+        sa.Column("requests", sa.Integer(), nullable=False),
+        sa.Column("last_requested_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["task_id"], ["tasks.id"],
+            name=op.f("fk_task_variant_demand_task_id_tasks"), ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint("task_id", name=op.f("pk_task_variant_demand")),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("task_variant_demand")
+    op.drop_index("ix_task_variants_available", table_name="task_variants")
+    op.drop_index(op.f("ix_task_variants_id"), table_name="task_variants")
+    op.drop_table("task_variants")
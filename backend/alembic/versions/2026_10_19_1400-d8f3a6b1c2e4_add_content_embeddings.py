@@ -0,0 +1,49 @@
+"""add content embeddings
+
+Revision ID: d8f3a6b1c2e4
+Revises: c5e2a91f3b60
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import pgvector
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d8f3a6b1c2e4"
+down_revision: Union[str, Sequence[str], None] = "c5e2a91f3b60"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("courses", "lectures", "tasks")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in ("lectures", "tasks"):
+        op.add_column(table, sa.Column("embedding", pgvector.sqlalchemy.vector.VECTOR(dim=1536), nullable=True))
+    for table in TABLES:
+        op.add_column(table, sa.Column("embedding_hash", sa.String(length=64), nullable=True))
+        # HNSW по косинусному расстоянию: поиск - это ORDER BY embedding <=> :query LIMIT k
+        op.create_index(
+            f"ix_{table}_embedding_hnsw",
+            table,
+            ["embedding"],
+            unique=False,
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "vector_cosine_ops"},
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in reversed(TABLES):
+        op.drop_index(f"ix_{table}_embedding_hnsw", table_name=table)
+        op.drop_column(table, "embedding_hash")
+    for table in ("tasks", "lectures"):
+        op.drop_column(table, "embedding")
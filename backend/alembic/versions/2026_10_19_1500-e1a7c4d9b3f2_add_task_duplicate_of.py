@@ -0,0 +1,36 @@
+"""add task duplicate_of
+
+Revision ID: e1a7c4d9b3f2
+Revises: d8f3a6b1c2e4
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e1a7c4d9b3f2"
+down_revision: Union[str, Sequence[str], None] = "d8f3a6b1c2e4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("tasks", sa.Column("duplicate_of_id", sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        op.f("fk_tasks_duplicate_of_id_tasks"), "tasks", "tasks",
+        ["duplicate_of_id"], ["id"], ondelete="SET NULL",
+    )
+    op.create_index(op.f("ix_tasks_duplicate_of_id"), "tasks", ["duplicate_of_id"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_tasks_duplicate_of_id"), table_name="tasks")
+    op.drop_constraint(op.f("fk_tasks_duplicate_of_id_tasks"), "tasks", type_="foreignkey")
+    op.drop_column("tasks", "duplicate_of_id")
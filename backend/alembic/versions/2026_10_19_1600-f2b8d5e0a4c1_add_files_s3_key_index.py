@@ -0,0 +1,30 @@
+"""add files s3_key index
+
+Revision ID: f2b8d5e0a4c1
+Revises: e1a7c4d9b3f2
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f2b8d5e0a4c1"
+down_revision: Union[str, Sequence[str], None] = "e1a7c4d9b3f2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Озвучка ищется по ключу объекта (хэш текста), а не по id
+    op.create_index(op.f("ix_files_s3_key"), "files", ["s3_key"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_files_s3_key"), table_name="files")
@@ -0,0 +1,30 @@
+"""add user_task_progress solved_at index
+
+Revision ID: a3c9e7f1d5b2
+Revises: f2b8d5e0a4c1
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a3c9e7f1d5b2"
+down_revision: Union[str, Sequence[str], None] = "f2b8d5e0a4c1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Выгрузка прогресса фильтруется по дате решения
+    op.create_index(op.f("ix_user_task_progress_solved_at"), "user_task_progress", ["solved_at"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_user_task_progress_solved_at"), table_name="user_task_progress")
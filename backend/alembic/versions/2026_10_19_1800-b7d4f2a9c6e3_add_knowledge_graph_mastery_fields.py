@@ -0,0 +1,44 @@
+"""add knowledge_graph mastery fields
+
+Revision ID: b7d4f2a9c6e3
+Revises: a3c9e7f1d5b2
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b7d4f2a9c6e3"
+down_revision: Union[str, Sequence[str], None] = "a3c9e7f1d5b2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("knowledge_graph", sa.Column("probability", sa.Float(), nullable=True))
+    op.add_column("knowledge_graph", sa.Column("attempts", sa.Integer(), nullable=True))
+    op.add_column(
+        "knowledge_graph",
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True),
+    )
+    # Раньше таблицу никто не заполнял, но на всякий случай оставляем одну запись на пару
+    op.execute("""
+        DELETE FROM knowledge_graph k
+        USING knowledge_graph d
+        WHERE k.user_id = d.user_id AND k.topic_id = d.topic_id AND k.id > d.id
+    """)
+    op.create_unique_constraint("uq_knowledge_graph_user_topic", "knowledge_graph", ["user_id", "topic_id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint("uq_knowledge_graph_user_topic", "knowledge_graph", type_="unique")
+    op.drop_column("knowledge_graph", "updated_at")
+    op.drop_column("knowledge_graph", "attempts")
+    op.drop_column("knowledge_graph", "probability")
@@ -0,0 +1,29 @@
+"""add background_jobs heartbeat_at
+
+Revision ID: c1e8a4d7b3f9
+Revises: b7d4f2a9c6e3
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c1e8a4d7b3f9"
+down_revision: Union[str, Sequence[str], None] = "b7d4f2a9c6e3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("background_jobs", sa.Column("heartbeat_at", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("background_jobs", "heartbeat_at")
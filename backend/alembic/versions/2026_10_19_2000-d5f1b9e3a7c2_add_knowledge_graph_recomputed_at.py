@@ -0,0 +1,29 @@
+"""add knowledge_graph recomputed_at
+
+Revision ID: d5f1b9e3a7c2
+Revises: c1e8a4d7b3f9
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d5f1b9e3a7c2"
+down_revision: Union[str, Sequence[str], None] = "c1e8a4d7b3f9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("knowledge_graph", sa.Column("recomputed_at", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("knowledge_graph", "recomputed_at")
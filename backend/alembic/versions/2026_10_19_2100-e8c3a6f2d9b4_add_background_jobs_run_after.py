@@ -0,0 +1,29 @@
+"""add background_jobs run_after
+
+Revision ID: e8c3a6f2d9b4
+Revises: d5f1b9e3a7c2
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e8c3a6f2d9b4"
+down_revision: Union[str, Sequence[str], None] = "d5f1b9e3a7c2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("background_jobs", sa.Column("run_after", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("background_jobs", "run_after")
@@ -4,6 +4,11 @@ from app.api.v1.routes import ws
 from .courses import router as courses_router
 from .topics import router as topics_router
 from .pvp import router as pvp_router
+from .jobs import router as jobs_router
+from .search import router as search_router
+from .imports import router as imports_router
+from .exports import router as exports_router
+from .knowledge import router as knowledge_router
 
 
 api_router = APIRouter()
@@ -13,3 +18,8 @@ api_router.include_router(auth.router, tags=["auth"])
 api_router.include_router(courses_router)
 api_router.include_router(topics_router, prefix="/api/v1", tags=["tasks"])
 api_router.include_router(pvp_router)
+api_router.include_router(jobs_router)
+api_router.include_router(search_router)
+api_router.include_router(imports_router)
+api_router.include_router(exports_router)
+api_router.include_router(knowledge_router)
@@ -1,20 +1,21 @@
 # app/api/v1/routes/courses.py
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
-import httpx
 from app.core.database import db_helper
 from app.api.v1.routes.auth import get_current_user 
 import os
-import re
 import logging
-import json as json_lib
 from app.models.user import User
 from app.models.content import Course, Topic, ContentUnit, Lecture, Task
 from app.models.learning import UserTaskProgress 
 from app.core.schemas.content import CourseSummary, CourseDetail, LectureSchema, TaskSchema
-from app.core.config import settings
+from app.services.job_queue import job_queue
+from app.services.task_generation import SIMILAR_TASK_JOB, task_to_response
+from app.services.variant_pool import variant_pool
+from app.services.lecture_audio import TTS_JOB, attach_existing_audio, audio_is_current, audio_job_scheduled
+from app.services.mastery import mastery_engine
 
 logger = logging.getLogger(__name__)
 
@@ -74,6 +75,8 @@ async def get_course_details(
                 unique_tasks_map = {}
                 for t in unit.lecture.tasks: unique_tasks_map[t.id] = t
                 for t in unit.tasks: unique_tasks_map[t.id] = t
+                # Дубликаты других задач на странице курса не показываем
+                unique_tasks_map = {k: t for k, t in unique_tasks_map.items() if t.duplicate_of_id is None}
                 
                 raw_tasks = list(unique_tasks_map.values())
                 
@@ -101,7 +104,7 @@ async def get_course_details(
                     tasks=tasks_data
                 ))
 
-            elif unit.tasks:
+            elif any(t.duplicate_of_id is None for t in unit.tasks):
                 tasks_data = [
                     TaskSchema(
                         id=t.id,
@@ -111,7 +114,7 @@ async def get_course_details(
                         correctAnswer=t.validation.get("correct_answer"),
                         explanation=t.explanation,
                         is_solved=(t.id in solved_task_ids)
-                    ) for t in unit.tasks
+                    ) for t in unit.tasks if t.duplicate_of_id is None
                 ]
                 
                 lectures_list.append(LectureSchema(
@@ -154,6 +157,8 @@ async def solve_task(
     )
     result = await session.execute(stmt)
     existing = result.scalar_one_or_none()
+    # Повторная отправка того же результата - не новое свидетельство об освоении
+    changed = existing is None or bool(existing.is_correct) != bool(is_correct)
 
     if existing:
         existing.is_correct = is_correct
@@ -169,185 +174,70 @@ async def solve_task(
         session.add(new_progress)
     
     await session.commit()
+    # Освоение раздела пересчитывается в фоне пачкой, ответ не ждет записи в knowledge_graph.
+    # Исправленный ответ заменяет прежний, поэтому раздел переигрывается по user_task_progress
+    if changed:
+        mastery_engine.record(current_user.id, task_id, is_correct, replay=existing is not None)
     return {"status": "success"}
 
 
-@router.post("/tasks/{task_id}/generate-similar")
+@router.get("/lectures/{lecture_id}/audio", status_code=202)
+async def get_lecture_audio(
+    lecture_id: int,
+    response: Response,
+    session: AsyncSession = Depends(db_helper.session_getter),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Озвучка лекции: ссылка на готовый MP3, если он есть для текущего текста,
+    иначе синтез в фоне (статус - GET /jobs/{job_id} или /ws/jobs)
+    """
+    stmt = select(Lecture).where(Lecture.id == lecture_id).options(selectinload(Lecture.audio))
+    lecture = (await session.execute(stmt)).scalar_one_or_none()
+    if not lecture:
+        raise HTTPException(status_code=404, detail="Lecture not found")
+
+    if audio_is_current(lecture) or await attach_existing_audio(session, lecture):
+        await session.commit()
+        response.status_code = 200
+        return {"job_id": None, "status": "done", "result": {"url": lecture.audio.url}}
+
+    job = await audio_job_scheduled(session, lecture_id, current_user.id)
+    if job is None:
+        job = await job_queue.enqueue(session, TTS_JOB, {"lecture_id": lecture_id}, user_id=current_user.id)
+    return {"job_id": job.id, "status": job.status}
+
+@router.post("/tasks/{task_id}/generate-similar", status_code=202)
 async def generate_similar_task(
     task_id: int,
+    response: Response,
     session: AsyncSession = Depends(db_helper.session_getter),
     current_user: User = Depends(get_current_user)
 ):
-    # 1. Получаем оригинальную задачу
+    """
+    Похожая задача: сразу из пула готовых вариантов, если он есть,
+    иначе генерация в фоне (статус - GET /jobs/{job_id} или /ws/jobs)
+    """
     stmt = select(Task).where(Task.id == task_id)
-    result = await session.execute(stmt)
-    original_task = result.scalar_one_or_none()
-    
+    original_task = (await session.execute(stmt)).scalar_one_or_none()
     if not original_task:
         raise HTTPException(status_code=404, detail="Task not found")
-    
-    # 2. Формируем промпт для модели (улучшенная инструкция)
-    question = original_task.content.get("question", "")
-    correct_answer = original_task.validation.get("correct_answer", "")
-    explanation = original_task.explanation or ""
-    difficulty = original_task.difficulty or 1
-    
-    prompt = f"""Ты — преподаватель олимпиадной математики. Создай НОВУЮ задачу, аналогичную приведённой ниже.
-
-### Оригинальная задача:
-Тип: {original_task.type}
-Уровень сложности: {difficulty}
-Вопрос: {question}
-Правильный ответ: {correct_answer}
-Объяснение: {explanation}
 
-### Требования:
-1. Сохрани структуру доказательства и логику решения
-2. Измени числовые параметры и контекст (имена, объекты)
-3. Задача должна быть корректной и иметь однозначное решение
-4. Объяснение должно содержать пошаговое доказательство
-5. Уровень сложности должен остаться таким же
+    demand = await variant_pool.record_request(session, task_id)
+    new_task = await variant_pool.take(session, original_task)
+    await session.commit()
 
-### КРИТИЧЕСКИ ВАЖНО:
-- Верни ТОЛЬКО ЧИСТЫЙ ВАЛИДНЫЙ JSON БЕЗ КАКИХ-ЛИБО ДОПОЛНИТЕЛЬНЫХ СИМВОЛОВ
-- НЕ ИСПОЛЬЗУЙ markdown (```, ```json)
-- НЕ ДОБАВЛЯЙ комментарии, префиксы, постфиксы
-- Используй ТОЛЬКО двойные кавычки для строк
-- Экранируй спецсимволы правильно (\\n, \\t и т.д.)
+    # Пул пополняется асинхронно в обоих случаях
+    await variant_pool.ensure_refill(session, task_id, demand)
 
-### Формат ответа (ТОЛЬКО ЭТОТ JSON):
-{{
-  "question": "Новый вопрос...",
-  "correct_answer": "Новый ответ",
-  "explanation": "Новое объяснение..."
-}}"""
+    if new_task:
+        response.status_code = 200
+        return {"job_id": None, "status": "done", "result": task_to_response(new_task)}
 
-    # 3. Отправляем запрос на локальный LLM сервер
-    try:
-        async with httpx.AsyncClient(timeout=300.0) as client:
-            response = await client.post( 
-                f"{settings.ai.llm_server_url}v1/chat/completions",
-                json={
-                    "model": "Qwen3-4B-Instruct-2507-Q4_K_M",
-                    "messages": [{"role": "user", "content": prompt}],
-                    "stream": False
-                }
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"LLM server error {response.status_code}: {response.text}")
-                raise HTTPException(
-                    status_code=500, 
-                    detail=f"LLM server error: {response.status_code}"
-                )
-            
-            # 4. ПАРСИНГ С ЗАЩИТОЙ ОТ ГРЯЗНОГО JSON (улучшенная версия)
-            llm_response = response.json()
-            raw_text = llm_response["choices"][0]["message"]["content"].strip()
-            
-            # Шаг 1: Удаляем все блоки кода ``` ... ```
-            cleaned = re.sub(r'^```(?:json|python|javascript)?\s*', '', raw_text, flags=re.MULTILINE)
-            cleaned = re.sub(r'```\s*$', '', cleaned, flags=re.MULTILINE)
-            cleaned = cleaned.strip()
-            
-            # Шаг 2: Находим границы JSON объекта (первая {{ и последняя }})
-            start_idx = cleaned.find('{')
-            end_idx = cleaned.rfind('}')
-            
-            if start_idx == -1 or end_idx == -1 or start_idx >= end_idx:
-                logger.error(f"❌ Не найдены границы JSON. Первые 500 символов ответа:\n{cleaned[:500]}")
-                raise ValueError("Не удалось найти структуру JSON в ответе модели")
-            
-            json_candidate = cleaned[start_idx:end_idx + 1]
-            
-            # Шаг 3: Пробуем распарсить с несколькими стратегиями восстановления
-            parsed = None
-            strategies = [
-                ("original", json_candidate),
-                ("fix_single_quotes", json_candidate.replace("'", '"')),
-                ("fix_trailing_commas", re.sub(r',\s*([}\]])', r'\1', json_candidate)),
-                ("fix_newlines_in_strings", re.sub(r'(?<!\\)\\n', r'\\\\n', json_candidate)),  # Экранируем \n внутри строк
-            ]
-            
-            for strategy_name, candidate in strategies:
-                try:
-                    parsed = json_lib.loads(candidate)
-                    logger.info(f"✅ JSON успешно распарсен стратегией: {strategy_name}")
-                    break
-                except json_lib.JSONDecodeError as e:
-                    logger.debug(f"Стратегия {strategy_name} не сработала: {str(e)[:100]}")
-                    continue
-            
-            if parsed is None:
-                # Финальная попытка: удаляем все не-JSON символы с краёв
-                candidate = re.sub(r'^[^{]*', '', json_candidate)
-                candidate = re.sub(r'[^}]*$', '', candidate)
-                try:
-                    parsed = json_lib.loads(candidate)
-                except Exception as e:
-                    logger.error(f"❌ Все стратегии парсинга провалились. Оригинальный ответ (первые 1000 символов):\n{raw_text[:1000]}")
-                    logger.error(f"Очищенный кандидат (первые 1000 символов):\n{json_candidate[:1000]}")
-                    raise HTTPException(
-                        status_code=500,
-                        detail=f"Не удалось распарсить JSON от модели. Ошибка: {str(e)}"
-                    )
-            
-            generated_data = parsed
-            logger.info(f"✅ Успешно сгенерирована задача: {generated_data.get('question', '')[:60]}...")
-            
-    except httpx.TimeoutException:
-        logger.error("LLM server timeout after 300 seconds")
-        raise HTTPException(
-            status_code=500,
-            detail="Generation timeout. Model is slow or overloaded."
-        )
-    except Exception as e:
-        logger.error(f"❌ Ошибка генерации задачи: {str(e)}", exc_info=True)
-        raise HTTPException(
-            status_code=500, 
-            detail=f"Generation failed: {str(e)[:150]}"
-        )
-    
-    # 5. Валидация ответа модели
-    required_fields = ["question", "correct_answer", "explanation"]
-    missing = [f for f in required_fields if f not in generated_data]
-    if missing:
-        logger.error(f"❌ Отсутствуют обязательные поля: {missing}. Полученные ключи: {list(generated_data.keys())}")
-        logger.error(f"Полный ответ модели: {generated_data}")
-        raise HTTPException(
-            status_code=500, 
-            detail=f"Model response missing fields: {', '.join(missing)}"
-        )
-    
-    # 6. Создаем новую задачу
-    new_task = Task(
-        unit_id=original_task.unit_id,
-        lecture_id=original_task.lecture_id,
-        type=original_task.type,
-        content={
-            "question": str(generated_data["question"]).strip()
-        },
-        validation={
-            "correct_answer": str(generated_data["correct_answer"]).strip()
-        },
-        explanation=str(generated_data["explanation"]).strip(),
-        difficulty=original_task.difficulty,
-        tags=original_task.tags,
-        requires_ai_check=original_task.requires_ai_check,
-        file_upload_allowed=original_task.file_upload_allowed
+    job = await job_queue.enqueue(
+        session,
+        SIMILAR_TASK_JOB,
+        {"task_id": task_id},
+        user_id=current_user.id,
     )
-    
-    session.add(new_task)
-    await session.commit()
-    await session.refresh(new_task)
-    
-    # 7. Возвращаем новую задачу
-    return {
-        "id": new_task.id,
-        "type": new_task.type,
-        "question": new_task.content.get("question", ""),
-        "options": new_task.content.get("options", []),
-        "correctAnswer": new_task.validation.get("correct_answer"),
-        "explanation": new_task.explanation,
-        "is_solved": False
-    }
\ No newline at end of file
+    return {"job_id": job.id, "status": job.status}
@@ -0,0 +1,43 @@
+# app/api/v1/routes/exports.py
+from datetime import datetime
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from app.api.v1.routes.auth import get_current_user
+from app.models.user import User, UserRole
+from app.services.data_export import DATASETS, FORMATS, ExportFilters, export_stream
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+
+@router.get("/{dataset}")
+async def export_dataset(
+    dataset: str,
+    format: Literal["jsonl", "csv", "parquet"] = Query("jsonl"),
+    course_id: Optional[int] = Query(None),
+    topic_id: Optional[int] = Query(None),
+    date_from: Optional[datetime] = Query(None, description="Только для progress: solved_at >= date_from"),
+    date_to: Optional[datetime] = Query(None, description="Только для progress: solved_at < date_to"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Потоковая выгрузка датасета (courses, lectures, tasks, progress) - только для админов.
+    Строки читаются серверным курсором порциями, ответ отдается по мере чтения.
+    """
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Admin only")
+    if dataset not in DATASETS:
+        raise HTTPException(status_code=404, detail=f"Unknown dataset, available: {', '.join(DATASETS)}")
+    filters = ExportFilters(course_id=course_id, topic_id=topic_id, date_from=date_from, date_to=date_to)
+    try:
+        body = export_stream(dataset, format, filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    # Сессию открывает сам генератор: зависимость закрыла бы ее раньше, чем закончится стрим
+    return StreamingResponse(
+        body,
+        media_type=FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{dataset}.{format}"'},
+    )
@@ -0,0 +1,32 @@
+# app/api/v1/routes/imports.py
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import db_helper
+from app.api.v1.routes.auth import get_current_user
+from app.models.user import User, UserRole
+from app.services.content_import import detect_format, import_content
+
+router = APIRouter(prefix="/import", tags=["import"])
+
+
+@router.post("/content")
+async def import_content_file(
+    file: UploadFile = File(..., description="tasks.csv парсера или JSONL с задачами и лекциями"),
+    format: Optional[Literal["csv", "jsonl"]] = Query(None, description="По умолчанию - по расширению файла"),
+    skip_invalid: bool = Query(False, description="Импортировать валидные строки, пропуская ошибочные"),
+    session: AsyncSession = Depends(db_helper.session_getter),
+    current_user: User = Depends(get_current_user)
+):
+    """Массовый импорт курсов, разделов, лекций и задач (только для админов)"""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Admin only")
+    try:
+        fmt = format or detect_format(file.filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    result = await import_content(session, file.file, fmt, skip_invalid=skip_invalid, user_id=current_user.id)
+    if result["invalid"] and not skip_invalid:
+        raise HTTPException(status_code=400, detail=result)
+    return result
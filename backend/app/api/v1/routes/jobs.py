@@ -0,0 +1,36 @@
+# app/api/v1/routes/jobs.py
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from app.core.database import db_helper
+from app.api.v1.routes.auth import get_current_user
+from app.models.user import User
+from app.models.system import BackgroundJob
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+@router.get("/{job_id}")
+async def get_job(
+    job_id: int,
+    session: AsyncSession = Depends(db_helper.session_getter),
+    current_user: User = Depends(get_current_user)
+):
+    """Статус фоновой задачи (для поллинга, если нет WebSocket)"""
+    stmt = select(BackgroundJob).where(
+        BackgroundJob.id == job_id,
+        BackgroundJob.user_id == current_user.id
+    )
+    job = (await session.execute(stmt)).scalar_one_or_none()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return {
+        "job_id": job.id,
+        "type": job.type,
+        "status": job.status,
+        "progress": job.progress,
+        "result": job.result,
+        "error_message": job.error_message if job.status == "error" else None,
+        "retry_count": job.retry_count,
+    }
@@ -0,0 +1,38 @@
+# app/api/v1/routes/knowledge.py
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import db_helper
+from app.api.v1.routes.auth import get_current_user
+from app.models.user import User, UserRole
+from app.services.job_queue import job_queue
+from app.services.mastery import RECOMPUTE_JOB, mastery_engine
+
+router = APIRouter(prefix="/knowledge", tags=["knowledge"])
+
+
+@router.get("/courses/{course_id}")
+async def get_course_mastery(
+    course_id: int,
+    session: AsyncSession = Depends(db_helper.session_getter),
+    current_user: User = Depends(get_current_user)
+):
+    """Освоение и статус (locked / open / passed) каждого раздела курса для текущего пользователя"""
+    topics = await mastery_engine.course_mastery(session, current_user.id, course_id)
+    if not topics:
+        raise HTTPException(status_code=404, detail="Course not found")
+    return {"course_id": course_id, "topics": topics}
+
+
+@router.post("/recompute", status_code=202)
+async def recompute_mastery(
+    user_id: Optional[int] = Query(None, description="Только этот пользователь; по умолчанию - все"),
+    session: AsyncSession = Depends(db_helper.session_getter),
+    current_user: User = Depends(get_current_user)
+):
+    """Ставит в фон полный пересчет освоения по истории ответов (только для админов)"""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Admin only")
+
+    job = await job_queue.enqueue(session, RECOMPUTE_JOB, {"user_id": user_id}, user_id=current_user.id)
+    return {"job_id": job.id, "status": job.status}
@@ -0,0 +1,77 @@
+# app/api/v1/routes/search.py
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Body
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import db_helper
+from app.api.v1.routes.auth import get_current_user
+from app.models.user import User, UserRole
+from app.services.embeddings import EMBED_JOB, EMBEDDING_ERRORS, SOURCES, semantic_search
+from app.services.job_queue import job_queue
+from app.services.task_dedup import DEDUP_BACKFILL_JOB
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+
+def _hit(kind: str, obj, distance: float) -> dict:
+    if kind == "course":
+        title, snippet = obj.title, obj.description
+    elif kind == "lecture":
+        title, snippet = obj.lecture_name, obj.content_md
+    else:
+        title, snippet = None, (obj.content or {}).get("question")
+    return {
+        "kind": kind,
+        "id": obj.id,
+        "title": title,
+        "snippet": (snippet or "")[:300],
+        "score": round(1 - distance, 4),
+    }
+
+
+@router.get("/")
+async def search(
+    q: str = Query(..., min_length=2, description="Текст запроса"),
+    kind: Literal["course", "lecture", "task"] = Query("course"),
+    limit: int = Query(10, ge=1, le=50),
+    session: AsyncSession = Depends(db_helper.session_getter),
+    current_user: User = Depends(get_current_user)
+):
+    """Семантический поиск по опубликованным курсам, лекциям или задачам (только для вошедших)"""
+    try:
+        rows = await semantic_search(session, q, kind=kind, limit=limit)
+    except EMBEDDING_ERRORS as e:
+        raise HTTPException(status_code=503, detail=f"Search unavailable: {e}")
+    return [_hit(kind, obj, distance) for obj, distance in rows]
+
+
+@router.post("/reindex", status_code=202)
+async def reindex(
+    kinds: Optional[List[str]] = Body(None, embed=True),
+    force: bool = Body(False, embed=True),
+    session: AsyncSession = Depends(db_helper.session_getter),
+    current_user: User = Depends(get_current_user)
+):
+    """Ставит пересчет эмбеддингов в фон (только для админов)"""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Admin only")
+    unknown = [kind for kind in kinds or [] if kind not in SOURCES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown kinds: {', '.join(unknown)}")
+
+    job = await job_queue.enqueue(
+        session, EMBED_JOB, {"kinds": kinds or list(SOURCES), "force": force}, user_id=current_user.id
+    )
+    return {"job_id": job.id, "status": job.status}
+
+
+@router.post("/dedup", status_code=202)
+async def dedup_tasks(
+    session: AsyncSession = Depends(db_helper.session_getter),
+    current_user: User = Depends(get_current_user)
+):
+    """Ставит в фон поиск дубликатов среди существующих задач (только для админов)"""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Admin only")
+
+    job = await job_queue.enqueue(session, DEDUP_BACKFILL_JOB, {}, user_id=current_user.id)
+    return {"job_id": job.id, "status": job.status}
@@ -13,6 +13,7 @@ async def get_task_count(
 ):
     """Получить количество доступных задач с фильтрацией по теме"""
     conditions = [
+        Task.duplicate_of_id.is_(None),
         Task.validation.is_not(None),
         Task.validation["correct_answer"].astext.is_not(None),
         Task.validation["correct_answer"].astext != ""
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from app.services.ws_manager import manager
+from app.services.job_notifier import job_notifier
 import json
 
 router = APIRouter(tags=["websocket"])
@@ -32,4 +33,25 @@ async def websocket_endpoint(websocket: WebSocket):
         manager.disconnect(user_id)
     except Exception as e:
         print(f"🔴 WS: Ошибка сокета для пользователя {user_id}: {e}")
-        manager.disconnect(user_id)
\ No newline at end of file
+        manager.disconnect(user_id)
+
+
+@router.websocket("/ws/jobs")
+async def jobs_websocket(websocket: WebSocket):
+    """Push-уведомления о статусе фоновых задач пользователя"""
+    token = websocket.query_params.get("token")
+    user_id = await manager.authenticate_user(token)
+
+    if not user_id:
+        await websocket.close(code=1008, reason="Invalid token")
+        return
+
+    await job_notifier.connect(websocket, user_id)
+    try:
+        while True:
+            # Клиент ничего не шлет, читаем только чтобы заметить отключение
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        job_notifier.disconnect(websocket, user_id)
@@ -57,7 +57,7 @@ class UserAdmin(ModelView, model=User):
 class CourseAdmin(ModelView, model=Course):
     column_list = [Course.id, Course.title, Course.is_published, Course.rating_avg]
     column_searchable_list = [Course.title]
-    form_excluded_columns = [Course.embedding, Course.source_data, Course.topics, Course.creator]
+    form_excluded_columns = [Course.embedding, Course.embedding_hash, Course.source_data, Course.topics, Course.creator]
     icon = "fa-solid fa-graduation-cap"
 
 class TopicAdmin(ModelView, model=Topic):
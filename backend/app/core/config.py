@@ -60,6 +60,10 @@ class PDFConfig(BaseModel):
 class VectorConfig(BaseModel):
     DIMENSION: int = Field(1536, description="Vector dimension")
     INDEX_TYPE: str = Field("hnsw", description="Vector index type")
+    EMBEDDING_MODEL: str = Field("text-embedding", description="Embedding model served by the LLM gateway")
+    EMBEDDING_BATCH_SIZE: int = Field(64, description="Texts per /v1/embeddings request")
+    EMBEDDING_TIMEOUT: int = Field(120, description="Embedding request timeout in seconds")
+    EF_SEARCH: int = Field(40, description="HNSW candidate list size at query time (recall vs latency)")
 
 class RabbitMQConfig(BaseModel):
     HOST: str = Field("rabbitmq", description="RabbitMQ host")
@@ -77,6 +81,51 @@ class RateLimitConfig(BaseModel):
     AI_EXPLANATION_LIMIT: int = Field(50, description="Max AI explanations per day")
     AI_EXPLANATION_RESET_HOURS: int = Field(24, description="Hours to reset explanation limit")
 
+class JobsConfig(BaseModel):
+    WORKERS: int = Field(4, description="Concurrent background job workers")
+    POLL_INTERVAL: float = Field(2.0, description="Seconds between polls for pending jobs")
+    STALE_AFTER: int = Field(900, description="Seconds without a heartbeat after which a processing job is requeued")
+    HEARTBEAT_INTERVAL: int = Field(60, description="Seconds between heartbeats of a running job")
+    RETRY_BACKOFF: int = Field(30, description="Seconds before the first retry of a failed job, doubled on each next retry")
+    LLM_TIMEOUT: int = Field(300, description="LLM request timeout for generation jobs in seconds")
+
+class VariantPoolConfig(BaseModel):
+    POOL_SIZE: int = Field(3, description="Pre-generated variants kept per popular task")
+    MIN_REQUESTS: int = Field(3, description="Requests within the window before a task gets a pool")
+    DEMAND_WINDOW_HOURS: int = Field(168, description="Window for counting generate-similar requests")
+    REFILL_INTERVAL: int = Field(60, description="Seconds between producer scans")
+    MAX_TASKS_PER_SCAN: int = Field(20, description="Refill jobs scheduled per scan")
+
+class TTSConfig(BaseModel):
+    SERVICE_URL: str = Field("http://tts-service:8000", description="TTS service base URL")
+    VOICE: str = Field("ru-RU-SvetlanaNeural", description="Voice for lecture narration")
+    RATE: str = Field("+0%", description="Speech rate for lecture narration")
+    TIMEOUT: int = Field(300, description="TTS request timeout in seconds")
+    STORAGE_PREFIX: str = Field("tts", description="Object storage prefix for narration audio")
+    PRERENDER_ENABLED: bool = Field(True, description="Render lecture audio in the background ahead of requests")
+    PRERENDER_INTERVAL: int = Field(600, description="Seconds between prerender passes")
+    PRERENDER_WORKERS: int = Field(2, description="Concurrent TTS requests during prerender")
+    PRERENDER_RETRIES: int = Field(3, description="Synthesis attempts per lecture before it is marked failed")
+    PRERENDER_BATCH: int = Field(50, description="Lectures scanned per prerender batch")
+    PRERENDER_RETRY_AFTER: int = Field(3600, description="Seconds before a failed lecture is rendered again (doubles per failure)")
+
+class DedupConfig(BaseModel):
+    SIMILARITY_THRESHOLD: float = Field(0.93, description="Cosine similarity at which tasks are duplicates")
+    MAX_ATTEMPTS: int = Field(3, description="Generation attempts before a duplicate is returned instead")
+    BACKFILL_BATCH: int = Field(500, description="Tasks per batch in the dedup backfill job")
+
+class MasteryConfig(BaseModel):
+    FLUSH_INTERVAL: int = Field(5, description="Seconds between flushes of buffered answers")
+    FLUSH_SIZE: int = Field(500, description="Buffered answers that trigger an early flush")
+    MAX_BUFFER: int = Field(50000, description="Answers kept in memory while the database is unavailable")
+    PRIOR: float = Field(0.2, description="BKT: probability the topic is known before any answer")
+    LEARN: float = Field(0.15, description="BKT: probability of learning the topic after an answer")
+    SLIP: float = Field(0.1, description="BKT: probability of a wrong answer when the topic is known")
+    GUESS: float = Field(0.2, description="BKT: probability of a right answer when the topic is not known")
+    PASS_THRESHOLD: float = Field(0.85, description="Mastery at which a topic is passed and the next one opens")
+    MIN_ATTEMPTS: int = Field(3, description="Answers in a topic before it can be passed")
+    RECOMPUTE_BATCH: int = Field(200, description="Users per batch in the full recompute job")
+
 # --- ОСНОВНОЙ КЛАСС SETTINGS (без telegram) ---
 
 class Settings(BaseSettings):
@@ -106,6 +155,11 @@ class Settings(BaseSettings):
     vector: VectorConfig
     rabbitmq: RabbitMQConfig
     rate_limits: RateLimitConfig
+    jobs: JobsConfig = Field(default_factory=JobsConfig)
+    variants: VariantPoolConfig = Field(default_factory=VariantPoolConfig)
+    dedup: DedupConfig = Field(default_factory=DedupConfig)
+    tts: TTSConfig = Field(default_factory=TTSConfig)
+    mastery: MasteryConfig = Field(default_factory=MasteryConfig)
 
     class Config:
         env_file = ".env"
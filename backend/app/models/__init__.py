@@ -3,7 +3,7 @@ from .base import Base
 from .user import User, UserLimits, UserRole
 from .media import File
 from .engagement import UserStats, Achievement, UserAchievement
-from .content import Course, Topic, ContentUnit, Lecture, Task
+from .content import Course, Topic, ContentUnit, Lecture, Task, TaskVariant, TaskVariantDemand
 from .learning import (
     Enrollment, 
     KnowledgeGraph, 
@@ -21,7 +21,7 @@ __all__ = [
     "User", "UserLimits", "UserRole",
     "File",
     "UserStats", "Achievement", "UserAchievement",
-    "Course", "Topic", "ContentUnit", "Lecture", "Task",
+    "Course", "Topic", "ContentUnit", "Lecture", "Task", "TaskVariant", "TaskVariantDemand",
     "Enrollment", "KnowledgeGraph", "LearningSession", "ChatMessage",
     "SolutionAnalysis", "LearningPlan",  
     "BackgroundJob", "Notification", "UserTaskProgress","PVPMatch",
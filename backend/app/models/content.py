@@ -1,5 +1,5 @@
 # app/models/content.py
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Float, Text
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Float, Text, DateTime, func, Index, UniqueConstraint, text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from .base import Base
@@ -20,6 +20,7 @@ class Course(Base):
     source_data = Column(JSONB, nullable=True)  # оригинальные данные запроса
     is_verified = Column(Boolean, default=False)  # проверенный админом
     embedding = Column(Vector(1536), nullable=True)  # для векторного поиска
+    embedding_hash = Column(String(64), nullable=True)  # sha256 текста, из которого посчитан embedding
     created_by = Column(Integer, ForeignKey("users.id"), nullable=True)  # кто создал курс
     rating_count = Column(Integer, default=0)  # количество оценок (вместо rating_avg который уже есть)
 
@@ -28,6 +29,15 @@ class Course(Base):
 
     topics = relationship("Topic", back_populates="course")
 
+    __table_args__ = (
+        Index(
+            "ix_courses_embedding_hnsw", "embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "vector_cosine_ops"},
+        ),
+    )
+
     def __str__(self):
         return self.title
 
@@ -77,6 +87,8 @@ class Lecture(Base):
     lecture_name = Column(Text, nullable=False, default="Без названия")
     tts_status = Column(String, default="none")
     audio_file_id = Column(Integer, ForeignKey("files.id"), nullable=True)
+    embedding = Column(Vector(1536), nullable=True)
+    embedding_hash = Column(String(64), nullable=True)
 
     unit = relationship("ContentUnit", back_populates="lecture")
     audio = relationship("File")
@@ -84,6 +96,15 @@ class Lecture(Base):
     # 3. Добавляем связь Лекции с задачами
     tasks = relationship("Task", back_populates="lecture")
 
+    __table_args__ = (
+        Index(
+            "ix_lectures_embedding_hnsw", "embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "vector_cosine_ops"},
+        ),
+    )
+
     def __str__(self):
         return f"{self.lecture_name}"
 
@@ -108,6 +129,10 @@ class Task(Base):
     tags = Column(ARRAY(String), nullable=True)
     requires_ai_check = Column(Boolean, default=False)
     file_upload_allowed = Column(Boolean, default=False)
+    embedding = Column(Vector(1536), nullable=True)
+    embedding_hash = Column(String(64), nullable=True)
+    # Почти дословный повтор другой задачи: такие задачи не показываются в курсах и PVP
+    duplicate_of_id = Column(Integer, ForeignKey("tasks.id", ondelete="SET NULL"), nullable=True, index=True)
 
     # 6. Связи (Обрати внимание на back_populates)
     # Здесь "tasks" (множественное число), значит в ContentUnit должно быть поле tasks
@@ -115,5 +140,45 @@ class Task(Base):
     
     # Здесь "tasks", значит в Lecture должно быть поле tasks
     lecture = relationship("Lecture", back_populates="tasks")
+
+    __table_args__ = (
+        Index(
+            "ix_tasks_embedding_hnsw", "embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "vector_cosine_ops"},
+        ),
+    )
+
     def __str__(self):
-        return f"{self.content}"
\ No newline at end of file
+        return f"{self.content}"
+
+
+class TaskVariant(Base):
+    """Заранее сгенерированный вариант задачи ("похожая задача") из пула"""
+    __tablename__ = "task_variants"
+
+    id = Column(Integer, primary_key=True, index=True)
+    original_task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), nullable=False)
+    question = Column(Text, nullable=False)
+    correct_answer = Column(Text, nullable=False)
+    explanation = Column(Text, nullable=False)
+    question_hash = Column(String(64), nullable=False)  # sha256 нормализованного текста, для дедупликации
+
+    served_task_id = Column(Integer, ForeignKey("tasks.id", ondelete="SET NULL"), nullable=True)  # задача, созданная при выдаче
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    served_at = Column(DateTime(timezone=True), nullable=True)  # NULL - вариант еще в пуле
+
+    __table_args__ = (
+        UniqueConstraint("original_task_id", "question_hash", name="uq_task_variants_original_hash"),
+        Index("ix_task_variants_available", "original_task_id", "id", postgresql_where=text("served_at IS NULL")),
+    )
+
+
+class TaskVariantDemand(Base):
+    """Частота запросов "похожей задачи" - по ней решаем, каким задачам держать пул"""
+    __tablename__ = "task_variant_demand"
+
+    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True)
+    requests = Column(Integer, nullable=False, default=0)
+    last_requested_at = Column(DateTime(timezone=True), server_default=func.now())
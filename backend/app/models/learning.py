@@ -1,5 +1,5 @@
 # app/models/learning.py
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, func, Text, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, func, Text, Boolean, Float, UniqueConstraint
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from .base import Base
@@ -25,6 +25,15 @@ class KnowledgeGraph(Base):
     mastery = Column(Integer, default=0) # 0-100%
     status = Column(String, default="locked") # locked, open, passed
 
+    probability = Column(Float, default=0.0)  # оценка BKT 0..1 без округления, mastery - она же в процентах
+    attempts = Column(Integer, default=0)  # ответов, учтенных в оценке
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    recomputed_at = Column(DateTime(timezone=True), nullable=True)  # пересчет по user_task_progress: более ранние ответы уже учтены
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "topic_id", name="uq_knowledge_graph_user_topic"),
+    )
+
 class LearningSession(Base):
     """
     Контекст чата по конкретной задаче
@@ -100,5 +109,5 @@ class UserTaskProgress(Base):
     is_correct = Column(Boolean, default=False)
     user_answer = Column(Text, nullable=True) 
     
-    solved_at = Column(DateTime(timezone=True), server_default=func.now())
+    solved_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)  # фильтр по дате при выгрузке
     
\ No newline at end of file
@@ -8,7 +8,7 @@ class File(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True) 
-    s3_key = Column(String, nullable=False) 
+    s3_key = Column(String, nullable=False, index=True)
     url = Column(String, nullable=False)    # Полная публичная ссылка
     size = Column(BigInteger, nullable=True) # Размер 
 
@@ -1,5 +1,5 @@
 # app/models/system.py
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, func, Text
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, func, Text, Index, text
 from sqlalchemy.dialects.postgresql import JSONB
 from .base import Base
 
@@ -21,6 +21,14 @@ class BackgroundJob(Base):
     queue_name = Column(String, default="default")  # имя очереди для RabbitMQ
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)  # когда воркер взял задачу
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)  # последний признак жизни воркера, по нему ищем зависшие
+    finished_at = Column(DateTime(timezone=True), nullable=True)  # когда задача завершилась (done/error)
+    run_after = Column(DateTime(timezone=True), nullable=True)  # повтор после ошибки не раньше этого времени
+
+    __table_args__ = (
+        Index("ix_background_jobs_pending", "queue_name", "id", postgresql_where=text("status = 'pending'")),
+    )
 
 class Notification(Base):
     __tablename__ = "notifications"
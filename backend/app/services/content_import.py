@@ -0,0 +1,367 @@
+# app/services/content_import.py
+import asyncio
+import csv
+import io
+import json
+import logging
+from itertools import islice
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services.embeddings import EMBED_JOB
+from app.services.job_queue import job_queue
+from app.services.task_dedup import DEDUP_BACKFILL_JOB
+
+logger = logging.getLogger(__name__)
+
+# Строк, которые читаются и валидируются за один заход перед COPY
+CHUNK_ROWS = 5000
+# Сколько ошибок валидации возвращать (остальные только считаются)
+MAX_REPORTED_ERRORS = 50
+NO = "Нет"
+DEFAULT_SECTION = "Задачи"
+
+STAGING_COLUMNS = [
+    "line", "kind", "course", "section", "lecture_name", "content_md",
+    "question", "answer", "solution", "difficulty", "tags", "requires_ai_check",
+]
+
+
+class ImportRowError(ValueError):
+    def __init__(self, line: int, message: str):
+        super().__init__(f"line {line}: {message}")
+        self.line = line
+        self.message = message
+
+
+def _cell(row: dict, key: str) -> str:
+    # Парсер экранировал переводы строк как \n, чтобы CSV читался построчно
+    return str(row.get(key) or "").replace("\\n", "\n").strip()
+
+
+def _bool(value) -> Optional[bool]:
+    if isinstance(value, bool):
+        return value
+    value = str(value or "").strip().lower()
+    if value in ("true", "1", "yes", "да"):
+        return True
+    if value in ("false", "0", "no", "нет"):
+        return False
+    return None
+
+
+def _task_record(line: int, row: dict) -> tuple:
+    """Строка формата tasks.csv (ml/task_parsing) -> строка staging-таблицы"""
+    question = _cell(row, "task_text")
+    if not question or question == NO:
+        raise ImportRowError(line, "task_text is empty")
+    course = _cell(row, "course") or _cell(row, "subject")
+    if not course:
+        raise ImportRowError(line, "subject (or course) is required")
+
+    hardness = _cell(row, "hardness")
+    try:
+        difficulty = int(float(hardness)) if hardness else 1
+    except ValueError:
+        raise ImportRowError(line, f"hardness must be a number, got {hardness!r}")
+
+    answer = _cell(row, "task_answer")
+    has_answer = _bool(row.get("has_answer"))
+    if has_answer is None:
+        has_answer = bool(answer) and answer != NO
+    solution = _cell(row, "task_solution")
+    grade = _cell(row, "grade")
+    tags = [
+        tag for tag in (
+            _cell(row, "profile"),
+            f"{grade} класс" if grade else "",
+            _cell(row, "topic"),
+            _cell(row, "subtopic"),
+            _cell(row, "source_pdf"),
+        ) if tag
+    ]
+    return (
+        line, "task", course, _cell(row, "section") or DEFAULT_SECTION, None, None,
+        question, answer if has_answer else "", None if solution in ("", NO) else solution,
+        difficulty, tags, not has_answer,
+    )
+
+
+def _lecture_record(line: int, row: dict) -> tuple:
+    """{"kind": "lecture", "course", "section", "lecture_name", "content_md"} -> строка staging-таблицы"""
+    course = _cell(row, "course") or _cell(row, "subject")
+    content_md = str(row.get("content_md") or "").strip()
+    if not course:
+        raise ImportRowError(line, "course is required")
+    if not content_md:
+        raise ImportRowError(line, "content_md is empty")
+    return (
+        line, "lecture", course, _cell(row, "section") or DEFAULT_SECTION,
+        _cell(row, "lecture_name") or "Без названия", content_md,
+        None, None, None, None, None, None,
+    )
+
+
+def _record(line: int, row: dict) -> tuple:
+    kind = row.get("kind") or "task"
+    if kind == "task":
+        return _task_record(line, row)
+    if kind == "lecture":
+        return _lecture_record(line, row)
+    raise ImportRowError(line, f"unknown kind {kind!r}")
+
+
+def iter_rows(file: BinaryIO, fmt: str) -> Iterator[Tuple[int, dict]]:
+    """(номер строки, словарь) по одной строке файла, без чтения его целиком"""
+    stream = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == "jsonl":
+        for line_no, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_no, {"__error__": f"invalid JSON ({e.msg})"}
+                continue
+            yield line_no, row if isinstance(row, dict) else {"__error__": "line is not an object"}
+    else:
+        raise ValueError(f"Unknown import format: {fmt}")
+    stream.detach()
+
+
+def detect_format(filename: str) -> str:
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    raise ValueError(f"Cannot detect format of {filename!r}, pass csv or jsonl explicitly")
+
+
+class _Validator:
+    """Превращает строки файла в записи для COPY, собирая ошибки вместо остановки"""
+
+    def __init__(self, rows: Iterator[Tuple[int, dict]]):
+        self.rows = rows
+        self.total = 0
+        self.invalid = 0
+        self.errors: List[dict] = []
+
+    def _take(self, count: int) -> List[tuple]:
+        records = []
+        for line, row in islice(self.rows, count):
+            self.total += 1
+            try:
+                if "__error__" in row:
+                    raise ImportRowError(line, row["__error__"])
+                records.append(_record(line, row))
+            except ImportRowError as e:
+                self.invalid += 1
+                if len(self.errors) < MAX_REPORTED_ERRORS:
+                    self.errors.append({"line": e.line, "error": e.message})
+        return records
+
+    async def chunks(self):
+        """Асинхронно, кусками: разбор идет в потоке и не блокирует event loop"""
+        while True:
+            before = self.total
+            records = await asyncio.to_thread(self._take, CHUNK_ROWS)
+            if records:
+                yield records
+            if self.total - before < CHUNK_ROWS:
+                return
+
+
+_NORMALIZED = "lower(regexp_replace(trim({}), '\\s+', ' ', 'g'))"
+
+# Слияние staging-таблицы с контентом. Курс ищется по названию, раздел - по названию
+# внутри курса; лекция с тем же названием в разделе и задача с тем же условием
+# (без учета регистра и пробелов) не создаются повторно, поэтому импорт идемпотентен.
+_MERGE_STATEMENTS = [
+    ("courses", """
+        WITH inserted AS (
+            INSERT INTO courses (title, is_published, rating_avg, origin_type, source_type, is_verified, rating_count)
+            SELECT DISTINCT r.course, false, 0, 'manual', 'import', false, 0
+            FROM import_rows r
+            WHERE NOT EXISTS (SELECT 1 FROM courses c WHERE c.title = r.course)
+            RETURNING 1
+        ) SELECT count(*) FROM inserted
+    """),
+    (None, """
+        CREATE TEMP TABLE import_courses ON COMMIT DROP AS
+        SELECT DISTINCT ON (c.title) c.title, c.id
+        FROM courses c
+        WHERE c.title IN (SELECT DISTINCT course FROM import_rows)
+        ORDER BY c.title, c.id
+    """),
+    ("topics", """
+        WITH inserted AS (
+            INSERT INTO topics (course_id, title, "order")
+            SELECT ic.id, s.section,
+                   COALESCE((SELECT max(t."order") FROM topics t WHERE t.course_id = ic.id), 0)
+                   + row_number() OVER (PARTITION BY ic.id ORDER BY s.first_line)
+            FROM (
+                SELECT course, section, min(line) AS first_line FROM import_rows GROUP BY course, section
+            ) s
+            JOIN import_courses ic ON ic.title = s.course
+            WHERE NOT EXISTS (SELECT 1 FROM topics t WHERE t.course_id = ic.id AND t.title = s.section)
+            RETURNING 1
+        ) SELECT count(*) FROM inserted
+    """),
+    (None, """
+        CREATE TEMP TABLE import_topics ON COMMIT DROP AS
+        SELECT DISTINCT ON (ic.title, t.title) ic.title AS course, t.title AS section, t.id AS topic_id
+        FROM topics t
+        JOIN import_courses ic ON ic.id = t.course_id
+        WHERE (ic.title, t.title) IN (SELECT DISTINCT course, section FROM import_rows)
+        ORDER BY ic.title, t.title, t.id
+    """),
+    # Id юнитов для новых лекций берутся из последовательности заранее, чтобы связать юнит и лекцию без RETURNING
+    (None, """
+        CREATE TEMP TABLE import_lectures ON COMMIT DROP AS
+        SELECT nextval(pg_get_serial_sequence('content_units', 'id')) AS unit_id, l.*
+        FROM (
+            SELECT it.topic_id, r.lecture_name, r.content_md,
+                   row_number() OVER (PARTITION BY it.topic_id ORDER BY r.line) AS position
+            FROM (
+                SELECT DISTINCT ON (course, section, lecture_name) *
+                FROM import_rows WHERE kind = 'lecture'
+                ORDER BY course, section, lecture_name, line
+            ) r
+            JOIN import_topics it ON it.course = r.course AND it.section = r.section
+            WHERE NOT EXISTS (
+                SELECT 1 FROM lectures l JOIN content_units u ON u.id = l.unit_id
+                WHERE u.topic_id = it.topic_id AND l.lecture_name = r.lecture_name
+            )
+        ) l
+    """),
+    (None, """
+        INSERT INTO content_units (id, topic_id, type, order_index, is_hidden)
+        SELECT il.unit_id, il.topic_id, 'lecture',
+               COALESCE((SELECT max(u.order_index) FROM content_units u WHERE u.topic_id = il.topic_id), -1)
+               + il.position,
+               false
+        FROM import_lectures il
+    """),
+    ("lectures", """
+        WITH inserted AS (
+            INSERT INTO lectures (unit_id, content_md, lecture_name, tts_status)
+            SELECT unit_id, content_md, lecture_name, 'none' FROM import_lectures
+            RETURNING 1
+        ) SELECT count(*) FROM inserted
+    """),
+    # Задачи раздела лежат в одном юните типа task - существующем или новом, в конце раздела
+    (None, """
+        INSERT INTO content_units (topic_id, type, order_index, is_hidden)
+        SELECT it.topic_id, 'task',
+               COALESCE((SELECT max(u.order_index) FROM content_units u WHERE u.topic_id = it.topic_id), -1) + 1,
+               false
+        FROM import_topics it
+        WHERE EXISTS (
+            SELECT 1 FROM import_rows r WHERE r.kind = 'task' AND r.course = it.course AND r.section = it.section
+        )
+        AND NOT EXISTS (SELECT 1 FROM content_units u WHERE u.topic_id = it.topic_id AND u.type = 'task')
+    """),
+    ("tasks", f"""
+        WITH inserted AS (
+            INSERT INTO tasks (unit_id, type, content, validation, difficulty, explanation, tags,
+                               requires_ai_check, file_upload_allowed)
+            SELECT tu.id, 'quiz', jsonb_build_object('question', s.question),
+                   jsonb_build_object('correct_answer', s.answer), s.difficulty, s.solution, s.tags,
+                   s.requires_ai_check, false
+            FROM (
+                SELECT DISTINCT ON (norm) *
+                FROM (SELECT *, {_NORMALIZED.format("question")} AS norm FROM import_rows WHERE kind = 'task') n
+                ORDER BY norm, line
+            ) s
+            JOIN import_topics it ON it.course = s.course AND it.section = s.section
+            JOIN LATERAL (
+                SELECT u.id FROM content_units u
+                WHERE u.topic_id = it.topic_id AND u.type = 'task'
+                ORDER BY u.id LIMIT 1
+            ) tu ON true
+            WHERE NOT EXISTS (
+                SELECT 1 FROM tasks t WHERE {_NORMALIZED.format("t.content->>'question'")} = s.norm
+            )
+            RETURNING 1
+        ) SELECT count(*) FROM inserted
+    """),
+]
+
+
+async def import_content(
+    session: AsyncSession,
+    file: BinaryIO,
+    fmt: str,
+    skip_invalid: bool = False,
+    user_id: Optional[int] = None,
+) -> dict:
+    """
+    Массовый импорт курсов, разделов, лекций и задач из CSV (формат tasks.csv парсера) или JSONL.
+
+    Файл читается и валидируется кусками, строки уходят через COPY во временную
+    таблицу, затем набор INSERT ... SELECT переносит их в контент - все в одной
+    транзакции. При ошибках валидации без skip_invalid ничего не записывается.
+    """
+    validator = _Validator(iter_rows(file, fmt))
+
+    await session.execute(text("""
+        CREATE TEMP TABLE import_rows (
+            line integer, kind text, course text, section text, lecture_name text, content_md text,
+            question text, answer text, solution text, difficulty integer, tags text[],
+            requires_ai_check boolean
+        ) ON COMMIT DROP
+    """))
+    # COPY идет через asyncpg-соединение той же сессии, поэтому попадает в ту же транзакцию
+    connection = await session.connection()
+    raw = (await connection.get_raw_connection()).driver_connection
+    async for records in validator.chunks():
+        await raw.copy_records_to_table("import_rows", records=records, columns=STAGING_COLUMNS)
+
+    result = {
+        "rows": validator.total,
+        "invalid": validator.invalid,
+        "errors": validator.errors,
+        "created": {},
+    }
+    if validator.invalid and not skip_invalid:
+        await session.rollback()
+        return result
+
+    for name, statement in _MERGE_STATEMENTS:
+        value = await session.execute(text(statement))
+        if name:
+            result["created"][name] = value.scalar_one()
+    # Каждая принятая строка либо создала лекцию/задачу, либо пропущена как уже существующая
+    staged = (await session.execute(text("""
+        SELECT count(*) FILTER (WHERE kind = 'task') AS tasks, count(*) FILTER (WHERE kind = 'lecture') AS lectures
+        FROM import_rows
+    """))).one()
+    await session.commit()
+
+    created = result["created"]
+    result["skipped"] = {
+        "tasks": staged.tasks - created["tasks"],
+        "lectures": staged.lectures - created["lectures"],
+    }
+    logger.info(
+        f"📦 Imported {validator.total} rows: {created['courses']} courses, {created['topics']} topics, "
+        f"{created['lectures']} lectures, {created['tasks']} tasks; already present: "
+        f"{result['skipped']['lectures']} lectures, {result['skipped']['tasks']} tasks"
+    )
+
+    # Новым курсам, лекциям и задачам нужны эмбеддинги для поиска; новые задачи после них
+    # проверяются на смысловые дубликаты (dedup_tasks работает только по готовым эмбеддингам)
+    if created["tasks"] or created["lectures"] or created["courses"]:
+        payload = {"kinds": ["course", "lecture", "task"], "force": False}
+        if created["tasks"]:
+            payload["then"] = DEDUP_BACKFILL_JOB
+        job = await job_queue.enqueue(session, EMBED_JOB, payload, user_id=user_id)
+        result["embed_job_id"] = job.id
+    return result
@@ -0,0 +1,266 @@
+# app/services/data_export.py
+import csv
+import importlib.util
+import io
+import json
+import logging
+from datetime import datetime
+from enum import Enum
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from sqlalchemy import Boolean, DateTime, Float, Integer, Select, func, select
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from app.core.database import db_helper
+from app.models.content import ContentUnit, Course, Lecture, Task, Topic
+from app.models.learning import UserTaskProgress
+
+logger = logging.getLogger(__name__)
+
+# Строк в одной порции курсора: столько держится в памяти и столько же уходит в один row group Parquet
+BATCH_ROWS = 5000
+FORMATS = {
+    "jsonl": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+class ExportFilters:
+    def __init__(
+        self,
+        course_id: Optional[int] = None,
+        topic_id: Optional[int] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+    ):
+        self.course_id = course_id
+        self.topic_id = topic_id
+        self.date_from = date_from
+        self.date_to = date_to
+
+
+def _task_unit():
+    # Задача лежит в юните напрямую или через лекцию - раздел и курс берутся из того юнита, что есть
+    return func.coalesce(Task.unit_id, Lecture.unit_id)
+
+
+def _by_place(stmt: Select, filters: ExportFilters) -> Select:
+    if filters.topic_id is not None:
+        stmt = stmt.where(Topic.id == filters.topic_id)
+    if filters.course_id is not None:
+        stmt = stmt.where(Topic.course_id == filters.course_id)
+    return stmt
+
+
+def courses_query(filters: ExportFilters) -> Select:
+    stmt = select(
+        Course.id, Course.title, Course.description, Course.is_published, Course.is_verified,
+        Course.origin_type, Course.source_type, Course.rating_avg, Course.rating_count, Course.created_by,
+    ).order_by(Course.id)
+    if filters.course_id is not None:
+        stmt = stmt.where(Course.id == filters.course_id)
+    if filters.topic_id is not None:
+        stmt = stmt.where(Course.id == select(Topic.course_id).where(Topic.id == filters.topic_id).scalar_subquery())
+    return stmt
+
+
+def lectures_query(filters: ExportFilters) -> Select:
+    stmt = (
+        select(
+            Lecture.id, Lecture.lecture_name, Lecture.content_md, Lecture.tts_status,
+            ContentUnit.id.label("unit_id"), Topic.id.label("topic_id"), Topic.course_id,
+        )
+        .join(ContentUnit, ContentUnit.id == Lecture.unit_id)
+        .join(Topic, Topic.id == ContentUnit.topic_id)
+        .order_by(Lecture.id)
+    )
+    return _by_place(stmt, filters)
+
+
+def tasks_query(filters: ExportFilters) -> Select:
+    stmt = (
+        select(
+            Task.id, Task.type,
+            Task.content["question"].astext.label("question"),
+            Task.validation["correct_answer"].astext.label("correct_answer"),
+            Task.explanation, Task.difficulty, Task.tags, Task.requires_ai_check, Task.duplicate_of_id,
+            Task.lecture_id, ContentUnit.id.label("unit_id"), Topic.id.label("topic_id"), Topic.course_id,
+        )
+        .outerjoin(Lecture, Lecture.id == Task.lecture_id)
+        .outerjoin(ContentUnit, ContentUnit.id == _task_unit())
+        .outerjoin(Topic, Topic.id == ContentUnit.topic_id)
+        .order_by(Task.id)
+    )
+    return _by_place(stmt, filters)
+
+
+def progress_query(filters: ExportFilters) -> Select:
+    stmt = select(
+        UserTaskProgress.id, UserTaskProgress.user_id, UserTaskProgress.task_id,
+        UserTaskProgress.is_correct, UserTaskProgress.user_answer, UserTaskProgress.solved_at,
+    ).order_by(UserTaskProgress.id)
+    if filters.course_id is not None or filters.topic_id is not None:
+        # Место задачи нужно только для фильтра - иначе прогресс читается без джойнов
+        stmt = (
+            stmt.add_columns(Topic.id.label("topic_id"), Topic.course_id)
+            .join(Task, Task.id == UserTaskProgress.task_id)
+            .outerjoin(Lecture, Lecture.id == Task.lecture_id)
+            .join(ContentUnit, ContentUnit.id == _task_unit())
+            .join(Topic, Topic.id == ContentUnit.topic_id)
+        )
+        stmt = _by_place(stmt, filters)
+    if filters.date_from is not None:
+        stmt = stmt.where(UserTaskProgress.solved_at >= filters.date_from)
+    if filters.date_to is not None:
+        stmt = stmt.where(UserTaskProgress.solved_at < filters.date_to)
+    return stmt
+
+
+class Dataset:
+    def __init__(self, build: Callable[[ExportFilters], Select], dated: bool = False):
+        self.build = build
+        self.dated = dated
+
+
+DATASETS: Dict[str, Dataset] = {
+    "courses": Dataset(courses_query),
+    "lectures": Dataset(lectures_query),
+    "tasks": Dataset(tasks_query),
+    "progress": Dataset(progress_query, dated=True),
+}
+
+
+def build_query(name: str, filters: ExportFilters) -> Select:
+    if name not in DATASETS:
+        raise ValueError(f"Unknown dataset {name!r}, available: {', '.join(DATASETS)}")
+    dataset = DATASETS[name]
+    if not dataset.dated and (filters.date_from or filters.date_to):
+        raise ValueError(f"Dataset {name!r} has no date to filter by")
+    return dataset.build(filters)
+
+
+async def stream_rows(stmt: Select) -> AsyncIterator[List[dict]]:
+    """Порции строк через серверный курсор: в памяти одновременно не больше BATCH_ROWS строк"""
+    async with db_helper.session_factory() as session:
+        result = await session.stream(stmt.execution_options(yield_per=BATCH_ROWS))
+        async for partition in result.mappings().partitions():
+            yield [{key: _plain(value) for key, value in row.items()} for row in partition]
+
+
+def _plain(value):
+    # Enum-колонки (тип задачи, статус озвучки) выгружаются значением, а не именем класса
+    return value.value if isinstance(value, Enum) else value
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _csv_value(value):
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _arrow_schema(stmt: Select):
+    """Схема Parquet по типам колонок запроса, а не по первой порции (там могут быть одни NULL)"""
+    import pyarrow as pa
+
+    fields = []
+    for column in stmt.selected_columns:
+        column_type = column.type
+        if isinstance(column_type, Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(column_type, Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column_type, Float):
+            arrow_type = pa.float64()
+        elif isinstance(column_type, DateTime):
+            arrow_type = pa.timestamp("us", tz="UTC")
+        elif isinstance(column_type, ARRAY):
+            arrow_type = pa.list_(pa.string())
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Файл для ParquetWriter, который копит записанные байты до следующей отдачи клиенту"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+async def _jsonl(stmt: Select) -> AsyncIterator[bytes]:
+    async for rows in stream_rows(stmt):
+        yield "".join(json.dumps(row, ensure_ascii=False, default=_json_default) + "\n" for row in rows).encode("utf-8")
+
+
+async def _csv(stmt: Select) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.name for column in stmt.selected_columns])
+    # BOM - чтобы Excel открыл кириллицу без вопросов о кодировке
+    yield ("﻿" + buffer.getvalue()).encode("utf-8")
+    async for rows in stream_rows(stmt):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_csv_value(value) for value in row.values()] for row in rows)
+        yield buffer.getvalue().encode("utf-8")
+
+
+async def _parquet(stmt: Select) -> AsyncIterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(stmt)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        async for rows in stream_rows(stmt):
+            # Порция курсора - один row group: память не растет с размером выгрузки
+            writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+_WRITERS = {"jsonl": _jsonl, "csv": _csv, "parquet": _parquet}
+
+
+def export_stream(name: str, fmt: str, filters: ExportFilters) -> AsyncIterator[bytes]:
+    """
+    Байты выгрузки датасета в выбранном формате. Все, что можно проверить заранее, проверяется
+    до стрима: ошибки фильтров - ValueError, недоступный формат (нет pyarrow) - RuntimeError
+    """
+    if fmt not in _WRITERS:
+        raise ValueError(f"Unknown export format {fmt!r}, available: {', '.join(_WRITERS)}")
+    if fmt == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        raise RuntimeError("Parquet export requires pyarrow")
+    stmt = build_query(name, filters)
+    logger.info(f"📤 Export {name} as {fmt}")
+    return _WRITERS[fmt](stmt)
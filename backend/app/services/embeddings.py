@@ -0,0 +1,195 @@
+# app/services/embeddings.py
+import hashlib
+import logging
+from typing import Callable, Dict, List, Optional, Sequence
+
+import httpx
+from sqlalchemy import func, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import db_helper
+from app.models.content import ContentUnit, Course, Lecture, Task, Topic
+from app.models.system import BackgroundJob
+from app.services.job_queue import job_queue
+
+logger = logging.getLogger(__name__)
+
+EMBED_JOB = "embed_content"
+# Лекции бывают длинными, а контекст эмбеддинг-модели - нет: начала лекции достаточно для поиска
+MAX_TEXT_CHARS = 4000
+# Строк, читаемых из БД за один проход
+SCAN_BATCH = 500
+# Чем заканчивается embed_texts, когда эмбеддингов нет: сервис недоступен, ответил ошибкой
+# или модель отдает векторы не той размерности (ValueError)
+EMBEDDING_ERRORS = (RuntimeError, ValueError, httpx.HTTPError)
+
+
+def course_text(course) -> str:
+    return "\n".join(filter(None, [course.title, course.description]))
+
+
+def lecture_text(lecture) -> str:
+    return "\n".join(filter(None, [lecture.lecture_name, lecture.content_md]))
+
+
+def task_text(task) -> str:
+    return (task.content or {}).get("question", "")
+
+
+def content_hash(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+class EmbeddingSource:
+    """Что эмбеддится: модель, колонки, из которых собирается текст, и сам текст"""
+
+    def __init__(self, model, columns: Sequence, build_text: Callable):
+        self.model = model
+        self.columns = columns
+        self.build_text = build_text
+
+
+SOURCES: Dict[str, EmbeddingSource] = {
+    "course": EmbeddingSource(Course, [Course.title, Course.description], course_text),
+    "lecture": EmbeddingSource(Lecture, [Lecture.lecture_name, Lecture.content_md], lecture_text),
+    "task": EmbeddingSource(Task, [Task.content], task_text),
+}
+
+
+async def embed_texts(texts: List[str]) -> List[List[float]]:
+    """Эмбеддинги через LLM-гейтвей (/v1/embeddings), батчами по EMBEDDING_BATCH_SIZE"""
+    vectors: List[List[float]] = []
+    size = settings.vector.EMBEDDING_BATCH_SIZE
+    async with httpx.AsyncClient(timeout=float(settings.vector.EMBEDDING_TIMEOUT)) as client:
+        for start in range(0, len(texts), size):
+            response = await client.post(
+                f"{settings.ai.llm_server_url}v1/embeddings",
+                json={"model": settings.vector.EMBEDDING_MODEL, "input": texts[start:start + size]},
+            )
+            if response.status_code != 200:
+                logger.error(f"Embedding server error {response.status_code}: {response.text}")
+                raise RuntimeError(f"Embedding server error: {response.status_code}")
+            data = sorted(response.json()["data"], key=lambda item: item["index"])
+            vectors.extend(item["embedding"] for item in data)
+
+    if vectors and len(vectors[0]) != settings.vector.DIMENSION:
+        raise ValueError(
+            f"Model {settings.vector.EMBEDDING_MODEL} returns {len(vectors[0])}-dim vectors, "
+            f"columns are vector({settings.vector.DIMENSION})"
+        )
+    return vectors
+
+
+async def embed_source(kind: str, force: bool = False) -> dict:
+    """Досчитывает эмбеддинги для строк, у которых текст изменился (или еще не считался)"""
+    source = SOURCES[kind]
+    model = source.model
+    last_id, embedded, skipped = 0, 0, 0
+
+    while True:
+        # Keyset-пагинация по id: чтение не замедляется к концу таблицы, сессия живет один проход
+        async with db_helper.session_factory() as session:
+            stmt = (
+                select(model.id, model.embedding_hash, *source.columns)
+                .where(model.id > last_id)
+                .order_by(model.id)
+                .limit(SCAN_BATCH)
+            )
+            rows = (await session.execute(stmt)).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        pending = []
+        for row in rows:
+            body = source.build_text(row)[:MAX_TEXT_CHARS].strip()
+            digest = content_hash(body)
+            if not body or (digest == row.embedding_hash and not force):
+                skipped += 1
+                continue
+            pending.append((row.id, body, digest))
+        if not pending:
+            continue
+
+        vectors = await embed_texts([body for _, body, _ in pending])
+        async with db_helper.session_factory() as session:
+            # Bulk UPDATE по первичному ключу - один executemany на пачку
+            await session.execute(
+                update(model),
+                [
+                    {"id": row_id, "embedding": vector, "embedding_hash": digest}
+                    for (row_id, _, digest), vector in zip(pending, vectors)
+                ],
+            )
+            await session.commit()
+        embedded += len(pending)
+
+    logger.info(f"🧭 Embedded {kind}: {embedded} updated, {skipped} unchanged")
+    return {"embedded": embedded, "skipped": skipped}
+
+
+async def embed_content_job(job: BackgroundJob, report_progress) -> dict:
+    """
+    Обработчик embed_content: payload {"kinds": [...], "force": bool, "then": job_type}.
+    then - задача, которой нужны готовые эмбеддинги (например, dedup_tasks после импорта):
+    ставится в очередь, когда все эмбеддинги посчитаны
+    """
+    kinds = job.payload.get("kinds") or list(SOURCES)
+    unknown = [kind for kind in kinds if kind not in SOURCES]
+    if unknown:
+        raise ValueError(f"Unknown embedding kinds: {', '.join(unknown)}")
+
+    result = {}
+    for index, kind in enumerate(kinds):
+        result[kind] = await embed_source(kind, force=bool(job.payload.get("force")))
+        await report_progress(int((index + 1) / len(kinds) * 100))
+
+    then = job.payload.get("then")
+    if then:
+        async with db_helper.session_factory() as session:
+            next_job = await job_queue.enqueue(session, then, {}, user_id=job.user_id)
+        result["then_job_id"] = next_job.id
+    return result
+
+
+async def semantic_search(
+    session: AsyncSession,
+    query: str,
+    kind: str = "course",
+    limit: int = 10,
+    ef_search: Optional[int] = None,
+) -> list:
+    """Ближайшие по косинусу объекты одним запросом по HNSW-индексу"""
+    vector, = await embed_texts([query])
+    source = SOURCES[kind]
+    model = source.model
+    distance = model.embedding.cosine_distance(vector).label("distance")
+
+    stmt = select(model, distance).where(model.embedding.is_not(None))
+    if model is Lecture:
+        stmt = stmt.join(ContentUnit, ContentUnit.id == Lecture.unit_id)
+    if model is Task:
+        # Задача лежит в юните напрямую или через лекцию
+        stmt = (
+            stmt.outerjoin(Lecture, Lecture.id == Task.lecture_id)
+            .join(ContentUnit, ContentUnit.id == func.coalesce(Task.unit_id, Lecture.unit_id))
+            .where(Task.duplicate_of_id.is_(None))
+        )
+    if model is not Course:
+        # Лекции и задачи видны только из опубликованных курсов и не скрытых юнитов
+        stmt = (
+            stmt.join(Topic, Topic.id == ContentUnit.topic_id)
+            .join(Course, Course.id == Topic.course_id)
+            .where(ContentUnit.is_hidden.is_not(True))
+        )
+    stmt = stmt.where(Course.is_published == True)
+    stmt = stmt.order_by(distance).limit(limit)
+
+    # Размер списка кандидатов HNSW; должен быть не меньше limit, иначе индекс вернет меньше строк
+    ef = max(ef_search or settings.vector.EF_SEARCH, limit)
+    await session.execute(text(f"SET LOCAL hnsw.ef_search = {int(ef)}"))
+    return (await session.execute(stmt)).all()
+
+
+job_queue.register(EMBED_JOB, embed_content_job)
@@ -0,0 +1,35 @@
+# app/services/job_notifier.py
+from fastapi import WebSocket
+from typing import Dict, Set
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+class JobNotifier:
+    """WebSocket-подписки пользователей на обновления их фоновых задач"""
+
+    def __init__(self):
+        self.connections: Dict[int, Set[WebSocket]] = {}
+
+    async def connect(self, websocket: WebSocket, user_id: int):
+        await websocket.accept()
+        self.connections.setdefault(user_id, set()).add(websocket)
+
+    def disconnect(self, websocket: WebSocket, user_id: int):
+        sockets = self.connections.get(user_id)
+        if sockets:
+            sockets.discard(websocket)
+            if not sockets:
+                del self.connections[user_id]
+
+    async def send(self, user_id: int, message: dict):
+        """Отправляет событие во все вкладки пользователя"""
+        for websocket in list(self.connections.get(user_id, ())):
+            try:
+                await websocket.send_text(json.dumps(message, ensure_ascii=False))
+            except Exception as e:
+                logger.debug(f"Job notification to user {user_id} failed: {e}")
+                self.disconnect(websocket, user_id)
+
+job_notifier = JobNotifier()
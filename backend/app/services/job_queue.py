@@ -0,0 +1,274 @@
+# app/services/job_queue.py
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from sqlalchemy import case, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.core.database import db_helper
+from app.models.system import BackgroundJob
+from app.services.job_notifier import job_notifier
+
+logger = logging.getLogger(__name__)
+
+ProgressCallback = Callable[[int], Awaitable[None]]
+JobHandler = Callable[[BackgroundJob, ProgressCallback], Awaitable[Any]]
+
+STALE_ERROR = "Worker stopped responding while processing the job"
+
+
+class JobFailed(Exception):
+    """Ошибка, которую повтор не исправит: задача сразу переходит в error без ретраев"""
+
+
+class JobQueue:
+    """
+    Очередь фоновых задач поверх таблицы background_jobs.
+
+    Воркеры забирают pending-задачи через SELECT ... FOR UPDATE SKIP LOCKED,
+    поэтому несколько процессов бэкенда могут разбирать одну очередь.
+    Сессия БД открыта только на время коротких обновлений статуса,
+    сама работа (например, запрос к LLM) идет без открытой сессии.
+    Пока обработчик работает, воркер обновляет heartbeat_at; зависшей
+    считается задача без heartbeat дольше stale_after, а не долгая задача.
+    Упавшая задача возвращается в очередь с паузой retry_backoff, которая
+    удваивается с каждой попыткой: сбой внешнего сервиса не сжигает все ретраи за секунды.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        workers: int = 4,
+        poll_interval: float = 2.0,
+        stale_after: int = 900,
+        heartbeat_interval: int = 60,
+        retry_backoff: int = 30,
+        queue_name: str = "default",
+    ):
+        self.session_factory = session_factory
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        # Несколько heartbeat должны успеть до порога, иначе живую задачу сочтут зависшей
+        self.heartbeat_interval = max(1, min(heartbeat_interval, stale_after // 3))
+        self.retry_backoff = retry_backoff
+        self.queue_name = queue_name
+        self.handlers: Dict[str, JobHandler] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+
+    def register(self, job_type: str, handler: JobHandler):
+        """Регистрирует обработчик для типа задачи"""
+        self.handlers[job_type] = handler
+
+    async def enqueue(
+        self,
+        session: AsyncSession,
+        job_type: str,
+        payload: dict,
+        user_id: Optional[int] = None,
+    ) -> BackgroundJob:
+        """Создает задачу и будит воркеров"""
+        job = BackgroundJob(
+            user_id=user_id,
+            type=job_type,
+            status="pending",
+            payload=payload,
+            progress=0,
+            queue_name=self.queue_name,
+        )
+        session.add(job)
+        await session.commit()
+        await session.refresh(job)
+        self._wakeup.set()
+        return job
+
+    # === Жизненный цикл ===
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._requeue_stale()))
+        logger.info(f"🧵 Job queue '{self.queue_name}' started with {self.workers} workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # === Воркеры ===
+    async def _worker(self, index: int):
+        while True:
+            try:
+                self._wakeup.clear()
+                job = await self._claim()
+                if job is None:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job worker {index} error: {e}", exc_info=True)
+                await asyncio.sleep(self.poll_interval)
+
+    async def _claim(self) -> Optional[BackgroundJob]:
+        """Атомарно забирает следующую pending-задачу"""
+        async with self.session_factory() as session:
+            stmt = (
+                select(BackgroundJob)
+                .where(
+                    BackgroundJob.status == "pending",
+                    BackgroundJob.queue_name == self.queue_name,
+                    BackgroundJob.type.in_(list(self.handlers)),
+                    or_(BackgroundJob.run_after.is_(None), BackgroundJob.run_after <= func.now()),
+                )
+                .order_by(BackgroundJob.id)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            )
+            job = (await session.execute(stmt)).scalar_one_or_none()
+            if job is None:
+                return None
+
+            job.status = "processing"
+            job.started_at = job.heartbeat_at = datetime.now(timezone.utc)
+            await session.commit()
+            return job
+
+    async def _run(self, job: BackgroundJob):
+        handler = self.handlers[job.type]
+
+        async def report_progress(progress: int):
+            await self._update(job, progress=progress, heartbeat_at=datetime.now(timezone.utc))
+
+        await self._notify(job, status="processing", progress=job.progress or 0)
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            result = await handler(job, report_progress)
+        except Exception as e:
+            retry_count = (job.retry_count or 0) + 1
+            max_retries = job.max_retries if job.max_retries is not None else 3
+            if retry_count < max_retries and not isinstance(e, JobFailed):
+                logger.warning(f"Job {job.id} ({job.type}) failed, retry {retry_count}/{max_retries}: {e}")
+                await self._update(
+                    job,
+                    status="pending",
+                    retry_count=retry_count,
+                    error_message=str(e)[:1000],
+                    run_after=self._retry_at(retry_count),
+                )
+            else:
+                logger.error(f"Job {job.id} ({job.type}) failed permanently: {e}")
+                await self._update(
+                    job,
+                    status="error",
+                    retry_count=retry_count,
+                    error_message=str(e)[:1000],
+                    finished_at=datetime.now(timezone.utc),
+                )
+            return
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+
+        await self._update(
+            job,
+            status="done",
+            progress=100,
+            result=result,
+            error_message=None,
+            finished_at=datetime.now(timezone.utc),
+        )
+
+    def _retry_at(self, retry_count: int) -> datetime:
+        """Когда можно повторить задачу: пауза удваивается с каждой попыткой"""
+        return datetime.now(timezone.utc) + timedelta(seconds=self.retry_backoff * 2 ** max(retry_count - 1, 0))
+
+    async def _update(self, job: BackgroundJob, **values):
+        """Короткая транзакция на обновление задачи + уведомление клиента"""
+        async with self.session_factory() as session:
+            await session.execute(
+                update(BackgroundJob).where(BackgroundJob.id == job.id).values(**values)
+            )
+            await session.commit()
+        for key, value in values.items():
+            setattr(job, key, value)
+        await self._notify(job, **values)
+
+    async def _heartbeat(self, job: BackgroundJob):
+        """Отмечает, что воркер жив, пока обработчик работает"""
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                async with self.session_factory() as session:
+                    await session.execute(
+                        update(BackgroundJob)
+                        .where(BackgroundJob.id == job.id, BackgroundJob.status == "processing")
+                        .values(heartbeat_at=datetime.now(timezone.utc))
+                    )
+                    await session.commit()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Job {job.id} heartbeat failed: {e}")
+
+    async def _notify(self, job: BackgroundJob, **values):
+        if not job.user_id:
+            return
+        message = {"type": "job_update", "job_id": job.id, "job_type": job.type}
+        message.update({k: v for k, v in values.items() if k in ("status", "progress", "result", "error_message")})
+        await job_notifier.send(job.user_id, message)
+
+    async def _requeue_stale(self):
+        """Возвращает в очередь задачи, чей воркер умер, не завершив их (нет heartbeat дольше stale_after)"""
+        while True:
+            await asyncio.sleep(max(self.poll_interval, 30))
+            try:
+                now = datetime.now(timezone.utc)
+                threshold = now - timedelta(seconds=self.stale_after)
+                exhausted = BackgroundJob.retry_count + 1 >= BackgroundJob.max_retries
+                async with self.session_factory() as session:
+                    result = await session.execute(
+                        update(BackgroundJob)
+                        .where(
+                            BackgroundJob.status == "processing",
+                            BackgroundJob.queue_name == self.queue_name,
+                            func.coalesce(BackgroundJob.heartbeat_at, BackgroundJob.started_at) < threshold,
+                        )
+                        .values(
+                            status=case((exhausted, "error"), else_="pending"),
+                            retry_count=BackgroundJob.retry_count + 1,
+                            error_message=STALE_ERROR,
+                            finished_at=case((exhausted, now), else_=None),
+                            run_after=now + timedelta(seconds=self.retry_backoff),
+                        )
+                        .returning(BackgroundJob.id, BackgroundJob.user_id, BackgroundJob.type, BackgroundJob.status)
+                    )
+                    stale = result.all()
+                    await session.commit()
+                if not stale:
+                    continue
+                logger.warning(f"Requeued {len(stale)} stale jobs")
+                for row in stale:
+                    # Клиент ждет задачу по WebSocket: без уведомления он не узнает, что она упала или снова в очереди
+                    job = BackgroundJob(id=row.id, user_id=row.user_id, type=row.type)
+                    await self._notify(job, status=row.status, error_message=STALE_ERROR)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Stale job check failed: {e}", exc_info=True)
+
+job_queue = JobQueue(
+    session_factory=db_helper.session_factory,
+    workers=settings.jobs.WORKERS,
+    poll_interval=settings.jobs.POLL_INTERVAL,
+    stale_after=settings.jobs.STALE_AFTER,
+    heartbeat_interval=settings.jobs.HEARTBEAT_INTERVAL,
+    retry_backoff=settings.jobs.RETRY_BACKOFF,
+)
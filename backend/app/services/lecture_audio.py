@@ -0,0 +1,365 @@
+# app/services/lecture_audio.py
+import asyncio
+import hashlib
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.core.config import settings
+from app.core.database import db_helper
+from app.models.content import Lecture
+from app.models.media import File
+from app.models.system import BackgroundJob
+from app.services.job_queue import job_queue
+from app.services.speech_text import speakable_text
+from app.services.storage import object_storage
+
+logger = logging.getLogger(__name__)
+
+TTS_JOB = "gen_tts"
+# Ключ pg_advisory_lock: пререндер идет в одном воркере, даже если бэкенд запущен в нескольких
+PRERENDER_LOCK_ID = 7_310_044
+
+
+def audio_key(text: str, voice: str, rate: str) -> str:
+    """Тот же ключ, что у кэша TTS-сервиса (ml/tts/app/cache.py): одинаковый текст - одно аудио"""
+    return hashlib.sha256(f"{voice}\x00{rate}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def narration_text(lecture: Lecture) -> str:
+    """Текст, который озвучивается для лекции: markdown без разметки, формулы словами"""
+    return speakable_text(lecture.content_md or "")
+
+
+def audio_object_key(lecture: Lecture) -> str:
+    """Ключ объекта в хранилище для текущего текста лекции"""
+    key = audio_key(narration_text(lecture), settings.tts.VOICE, settings.tts.RATE)
+    return f"{settings.tts.STORAGE_PREFIX}/{key}.mp3"
+
+
+def audio_is_current(lecture: Lecture) -> bool:
+    """Аудио есть и озвучивает именно текущий текст (после правки лекции ключ меняется)"""
+    return lecture.tts_status == "ready" and lecture.audio is not None and lecture.audio.s3_key == audio_object_key(lecture)
+
+
+async def attach_existing_audio(session: AsyncSession, lecture: Lecture) -> Optional[File]:
+    """Привязывает уже загруженное аудио с тем же ключом (тот же текст у другой лекции или прошлый рендер)"""
+    stmt = select(File).where(File.s3_key == audio_object_key(lecture)).limit(1)
+    audio = (await session.execute(stmt)).scalar_one_or_none()
+    if audio:
+        lecture.audio_file_id = audio.id
+        lecture.audio = audio
+        lecture.tts_status = "ready"
+    return audio
+
+
+async def synthesize(text: str, client: Optional[httpx.AsyncClient] = None) -> bytes:
+    payload = {"text": text, "voice": settings.tts.VOICE, "rate": settings.tts.RATE}
+    if client is None:
+        async with httpx.AsyncClient(timeout=float(settings.tts.TIMEOUT)) as client:
+            response = await client.post(f"{settings.tts.SERVICE_URL}/tts/text", json=payload)
+    else:
+        response = await client.post(f"{settings.tts.SERVICE_URL}/tts/text", json=payload)
+    if response.status_code != 200:
+        logger.error(f"TTS service error {response.status_code}: {response.text[:500]}")
+        raise RuntimeError(f"TTS service error: {response.status_code}")
+    logger.info(f"🔊 TTS {response.headers.get('X-Cache', 'miss')}: {len(response.content)} bytes")
+    return response.content
+
+
+async def render_lecture_audio(lecture_id: int) -> dict:
+    """Озвучивает лекцию, если аудио для ее текущего текста еще нет, и привязывает его к лекции"""
+    async with db_helper.session_factory() as session:
+        stmt = select(Lecture).where(Lecture.id == lecture_id).options(selectinload(Lecture.audio))
+        lecture = (await session.execute(stmt)).scalar_one_or_none()
+        if not lecture:
+            raise ValueError(f"Lecture {lecture_id} not found")
+        if audio_is_current(lecture) or await attach_existing_audio(session, lecture):
+            await session.commit()
+            return {"file_id": lecture.audio.id, "url": lecture.audio.url, "synthesized": False}
+
+        text = narration_text(lecture)
+        s3_key = audio_object_key(lecture)
+        lecture.tts_status = "processing"
+        await session.commit()
+
+    try:
+        if not text:
+            raise ValueError(f"Lecture {lecture_id} has no text")
+        # Синтез и загрузка идут без открытой сессии БД
+        data = await synthesize(text)
+        url = await object_storage.put_bytes(s3_key, data, content_type="audio/mpeg")
+    except Exception:
+        async with db_helper.session_factory() as session:
+            lecture = await session.get(Lecture, lecture_id)
+            lecture.tts_status = "failed"
+            await session.commit()
+        raise
+
+    async with db_helper.session_factory() as session:
+        lecture = await session.get(Lecture, lecture_id)
+        # Ту же озвучку могла параллельно загрузить другая лекция с тем же текстом
+        audio = (await session.execute(select(File).where(File.s3_key == s3_key).limit(1))).scalar_one_or_none()
+        if audio is None:
+            audio = File(
+                s3_key=s3_key,
+                url=url,
+                size=len(data),
+                file_type="audio",
+                file_metadata={"voice": settings.tts.VOICE, "rate": settings.tts.RATE},
+            )
+            session.add(audio)
+            await session.flush()
+        lecture.audio_file_id = audio.id
+        lecture.tts_status = "ready"
+        await session.commit()
+        return {"file_id": audio.id, "url": audio.url, "synthesized": True}
+
+
+async def audio_job_scheduled(session: AsyncSession, lecture_id: int, user_id: int) -> Optional[BackgroundJob]:
+    """Незавершенная озвучка лекции, поставленная этим пользователем (статус чужих задач ему не виден)"""
+    stmt = select(BackgroundJob).where(
+        BackgroundJob.type == TTS_JOB,
+        BackgroundJob.user_id == user_id,
+        BackgroundJob.status.in_(("pending", "processing")),
+        BackgroundJob.payload["lecture_id"].astext == str(lecture_id),
+    ).limit(1)
+    return (await session.execute(stmt)).scalar_one_or_none()
+
+
+async def tts_job(job: BackgroundJob, report_progress) -> dict:
+    """Обработчик gen_tts: payload = {"lecture_id": ...}"""
+    return await render_lecture_audio(job.payload["lecture_id"])
+
+
+class AudioPrerenderer:
+    """
+    Фоновая озвучка лекций заранее, до первого запроса пользователя.
+
+    Периодически проходит лекции по id пачками и выбирает те, у которых нет аудио
+    (tts_status="none"), аудио устарело после правки текста или рендер завис
+    в "processing" без живой задачи gen_tts. Одинаковые тексты озвучиваются один раз,
+    синтез идет пулом воркеров с повторами, строки обновляются пачкой.
+    Лекции в "failed" повторяются через retry_after секунд (с удвоением при новых
+    неудачах, не чаще раза в сутки) или сразу, если текст лекции с тех пор изменился.
+    """
+
+    def __init__(
+        self,
+        interval: int = 600,
+        workers: int = 2,
+        retries: int = 3,
+        batch_size: int = 50,
+        retry_after: int = 3600,
+    ):
+        self.interval = interval
+        self.workers = workers
+        self.retries = retries
+        self.batch_size = batch_size
+        self.retry_after = retry_after
+        # lecture_id -> (ключ неудачного рендера, неудач подряд, monotonic-время последней);
+        # после перезапуска память пуста и failed-лекции пробуются сразу
+        self._failures: Dict[int, Tuple[str, int, float]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Audio prerender failed: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> dict:
+        stats = {"rendered": 0, "attached": 0, "failed": 0}
+        async with db_helper.engine.connect() as lock_conn:
+            locked = (await lock_conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": PRERENDER_LOCK_ID}
+            )).scalar()
+            # Блокировка сессионная: транзакцию можно закрыть, соединение держим до конца прохода
+            await lock_conn.commit()
+            if not locked:
+                return stats
+            try:
+                last_id = 0
+                async with httpx.AsyncClient(timeout=float(settings.tts.TIMEOUT)) as client:
+                    while True:
+                        candidates, last_id = await self._scan(last_id)
+                        if last_id is None:
+                            break
+                        if candidates:
+                            await self._process(client, candidates, stats)
+            finally:
+                await lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": PRERENDER_LOCK_ID})
+                await lock_conn.commit()
+
+        if any(stats.values()):
+            logger.info(
+                f"🔊 Audio prerender: {stats['rendered']} rendered, "
+                f"{stats['attached']} attached, {stats['failed']} failed"
+            )
+        return stats
+
+    async def _scan(self, last_id: int):
+        """Следующая пачка лекций -> (кандидаты {lecture_id: (s3_key, текст)}, последний id или None)"""
+        stmt = (
+            select(Lecture.id, Lecture.content_md, Lecture.tts_status, File.s3_key)
+            .outerjoin(File, File.id == Lecture.audio_file_id)
+            .where(Lecture.id > last_id)
+            .order_by(Lecture.id)
+            .limit(self.batch_size)
+        )
+        async with db_helper.session_factory() as session:
+            rows = (await session.execute(stmt)).all()
+            if not rows:
+                return {}, None
+
+            candidates: Dict[int, tuple] = {}
+            processing = []
+            for row in rows:
+                body = narration_text(row)
+                if not body:
+                    continue
+                s3_key = audio_object_key(row)
+                if row.tts_status == "ready" and row.s3_key == s3_key:
+                    continue
+                if row.tts_status == "failed" and self._backing_off(row.id, s3_key):
+                    continue
+                if row.tts_status == "processing":
+                    processing.append(row.id)
+                candidates[row.id] = (s3_key, body)
+
+            if processing:
+                # "processing" с живой задачей gen_tts - рендер уже идет по запросу пользователя
+                active = await session.execute(
+                    select(BackgroundJob.payload["lecture_id"].astext).where(
+                        BackgroundJob.type == TTS_JOB,
+                        BackgroundJob.status.in_(("pending", "processing")),
+                        BackgroundJob.payload["lecture_id"].astext.in_([str(i) for i in processing]),
+                    )
+                )
+                for lecture_id, in active:
+                    candidates.pop(int(lecture_id), None)
+        return candidates, rows[-1].id
+
+    def _backing_off(self, lecture_id: int, s3_key: str) -> bool:
+        """Рано повторять упавший рендер: тот же текст и пауза после последней неудачи не прошла"""
+        failure = self._failures.get(lecture_id)
+        if failure is None or failure[0] != s3_key:
+            return False
+        _, count, failed_at = failure
+        delay = min(self.retry_after * 2 ** (count - 1), 86400)
+        return time.monotonic() - failed_at < delay
+
+    async def _process(self, client: httpx.AsyncClient, candidates: Dict[int, tuple], stats: dict):
+        by_key: Dict[str, List[int]] = defaultdict(list)
+        texts: Dict[str, str] = {}
+        for lecture_id, (s3_key, body) in candidates.items():
+            by_key[s3_key].append(lecture_id)
+            texts[s3_key] = body
+
+        async with db_helper.session_factory() as session:
+            # Аудио с тем же ключом уже загружено (тот же текст у другой лекции) - только привязываем
+            existing = dict((await session.execute(
+                select(File.s3_key, File.id).where(File.s3_key.in_(list(by_key)))
+            )).all())
+            updates = [
+                {"id": lecture_id, "audio_file_id": existing[s3_key], "tts_status": "ready"}
+                for s3_key in existing for lecture_id in by_key.pop(s3_key)
+            ]
+            for row in updates:
+                self._failures.pop(row["id"], None)
+            updates += [
+                {"id": lecture_id, "tts_status": "processing"}
+                for ids in by_key.values() for lecture_id in ids
+            ]
+            if updates:
+                await session.execute(update(Lecture), updates)
+                await session.commit()
+            stats["attached"] += len(updates) - sum(len(ids) for ids in by_key.values())
+        if not by_key:
+            return
+
+        semaphore = asyncio.Semaphore(self.workers)
+
+        async def render(s3_key: str):
+            async with semaphore:
+                return await self._render(client, s3_key, texts[s3_key])
+
+        results = await asyncio.gather(*(render(s3_key) for s3_key in by_key), return_exceptions=True)
+
+        async with db_helper.session_factory() as session:
+            updates = []
+            for s3_key, result in zip(list(by_key), results):
+                if isinstance(result, Exception):
+                    logger.error(f"Prerender {s3_key} failed for lectures {by_key[s3_key]}: {result}")
+                    updates += [{"id": lecture_id, "tts_status": "failed"} for lecture_id in by_key[s3_key]]
+                    stats["failed"] += len(by_key[s3_key])
+                    for lecture_id in by_key[s3_key]:
+                        previous = self._failures.get(lecture_id)
+                        count = previous[1] + 1 if previous and previous[0] == s3_key else 1
+                        self._failures[lecture_id] = (s3_key, count, time.monotonic())
+                    continue
+                url, size = result
+                audio = File(
+                    s3_key=s3_key,
+                    url=url,
+                    size=size,
+                    file_type="audio",
+                    file_metadata={"voice": settings.tts.VOICE, "rate": settings.tts.RATE},
+                )
+                session.add(audio)
+                await session.flush()
+                updates += [
+                    {"id": lecture_id, "audio_file_id": audio.id, "tts_status": "ready"}
+                    for lecture_id in by_key[s3_key]
+                ]
+                for lecture_id in by_key[s3_key]:
+                    self._failures.pop(lecture_id, None)
+                stats["rendered"] += len(by_key[s3_key])
+            await session.execute(update(Lecture), updates)
+            await session.commit()
+
+    async def _render(self, client: httpx.AsyncClient, s3_key: str, body: str) -> tuple:
+        """Синтез и загрузка в хранилище с повторами; возвращает (url, размер)"""
+        for attempt in range(1, self.retries + 1):
+            try:
+                if not await object_storage.exists(s3_key):
+                    data = await synthesize(body, client=client)
+                    url = await object_storage.put_bytes(s3_key, data, content_type="audio/mpeg")
+                    return url, len(data)
+                # Объект остался от прохода, упавшего до записи в БД
+                return object_storage.public_url(s3_key), None
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                delay = 2 ** attempt
+                logger.warning(f"Prerender {s3_key} attempt {attempt} failed: {e}, retry in {delay}s")
+                await asyncio.sleep(delay)
+
+
+audio_prerenderer = AudioPrerenderer(
+    interval=settings.tts.PRERENDER_INTERVAL,
+    workers=settings.tts.PRERENDER_WORKERS,
+    retries=settings.tts.PRERENDER_RETRIES,
+    batch_size=settings.tts.PRERENDER_BATCH,
+    retry_after=settings.tts.PRERENDER_RETRY_AFTER,
+)
+job_queue.register(TTS_JOB, tts_job)
@@ -0,0 +1,413 @@
+# app/services/mastery.py
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, func, select, text, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import db_helper
+from app.models.content import ContentUnit, Lecture, Task, Topic
+from app.models.learning import KnowledgeGraph, UserTaskProgress
+from app.models.system import BackgroundJob
+from app.services.job_queue import job_queue
+
+logger = logging.getLogger(__name__)
+
+RECOMPUTE_JOB = "recompute_mastery"
+
+LOCKED, OPEN, PASSED = "locked", "open", "passed"
+UQ_USER_TOPIC = "uq_knowledge_graph_user_topic"
+# Класс pg_advisory_xact_lock(класс, user_id): flush и пересчет одного пользователя не идут одновременно
+MASTERY_LOCK_ID = 7_310_050
+
+# (user_id, task_id, is_correct, replay, recorded_at) - ответ в порядке поступления;
+# replay - ответ на задачу изменился, раздел надо переиграть по user_task_progress
+Event = Tuple[int, int, bool, bool, datetime]
+
+_LOCK_USERS = text("""
+    SELECT pg_advisory_xact_lock(:key, u.id)
+    FROM (SELECT unnest(CAST(:user_ids AS integer[])) AS id ORDER BY 1) u
+""")
+
+
+def _join_topic(stmt):
+    """Раздел и курс ответа: задача лежит в юните напрямую или через лекцию"""
+    return (
+        stmt.join(Task, Task.id == UserTaskProgress.task_id)
+        .outerjoin(Lecture, Lecture.id == Task.lecture_id)
+        .join(ContentUnit, ContentUnit.id == func.coalesce(Task.unit_id, Lecture.unit_id))
+        .join(Topic, Topic.id == ContentUnit.topic_id)
+    )
+
+
+class MasteryEngine:
+    """
+    Освоение разделов по ответам на задачи (Bayesian Knowledge Tracing).
+
+    Каждая задача - одно свидетельство, как и строка user_task_progress: первый
+    ответ сдвигает вероятность того, что раздел освоен, - без пересчета по всей
+    истории; исправленный ответ заменяет прежний, и раздел переигрывается по
+    user_task_progress так же, как при полном пересчете. Ответы копятся в памяти
+    и пишутся в knowledge_graph пачкой раз в flush_interval секунд или при
+    flush_size ответах; строки пачки блокируются FOR UPDATE, поэтому несколько
+    воркеров не теряют обновлений. Flush и пересчет берут advisory-блокировку
+    пользователя, а ответы из буферов, записанные раньше пересчета строки
+    (recomputed_at), пропускаются - пересчет их уже учел.
+    Чтение освоения - одна строка по (user_id, topic_id).
+
+    Статусы: первый раздел курса открыт; раздел пройден, когда освоение
+    достигло pass_threshold хотя бы за min_attempts ответов; пройденный раздел
+    открывает следующий по order. Новые ошибки не закрывают пройденный раздел,
+    статус может снять только переигровка.
+    """
+
+    def __init__(
+        self,
+        prior: float = 0.2,
+        learn: float = 0.15,
+        slip: float = 0.1,
+        guess: float = 0.2,
+        pass_threshold: float = 0.85,
+        min_attempts: int = 3,
+        flush_interval: int = 5,
+        flush_size: int = 500,
+        max_buffer: int = 50000,
+        recompute_batch: int = 200,
+    ):
+        self.prior = prior
+        self.learn = learn
+        self.slip = slip
+        self.guess = guess
+        self.pass_threshold = pass_threshold
+        self.min_attempts = min_attempts
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_buffer = max_buffer
+        self.recompute_batch = recompute_batch
+        self._buffer: List[Event] = []
+        # task_id -> (topic_id, course_id); задачи между разделами почти не переезжают
+        self._places: Dict[int, Tuple[int, int]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    # === Модель ===
+    def update(self, probability: float, is_correct: bool) -> float:
+        """Один шаг BKT: апостериорная вероятность по ответу, затем шанс выучить раздел"""
+        if is_correct:
+            known = probability * (1 - self.slip)
+            posterior = known / (known + (1 - probability) * self.guess)
+        else:
+            known = probability * self.slip
+            posterior = known / (known + (1 - probability) * (1 - self.guess))
+        return posterior + (1 - posterior) * self.learn
+
+    def _apply(self, row: KnowledgeGraph, is_correct: bool) -> bool:
+        """Учитывает ответ в строке; True, если раздел только что пройден"""
+        probability = row.probability if row.probability is not None else self.prior
+        row.probability = self.update(probability, is_correct)
+        row.attempts = (row.attempts or 0) + 1
+        row.mastery = round(row.probability * 100)
+        if row.status != PASSED and row.attempts >= self.min_attempts and row.probability >= self.pass_threshold:
+            row.status = PASSED
+            return True
+        return False
+
+    def _new_row(
+        self, user_id: int, topic_id: int, status: str = LOCKED, recomputed_at: Optional[datetime] = None
+    ) -> dict:
+        return {
+            "user_id": user_id,
+            "topic_id": topic_id,
+            "probability": self.prior,
+            "mastery": round(self.prior * 100),
+            "attempts": 0,
+            "status": status,
+            "recomputed_at": recomputed_at,
+        }
+
+    @staticmethod
+    async def _lock_users(session: AsyncSession, user_ids: Iterable[int]):
+        """Блокировки до конца транзакции, по возрастанию user_id - без дедлоков между воркерами"""
+        await session.execute(_LOCK_USERS, {"key": MASTERY_LOCK_ID, "user_ids": sorted(set(user_ids))})
+
+    @staticmethod
+    def _to_open(
+        answered: Iterable[Tuple[int, int]],
+        passed: Iterable[Tuple[int, int, int]],
+        order: Dict[int, List[int]],
+    ) -> Set[Tuple[int, int]]:
+        """Пары (user_id, topic_id), которые надо открыть: первый раздел курса и следующий за пройденным"""
+        opened = set()
+        for user_id, course_id in answered:
+            if order.get(course_id):
+                opened.add((user_id, order[course_id][0]))
+        for user_id, course_id, topic_id in passed:
+            topics = order.get(course_id, [])
+            if topic_id in topics and topics.index(topic_id) + 1 < len(topics):
+                opened.add((user_id, topics[topics.index(topic_id) + 1]))
+        return opened
+
+    # === Запись ответов ===
+    def record(self, user_id: int, task_id: int, is_correct: bool, replay: bool = False):
+        """
+        Ставит ответ в буфер; в базу он попадет при ближайшем flush.
+        Вызывается только для нового ответа на задачу (replay=False) или для
+        изменившегося (replay=True); повтор того же результата не учитывается.
+        """
+        self._buffer.append((user_id, task_id, bool(is_correct), replay, datetime.now(timezone.utc)))
+        if len(self._buffer) >= self.flush_size:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """Пишет накопленные ответы; при ошибке они возвращаются в буфер до следующей попытки"""
+        async with self._flush_lock:
+            events, self._buffer = self._buffer, []
+            if not events:
+                return 0
+            try:
+                async with db_helper.session_factory() as session:
+                    await self._apply_events(session, events)
+                    await session.commit()
+            except BaseException:
+                self._buffer[:0] = events
+                if len(self._buffer) > self.max_buffer:
+                    dropped = len(self._buffer) - self.max_buffer
+                    del self._buffer[:dropped]
+                    logger.error(f"❌ Mastery buffer overflow: {dropped} answers dropped, run {RECOMPUTE_JOB}")
+                raise
+        return len(events)
+
+    async def _task_places(self, session: AsyncSession, task_ids: Set[int]) -> Dict[int, Tuple[int, int]]:
+        missing = task_ids - self._places.keys()
+        if missing:
+            stmt = (
+                select(Task.id, Topic.id, Topic.course_id)
+                .outerjoin(Lecture, Lecture.id == Task.lecture_id)
+                .join(ContentUnit, ContentUnit.id == func.coalesce(Task.unit_id, Lecture.unit_id))
+                .join(Topic, Topic.id == ContentUnit.topic_id)
+                .where(Task.id.in_(missing))
+            )
+            if len(self._places) > 100_000:
+                self._places.clear()
+            for task_id, topic_id, course_id in (await session.execute(stmt)).all():
+                self._places[task_id] = (topic_id, course_id)
+        return {task_id: self._places[task_id] for task_id in task_ids if task_id in self._places}
+
+    @staticmethod
+    async def _course_order(session: AsyncSession, course_ids: Set[int]) -> Dict[int, List[int]]:
+        stmt = select(Topic.course_id, Topic.id).where(Topic.course_id.in_(course_ids)).order_by(Topic.course_id, Topic.order, Topic.id)
+        order: Dict[int, List[int]] = {}
+        for course_id, topic_id in (await session.execute(stmt)).all():
+            order.setdefault(course_id, []).append(topic_id)
+        return order
+
+    async def _apply_events(self, session: AsyncSession, events: List[Event]):
+        places = await self._task_places(session, {task_id for _, task_id, _, _, _ in events})
+        # Задачи вне разделов (импорт без юнита, удаленные) в освоение не идут
+        placed = [
+            (user_id, places[task_id], is_correct, replay, recorded_at)
+            for user_id, task_id, is_correct, replay, recorded_at in events
+            if task_id in places
+        ]
+        if not placed:
+            return
+
+        await self._lock_users(session, (user_id for user_id, *_ in placed))
+        pairs = sorted({(user_id, topic_id) for user_id, (topic_id, _), *_ in placed})
+        await session.execute(
+            insert(KnowledgeGraph).on_conflict_do_nothing(constraint=UQ_USER_TOPIC),
+            [self._new_row(user_id, topic_id) for user_id, topic_id in pairs],
+        )
+        stmt = (
+            select(KnowledgeGraph)
+            .where(tuple_(KnowledgeGraph.user_id, KnowledgeGraph.topic_id).in_(pairs))
+            .order_by(KnowledgeGraph.user_id, KnowledgeGraph.topic_id)
+            .with_for_update()
+        )
+        rows = {(row.user_id, row.topic_id): row for row in (await session.execute(stmt)).scalars()}
+
+        passed = []
+        # Переигровка читает уже закоммиченные ответы, в том числе те, что еще лежат в этой пачке
+        replayed = {(user_id, place) for user_id, place, _, replay, _ in placed if replay}
+        for user_id, (topic_id, course_id) in sorted(replayed):
+            if await self._replay_topic(session, rows[(user_id, topic_id)]):
+                passed.append((user_id, course_id, topic_id))
+        for user_id, (topic_id, course_id), is_correct, _, recorded_at in placed:
+            row = rows[(user_id, topic_id)]
+            if (user_id, (topic_id, course_id)) in replayed:
+                continue
+            if row.recomputed_at is not None and recorded_at <= row.recomputed_at:
+                continue  # ответ уже был в user_task_progress, когда строку пересчитали
+            if self._apply(row, is_correct):
+                passed.append((user_id, course_id, topic_id))
+
+        answered = {(user_id, course_id) for user_id, (_, course_id), *_ in placed}
+        order = await self._course_order(session, {course_id for _, course_id in answered})
+        opened = self._to_open(answered, passed, order)
+        if opened:
+            stmt = insert(KnowledgeGraph)
+            await session.execute(
+                stmt.on_conflict_do_update(
+                    constraint=UQ_USER_TOPIC,
+                    set_={"status": OPEN},
+                    where=KnowledgeGraph.status == LOCKED,
+                ),
+                [self._new_row(user_id, topic_id, OPEN) for user_id, topic_id in sorted(opened)],
+            )
+        if passed:
+            logger.info(f"🎓 Topics passed: {len(passed)}, opened: {len(opened)}")
+
+    async def _replay_topic(self, session: AsyncSession, row: KnowledgeGraph) -> bool:
+        """Пересчитывает строку по всем ответам пользователя в разделе; True, если раздел стал пройденным"""
+        stmt = _join_topic(
+            select(UserTaskProgress.is_correct)
+            .where(UserTaskProgress.user_id == row.user_id, Topic.id == row.topic_id)
+            .order_by(UserTaskProgress.solved_at, UserTaskProgress.id)
+        )
+        was_passed = row.status == PASSED
+        row.recomputed_at = datetime.now(timezone.utc)
+        row.probability, row.attempts, row.mastery = self.prior, 0, round(self.prior * 100)
+        if was_passed:
+            row.status = OPEN
+        passed = False
+        for is_correct in (await session.execute(stmt)).scalars():
+            passed = self._apply(row, bool(is_correct)) or passed
+        return passed and not was_passed
+
+    # === Чтение ===
+    async def topic_mastery(self, session: AsyncSession, user_id: int, topic_id: int) -> Optional[KnowledgeGraph]:
+        stmt = select(KnowledgeGraph).where(KnowledgeGraph.user_id == user_id, KnowledgeGraph.topic_id == topic_id)
+        return (await session.execute(stmt)).scalar_one_or_none()
+
+    async def course_mastery(self, session: AsyncSession, user_id: int, course_id: int) -> List[dict]:
+        """Разделы курса по порядку с освоением и статусом; без записи - первый открыт, остальные закрыты"""
+        stmt = (
+            select(Topic.id, Topic.title, KnowledgeGraph.mastery, KnowledgeGraph.status, KnowledgeGraph.attempts)
+            .outerjoin(KnowledgeGraph, (KnowledgeGraph.topic_id == Topic.id) & (KnowledgeGraph.user_id == user_id))
+            .where(Topic.course_id == course_id)
+            .order_by(Topic.order, Topic.id)
+        )
+        rows = (await session.execute(stmt)).all()
+        return [
+            {
+                "topic_id": row.id,
+                "title": row.title,
+                "mastery": row.mastery or 0,
+                "attempts": row.attempts or 0,
+                "status": row.status or (OPEN if i == 0 else LOCKED),
+            }
+            for i, row in enumerate(rows)
+        ]
+
+    # === Полный пересчет ===
+    async def recompute_job(self, job: BackgroundJob, report_progress) -> dict:
+        """
+        Обработчик recompute_mastery: переигрывает user_task_progress по порядку решения
+        и перезаписывает knowledge_graph пачками пользователей. Нужен для бэкфилла и
+        после смены параметров модели; в обычной работе хватает инкрементальных обновлений.
+        """
+        await self.flush()
+        only_user = job.payload.get("user_id")
+        users = select(UserTaskProgress.user_id).distinct()
+        if only_user is not None:
+            users = users.where(UserTaskProgress.user_id == only_user)
+
+        async with db_helper.session_factory() as session:
+            total = (await session.execute(select(func.count()).select_from(users.subquery()))).scalar() or 0
+
+        last_user, done, written = 0, 0, 0
+        while True:
+            async with db_helper.session_factory() as session:
+                batch = (await session.execute(
+                    users.where(UserTaskProgress.user_id > last_user).order_by(UserTaskProgress.user_id).limit(self.recompute_batch)
+                )).scalars().all()
+                if not batch:
+                    break
+                last_user = batch[-1]
+                written += await self._recompute_users(session, batch)
+                await session.commit()
+            done += len(batch)
+            await report_progress(min(99, int(done / total * 100)) if total else 99)
+
+        logger.info(f"🎓 Mastery recomputed: {done} users, {written} topic rows")
+        return {"users": done, "rows": written}
+
+    async def _recompute_users(self, session: AsyncSession, user_ids: List[int]) -> int:
+        await self._lock_users(session, user_ids)
+        # Отметка ставится до чтения: все, что записано в буферы раньше, попадет в выборку
+        recomputed_at = datetime.now(timezone.utc)
+        stmt = _join_topic(
+            select(UserTaskProgress.user_id, UserTaskProgress.is_correct, Topic.id, Topic.course_id)
+            .where(UserTaskProgress.user_id.in_(user_ids))
+            .order_by(UserTaskProgress.user_id, UserTaskProgress.solved_at, UserTaskProgress.id)
+        )
+        rows: Dict[Tuple[int, int], KnowledgeGraph] = {}
+        answered, passed = set(), []
+        for user_id, is_correct, topic_id, course_id in (await session.execute(stmt)).all():
+            row = rows.get((user_id, topic_id))
+            if row is None:
+                row = rows[(user_id, topic_id)] = KnowledgeGraph(**self._new_row(user_id, topic_id, recomputed_at=recomputed_at))
+            if self._apply(row, bool(is_correct)):
+                passed.append((user_id, course_id, topic_id))
+            answered.add((user_id, course_id))
+
+        order = await self._course_order(session, {course_id for _, course_id in answered})
+        for user_id, topic_id in self._to_open(answered, passed, order):
+            row = rows.get((user_id, topic_id))
+            if row is None:
+                rows[(user_id, topic_id)] = KnowledgeGraph(**self._new_row(user_id, topic_id, OPEN, recomputed_at))
+            elif row.status == LOCKED:
+                row.status = OPEN
+
+        await session.execute(delete(KnowledgeGraph).where(KnowledgeGraph.user_id.in_(user_ids)))
+        session.add_all(rows.values())
+        return len(rows)
+
+    # === Фоновая запись ===
+    async def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Дописываем хвост, чтобы не потерять ответы при остановке
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Mastery flush on shutdown failed: {e}", exc_info=True)
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Mastery flush failed: {e}", exc_info=True)
+
+
+mastery_engine = MasteryEngine(
+    prior=settings.mastery.PRIOR,
+    learn=settings.mastery.LEARN,
+    slip=settings.mastery.SLIP,
+    guess=settings.mastery.GUESS,
+    pass_threshold=settings.mastery.PASS_THRESHOLD,
+    min_attempts=settings.mastery.MIN_ATTEMPTS,
+    flush_interval=settings.mastery.FLUSH_INTERVAL,
+    flush_size=settings.mastery.FLUSH_SIZE,
+    max_buffer=settings.mastery.MAX_BUFFER,
+    recompute_batch=settings.mastery.RECOMPUTE_BATCH,
+)
+job_queue.register(RECOMPUTE_JOB, mastery_engine.recompute_job)
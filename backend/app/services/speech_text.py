@@ -0,0 +1,97 @@
+# app/services/speech_text.py
+import re
+
+# LaTeX-команды, которые читаются словами; остальные команды просто убираются
+_LATEX_WORDS = {
+    r"\cdot": " умножить на ",
+    r"\times": " умножить на ",
+    r"\div": " разделить на ",
+    r"\pm": " плюс-минус ",
+    r"\leq": " меньше или равно ",
+    r"\le": " меньше или равно ",
+    r"\geq": " больше или равно ",
+    r"\ge": " больше или равно ",
+    r"\neq": " не равно ",
+    r"\ne": " не равно ",
+    r"\approx": " примерно равно ",
+    r"\infty": " бесконечность ",
+    r"\pi": " пи ",
+    r"\alpha": " альфа ",
+    r"\beta": " бета ",
+    r"\gamma": " гамма ",
+    r"\Delta": " дельта ",
+    r"\delta": " дельта ",
+    r"\angle": " угол ",
+    r"\triangle": " треугольник ",
+    r"\in": " принадлежит ",
+    r"\Rightarrow": " следовательно ",
+    r"\to": " стремится к ",
+    r"\sum": " сумма ",
+    r"\sin": " синус ",
+    r"\cos": " косинус ",
+    r"\tan": " тангенс ",
+    r"\log": " логарифм ",
+}
+# Длинные команды заменяются первыми, чтобы \le не съел начало \leq
+_LATEX_WORD_RE = re.compile(
+    "|".join(re.escape(cmd) + r"(?![a-zA-Z])" for cmd in sorted(_LATEX_WORDS, key=len, reverse=True))
+)
+_FRAC_RE = re.compile(r"\\[dt]?frac\{([^{}]*)\}\{([^{}]*)\}")
+_SQRT_RE = re.compile(r"\\sqrt\{([^{}]*)\}")
+# Показатель и индекс: группа в скобках или один токен (число или символ) - x^2+y^2 не склеивается
+_POWER_RE = re.compile(r"\^(?:\{([^{}]*)\}|(\d+|\w))")
+_INDEX_RE = re.compile(r"_(?:\{([^{}]*)\}|(\d+|\w))")
+_MATH_RE = re.compile(r"\$\$(.+?)\$\$|\$(.+?)\$|\\\((.+?)\\\)|\\\[(.+?)\\\]", re.S)
+
+_POWERS = {"2": " в квадрате", "3": " в кубе"}
+
+
+def _power_words(power: str) -> str:
+    power = power.strip()
+    return _POWERS.get(power, f" в степени {power} ")
+
+
+def _math_to_words(expr: str) -> str:
+    """Формула -> текст, который синтезатор прочитает разборчиво (простые случаи)"""
+    for _ in range(3):  # вложенные дроби раскрываются изнутри наружу
+        expr = _FRAC_RE.sub(r" \1 делить на \2 ", expr)
+    expr = _SQRT_RE.sub(r" корень из \1 ", expr)
+    expr = _POWER_RE.sub(lambda m: _power_words(m.group(1) or m.group(2)), expr)
+    expr = _INDEX_RE.sub(lambda m: f" {(m.group(1) or m.group(2)).strip()} ", expr)
+    expr = _LATEX_WORD_RE.sub(lambda m: _LATEX_WORDS[m.group(0)], expr)
+    expr = re.sub(r"\\[a-zA-Z]+", " ", expr)
+    expr = expr.replace("=", " равно ").replace("+", " плюс ").replace("<", " меньше ").replace(">", " больше ")
+    expr = re.sub(r"(?<=\s)-(?=\s|\w)", " минус ", expr)
+    expr = re.sub(r"[{}\\]", " ", expr)
+    return f" {expr} "
+
+
+def speakable_text(markdown: str) -> str:
+    """
+    Markdown лекции -> текст для синтеза речи: без разметки, кода, ссылок и картинок,
+    формулы LaTeX - словами. Абзацы сохраняются, чтобы синтез делал паузы.
+    """
+    text = markdown or ""
+    text = re.sub(r"```.*?```", " ", text, flags=re.S)              # блоки кода не читаем
+    text = _MATH_RE.sub(lambda m: _math_to_words(next(g for g in m.groups() if g is not None)), text)
+    text = re.sub(r"!\[[^\]]*\]\([^)]*\)", " ", text)               # картинки
+    text = re.sub(r"\[([^\]]+)\]\([^)]*\)", r"\1", text)            # ссылки -> текст ссылки
+    text = re.sub(r"<[^>]+>", " ", text)                             # html-теги
+    text = re.sub(r"`([^`]*)`", r"\1", text)                         # инлайн-код
+    text = re.sub(r"^[ \t]{0,3}#{1,6}[ \t]*(.+?)[ \t]*#*[ \t]*$", r"\1.", text, flags=re.M)  # заголовок - отдельная фраза
+    text = re.sub(r"^[ \t]*(?:[-*+]|\d+[.)])[ \t]+", "", text, flags=re.M)  # маркеры списков
+    text = re.sub(r"^[ \t]*>[ \t]?", "", text, flags=re.M)                 # цитаты
+    text = re.sub(r"^[ \t]*\|?[ \t]*:?-{3,}.*$", "", text, flags=re.M)     # разделитель таблицы
+    text = re.sub(                                                     # строка таблицы - перечисление ячеек
+        r"^[ \t]*\|(.*)\|[ \t]*$",
+        lambda m: ", ".join(cell.strip() for cell in m.group(1).split("|") if cell.strip()) + ".",
+        text,
+        flags=re.M,
+    )
+    text = re.sub(r"(\*\*|__|\*|_|~~)(?=\S)(.+?)(?<=\S)\1", r"\2", text)  # выделение
+    text = re.sub(r"^[ \t]*([-*_][ \t]*){3,}$", "", text, flags=re.M)      # горизонтальные линии
+    text = re.sub(r"[ \t]+", " ", text)
+    text = re.sub(r" *\n *", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    text = re.sub(r"[ \t]+([.,;:!?])", r"\1", text)
+    return text.strip()
@@ -0,0 +1,99 @@
+# app/services/storage.py
+import asyncio
+import io
+import json
+import logging
+from typing import List, Optional
+
+from minio import Minio
+from minio.error import S3Error
+
+from app.core.config import MinIOConfig, settings
+
+logger = logging.getLogger(__name__)
+
+
+class ObjectStorage:
+    """
+    Файлы в MinIO (S3). SDK синхронный, поэтому вызовы уходят в пул потоков
+    и не блокируют цикл событий. Объекты под public_prefixes отдаются браузеру
+    по прямой ссылке, поэтому на них выставляется политика анонимного чтения.
+    """
+
+    def __init__(self, config: MinIOConfig, public_prefixes: Optional[List[str]] = None):
+        self.config = config
+        self.bucket = config.MINIO_BUCKET_NAME
+        self.public_prefixes = [prefix.strip("/") for prefix in public_prefixes or []]
+        self._client: Optional[Minio] = None
+        self._bucket_checked = False
+
+    @property
+    def client(self) -> Minio:
+        if self._client is None:
+            self._client = Minio(
+                self.config.MINIO_ENDPOINT,
+                access_key=self.config.MINIO_ACCESS_KEY,
+                secret_key=self.config.MINIO_SECRET_KEY.get_secret_value(),
+                secure=self.config.MINIO_SECURE,
+            )
+        return self._client
+
+    def public_url(self, key: str) -> str:
+        return f"{self.config.minio_url}/{self.bucket}/{key}"
+
+    def _read_policy(self) -> str:
+        return json.dumps({
+            "Version": "2012-10-17",
+            "Statement": [{
+                "Effect": "Allow",
+                "Principal": {"AWS": ["*"]},
+                "Action": ["s3:GetObject"],
+                "Resource": [f"arn:aws:s3:::{self.bucket}/{prefix}/*" for prefix in self.public_prefixes],
+            }],
+        })
+
+    def _has_policy(self) -> bool:
+        try:
+            self.client.get_bucket_policy(self.bucket)
+            return True
+        except S3Error as e:
+            if e.code == "NoSuchBucketPolicy":
+                return False
+            raise
+
+    def _ensure_bucket_sync(self):
+        if not self.client.bucket_exists(self.bucket):
+            self.client.make_bucket(self.bucket)
+        elif self._has_policy():
+            # Политику бакета задали вручную - не перезаписываем ее
+            return
+        if self.public_prefixes:
+            self.client.set_bucket_policy(self.bucket, self._read_policy())
+            logger.info(f"🪣 Public read enabled for {', '.join(self.public_prefixes)} in bucket {self.bucket}")
+
+    async def _ensure_bucket(self):
+        """Создает бакет, если его нет, и открывает на чтение публичные префиксы"""
+        if not self._bucket_checked:
+            await asyncio.to_thread(self._ensure_bucket_sync)
+            self._bucket_checked = True
+
+    async def exists(self, key: str) -> bool:
+        await self._ensure_bucket()
+        try:
+            await asyncio.to_thread(self.client.stat_object, self.bucket, key)
+            return True
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchObject", "NoSuchBucket"):
+                return False
+            raise
+
+    async def put_bytes(self, key: str, data: bytes, content_type: str = "application/octet-stream") -> str:
+        """Загружает объект и возвращает его публичную ссылку"""
+        await self._ensure_bucket()
+        await asyncio.to_thread(
+            self.client.put_object, self.bucket, key, io.BytesIO(data), len(data), content_type=content_type
+        )
+        return self.public_url(key)
+
+
+object_storage = ObjectStorage(settings.minio, public_prefixes=[settings.tts.STORAGE_PREFIX])
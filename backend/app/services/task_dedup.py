@@ -0,0 +1,139 @@
+# app/services/task_dedup.py
+import logging
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+from sqlalchemy import bindparam, func, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import db_helper
+from app.models.content import Task
+from app.models.system import BackgroundJob
+from app.services.embeddings import EMBEDDING_ERRORS, MAX_TEXT_CHARS, content_hash, embed_texts
+from app.services.job_queue import job_queue
+
+logger = logging.getLogger(__name__)
+
+DEDUP_BACKFILL_JOB = "dedup_tasks"
+
+
+@dataclass
+class DedupResult:
+    """Результат проверки новой задачи; embedding пригодится, чтобы сохранить его вместе с задачей"""
+    embedding: Optional[List[float]]
+    embedding_hash: Optional[str]
+    duplicate_of: Optional[int] = None
+    similarity: float = 0.0
+
+
+def _normalized(question: str) -> str:
+    return re.sub(r"\s+", " ", question).strip().lower()
+
+
+async def find_duplicate(session: AsyncSession, question: str) -> DedupResult:
+    """
+    Ищет уже существующую задачу, совпадающую по смыслу с question.
+
+    Основной путь - ближайший сосед по HNSW-индексу tasks.embedding.
+    Если сервис эмбеддингов недоступен (или модель не той размерности), проверяется только точное
+    совпадение нормализованного текста, чтобы генерация не останавливалась.
+    """
+    body = question[:MAX_TEXT_CHARS].strip()
+    try:
+        vector, = await embed_texts([body])
+    except EMBEDDING_ERRORS as e:
+        logger.warning(f"Embeddings unavailable, exact-match dedup only: {e}")
+        stmt = select(Task.id).where(
+            Task.duplicate_of_id.is_(None),
+            func.lower(func.regexp_replace(func.trim(Task.content["question"].astext), r"\s+", " ", "g"))
+            == _normalized(question),
+        ).limit(1)
+        task_id = (await session.execute(stmt)).scalar_one_or_none()
+        return DedupResult(None, None, task_id, 1.0 if task_id else 0.0)
+
+    distance = Task.embedding.cosine_distance(vector).label("distance")
+    stmt = (
+        select(Task.id, distance)
+        .where(Task.embedding.is_not(None), Task.duplicate_of_id.is_(None))
+        .order_by(distance)
+        .limit(1)
+    )
+    nearest = (await session.execute(stmt)).first()
+    result = DedupResult(vector, content_hash(body))
+    if nearest and 1 - nearest.distance >= settings.dedup.SIMILARITY_THRESHOLD:
+        result.duplicate_of = nearest.id
+        result.similarity = 1 - nearest.distance
+    return result
+
+
+# Для каждой задачи пачки - ближайшая более ранняя каноническая задача (LATERAL по HNSW-индексу)
+_NEAREST_EARLIER = text("""
+    SELECT t.id, n.id AS neighbour_id, n.distance
+    FROM tasks t
+    CROSS JOIN LATERAL (
+        SELECT c.id, c.embedding <=> t.embedding AS distance
+        FROM tasks c
+        WHERE c.id < t.id AND c.embedding IS NOT NULL AND c.duplicate_of_id IS NULL
+        ORDER BY c.embedding <=> t.embedding
+        LIMIT 1
+    ) n
+    WHERE t.id > :last_id AND t.embedding IS NOT NULL AND t.duplicate_of_id IS NULL
+    ORDER BY t.id
+    LIMIT :batch
+""")
+
+
+async def backfill_job(job: BackgroundJob, report_progress) -> dict:
+    """
+    Обработчик dedup_tasks: проходит таблицу tasks пачками по id и
+    помечает дубликаты (duplicate_of_id -> самая ранняя задача кластера).
+    Задачи без эмбеддинга пропускаются - сначала нужен embed_content.
+    """
+    max_distance = 1 - settings.dedup.SIMILARITY_THRESHOLD
+    batch = settings.dedup.BACKFILL_BATCH
+    last_id, scanned, marked = 0, 0, 0
+
+    async with db_helper.session_factory() as session:
+        total = (await session.execute(
+            select(func.count(Task.id)).where(Task.embedding.is_not(None), Task.duplicate_of_id.is_(None))
+        )).scalar() or 0
+
+    # Дубликат -> канонический id; сосед мог сам оказаться дубликатом в этой же пачке
+    canonical = {}
+    while True:
+        async with db_helper.session_factory() as session:
+            await session.execute(text(f"SET LOCAL hnsw.ef_search = {int(settings.vector.EF_SEARCH)}"))
+            rows = (await session.execute(_NEAREST_EARLIER, {"last_id": last_id, "batch": batch})).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            scanned += len(rows)
+
+            updates = []
+            for row in rows:
+                if row.distance > max_distance:
+                    continue
+                root = canonical.get(row.neighbour_id, row.neighbour_id)
+                canonical[row.id] = root
+                updates.append({"task_id": row.id, "root_id": root})
+
+            if updates:
+                await session.execute(
+                    update(Task)
+                    .where(Task.id == bindparam("task_id"))
+                    .values(duplicate_of_id=bindparam("root_id"))
+                    .execution_options(synchronize_session=False),
+                    updates,
+                )
+            await session.commit()
+            marked += len(updates)
+
+        await report_progress(min(99, int(scanned / total * 100)) if total else 99)
+
+    logger.info(f"🧹 Task dedup backfill: {scanned} scanned, {marked} marked as duplicates")
+    return {"scanned": scanned, "duplicates": marked}
+
+
+job_queue.register(DEDUP_BACKFILL_JOB, backfill_job)
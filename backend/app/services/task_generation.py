@@ -0,0 +1,185 @@
+# app/services/task_generation.py
+import logging
+import json as json_lib
+import httpx
+from sqlalchemy import select
+from app.core.config import settings
+from app.core.database import db_helper
+from app.models.content import Task
+from app.models.system import BackgroundJob
+from app.services.job_queue import JobFailed, job_queue
+from app.services.task_dedup import find_duplicate
+
+logger = logging.getLogger(__name__)
+
+SIMILAR_TASK_JOB = "gen_similar_task"
+SIMILAR_TASK_MODEL = "Qwen3-4B-Instruct-2507-Q4_K_M"
+REQUIRED_FIELDS = ["question", "correct_answer", "explanation"]
+
+# JSON-схема ответа: гейтвей превращает ее в грамматику llama.cpp,
+# поэтому модель физически не может вернуть что-то кроме этого объекта
+SIMILAR_TASK_SCHEMA = {
+    "type": "object",
+    "properties": {field: {"type": "string", "minLength": 1} for field in REQUIRED_FIELDS},
+    "required": REQUIRED_FIELDS,
+    "additionalProperties": False,
+}
+
+
+def build_similar_task_prompt(original_task: Task) -> str:
+    """Промпт для генерации задачи, аналогичной original_task"""
+    question = original_task.content.get("question", "")
+    correct_answer = original_task.validation.get("correct_answer", "")
+    explanation = original_task.explanation or ""
+    difficulty = original_task.difficulty or 1
+    
+    prompt = f"""Ты — преподаватель олимпиадной математики. Создай НОВУЮ задачу, аналогичную приведённой ниже.
+
+### Оригинальная задача:
+Тип: {original_task.type}
+Уровень сложности: {difficulty}
+Вопрос: {question}
+Правильный ответ: {correct_answer}
+Объяснение: {explanation}
+
+### Требования:
+1. Сохрани структуру доказательства и логику решения
+2. Измени числовые параметры и контекст (имена, объекты)
+3. Задача должна быть корректной и иметь однозначное решение
+4. Объяснение должно содержать пошаговое доказательство
+5. Уровень сложности должен остаться таким же
+
+### Формат ответа (JSON):
+{{
+  "question": "Новый вопрос...",
+  "correct_answer": "Новый ответ",
+  "explanation": "Новое объяснение..."
+}}"""
+
+    return prompt
+
+
+def parse_generated_task(raw_text: str) -> dict:
+    """Разбирает ответ модели; формат гарантирует JSON-схема на стороне LLM-гейтвея"""
+    try:
+        parsed = json_lib.loads(raw_text)
+    except json_lib.JSONDecodeError as e:
+        logger.error(f"❌ Модель вернула невалидный JSON (первые 500 символов):\n{raw_text[:500]}")
+        raise ValueError(f"Не удалось распарсить JSON от модели. Ошибка: {str(e)}")
+
+    missing = [f for f in REQUIRED_FIELDS if not str(parsed.get(f, "")).strip()]
+    if missing:
+        logger.error(f"❌ Отсутствуют обязательные поля: {missing}. Полученные ключи: {list(parsed.keys())}")
+        raise ValueError(f"Model response missing fields: {', '.join(missing)}")
+
+    return parsed
+
+
+async def request_similar_task(prompt: str) -> dict:
+    """Отправляет промпт на локальный LLM сервер и возвращает распарсенную задачу"""
+    async with httpx.AsyncClient(timeout=float(settings.jobs.LLM_TIMEOUT)) as client:
+        response = await client.post(
+            f"{settings.ai.llm_server_url}v1/chat/completions",
+            json={
+                "model": SIMILAR_TASK_MODEL,
+                "messages": [{"role": "user", "content": prompt}],
+                "stream": False,
+                "response_format": {
+                    "type": "json_schema",
+                    "json_schema": {"name": "similar_task", "schema": SIMILAR_TASK_SCHEMA, "strict": True}
+                }
+            }
+        )
+
+    if response.status_code != 200:
+        logger.error(f"LLM server error {response.status_code}: {response.text}")
+        raise RuntimeError(f"LLM server error: {response.status_code}")
+
+    llm_response = response.json()
+    return parse_generated_task(llm_response["choices"][0]["message"]["content"])
+
+
+def build_task_from_generated(original_task: Task, generated_data: dict) -> Task:
+    """Новая задача с полями оригинала и текстом от модели"""
+    return Task(
+        unit_id=original_task.unit_id,
+        lecture_id=original_task.lecture_id,
+        type=original_task.type,
+        content={
+            "question": str(generated_data["question"]).strip()
+        },
+        validation={
+            "correct_answer": str(generated_data["correct_answer"]).strip()
+        },
+        explanation=str(generated_data["explanation"]).strip(),
+        difficulty=original_task.difficulty,
+        tags=original_task.tags,
+        requires_ai_check=original_task.requires_ai_check,
+        file_upload_allowed=original_task.file_upload_allowed
+    )
+
+
+def task_to_response(task: Task) -> dict:
+    """Задача в формате, который ждет фронтенд"""
+    return {
+        "id": task.id,
+        "type": task.type,
+        "question": task.content.get("question", ""),
+        "options": task.content.get("options", []),
+        "correctAnswer": task.validation.get("correct_answer"),
+        "explanation": task.explanation,
+        "is_solved": False
+    }
+
+
+async def generate_similar_task_job(job: BackgroundJob, report_progress) -> dict:
+    """Обработчик фоновой задачи gen_similar_task: payload = {"task_id": ...}"""
+    task_id = job.payload["task_id"]
+
+    # 1. Короткая сессия: читаем оригинал и собираем промпт
+    async with db_helper.session_factory() as session:
+        original_task = (await session.execute(select(Task).where(Task.id == task_id))).scalar_one_or_none()
+    if not original_task:
+        raise ValueError(f"Task {task_id} not found")
+
+    prompt = build_similar_task_prompt(original_task)
+    await report_progress(20)
+
+    # 2. Генерация идет без открытой сессии БД; почти-повторы уже существующих задач отбрасываем
+    attempts = max(1, settings.dedup.MAX_ATTEMPTS)
+    for attempt in range(attempts):
+        generated_data = await request_similar_task(prompt)
+        async with db_helper.session_factory() as session:
+            dedup = await find_duplicate(session, str(generated_data["question"]))
+        if dedup.duplicate_of is None:
+            break
+        logger.info(
+            f"♻️ Generated task duplicates task {dedup.duplicate_of} "
+            f"(similarity {dedup.similarity:.3f}), attempt {attempt + 1}/{attempts}"
+        )
+    else:
+        # Модель упорно повторяет существующую задачу: отдаем ее, а не плодим копию.
+        # Сам оригинал пользователю не нужен - это ошибка генерации
+        # Повтор всей задачи стоил бы еще attempts запросов к LLM с тем же итогом
+        if dedup.duplicate_of == original_task.id:
+            raise JobFailed(f"Model keeps repeating task {task_id}")
+        async with db_helper.session_factory() as session:
+            existing = (await session.execute(select(Task).where(Task.id == dedup.duplicate_of))).scalar_one()
+        return task_to_response(existing)
+
+    logger.info(f"✅ Успешно сгенерирована задача: {generated_data.get('question', '')[:60]}...")
+    await report_progress(80)
+
+    # 3. Короткая сессия: сохраняем новую задачу вместе с уже посчитанным эмбеддингом
+    async with db_helper.session_factory() as session:
+        new_task = build_task_from_generated(original_task, generated_data)
+        new_task.embedding = dedup.embedding
+        new_task.embedding_hash = dedup.embedding_hash
+        session.add(new_task)
+        await session.commit()
+        await session.refresh(new_task)
+
+    return task_to_response(new_task)
+
+
+job_queue.register(SIMILAR_TASK_JOB, generate_similar_task_job)
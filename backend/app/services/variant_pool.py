@@ -0,0 +1,245 @@
+# app/services/variant_pool.py
+import asyncio
+import hashlib
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import and_, case, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import db_helper
+from app.models.content import Task, TaskVariant, TaskVariantDemand
+from app.models.system import BackgroundJob
+from app.services.job_queue import job_queue
+from app.services.task_dedup import find_duplicate
+from app.services.task_generation import (
+    build_similar_task_prompt,
+    build_task_from_generated,
+    request_similar_task,
+)
+
+logger = logging.getLogger(__name__)
+
+REFILL_JOB = "refill_task_variants"
+
+
+def question_hash(question: str) -> str:
+    """Хэш нормализованного текста задачи: регистр и пробелы не считаются отличием"""
+    normalized = re.sub(r"\s+", " ", question).strip().lower()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class VariantPool:
+    """
+    Пул заранее сгенерированных "похожих задач" для популярных задач.
+
+    Каждый запрос generate-similar увеличивает счетчик спроса задачи.
+    Если в пуле есть готовый вариант, он сразу превращается в Task и
+    отдается пользователю; пополнение идет фоновыми задачами через job_queue.
+    Продюсер периодически досоздает варианты для самых запрашиваемых задач.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 3,
+        min_requests: int = 3,
+        demand_window_hours: int = 168,
+        refill_interval: int = 60,
+        max_tasks_per_scan: int = 20,
+    ):
+        self.pool_size = pool_size
+        self.min_requests = min_requests
+        self.demand_window = timedelta(hours=demand_window_hours)
+        self.refill_interval = refill_interval
+        self.max_tasks_per_scan = max_tasks_per_scan
+        self._task: Optional[asyncio.Task] = None
+
+    # === Запрос пользователя ===
+    async def record_request(self, session: AsyncSession, task_id: int) -> int:
+        """Учитывает запрос и возвращает актуальный спрос на задачу"""
+        now = datetime.now(timezone.utc)
+        stmt = insert(TaskVariantDemand).values(task_id=task_id, requests=1, last_requested_at=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[TaskVariantDemand.task_id],
+            set_={
+                # Спрос за пределами окна сбрасывается, чтобы пул держали только актуальные задачи
+                "requests": case(
+                    (TaskVariantDemand.last_requested_at < now - self.demand_window, 1),
+                    else_=TaskVariantDemand.requests + 1,
+                ),
+                "last_requested_at": now,
+            },
+        ).returning(TaskVariantDemand.requests)
+        return (await session.execute(stmt)).scalar_one()
+
+    async def take(self, session: AsyncSession, original_task: Task) -> Optional[Task]:
+        """Забирает готовый вариант из пула и создает по нему задачу (без коммита)"""
+        available = (
+            select(TaskVariant.id)
+            .where(TaskVariant.original_task_id == original_task.id, TaskVariant.served_at.is_(None))
+            .order_by(TaskVariant.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        stmt = (
+            update(TaskVariant)
+            .where(TaskVariant.id == available)
+            .values(served_at=func.now())
+            .returning(TaskVariant)
+        )
+        variant = (await session.execute(stmt)).scalar_one_or_none()
+        if variant is None:
+            return None
+
+        new_task = build_task_from_generated(original_task, {
+            "question": variant.question,
+            "correct_answer": variant.correct_answer,
+            "explanation": variant.explanation,
+        })
+        session.add(new_task)
+        await session.flush()
+        variant.served_task_id = new_task.id
+        return new_task
+
+    async def ensure_refill(self, session: AsyncSession, task_id: int, demand: int):
+        """Ставит пополнение пула, если задача популярна и пул неполон"""
+        if demand < self.min_requests:
+            return
+        if await self.available_count(session, task_id) >= self.pool_size:
+            return
+        if await self._refill_scheduled(session, task_id):
+            return
+        await job_queue.enqueue(session, REFILL_JOB, {"task_id": task_id})
+
+    # === Состояние пула ===
+    async def available_count(self, session: AsyncSession, task_id: int) -> int:
+        stmt = select(func.count(TaskVariant.id)).where(
+            TaskVariant.original_task_id == task_id,
+            TaskVariant.served_at.is_(None),
+        )
+        return (await session.execute(stmt)).scalar_one()
+
+    async def _refill_scheduled(self, session: AsyncSession, task_id: int) -> bool:
+        stmt = select(BackgroundJob.id).where(
+            BackgroundJob.type == REFILL_JOB,
+            BackgroundJob.status.in_(("pending", "processing")),
+            BackgroundJob.payload["task_id"].astext == str(task_id),
+        ).limit(1)
+        return (await session.execute(stmt)).scalar_one_or_none() is not None
+
+    # === Пополнение ===
+    async def refill_job(self, job: BackgroundJob, report_progress) -> dict:
+        """Обработчик refill_task_variants: догенерирует варианты до pool_size"""
+        task_id = job.payload["task_id"]
+
+        async with db_helper.session_factory() as session:
+            original_task = (await session.execute(select(Task).where(Task.id == task_id))).scalar_one_or_none()
+            if not original_task:
+                return {"added": 0}
+            missing = self.pool_size - await self.available_count(session, task_id)
+
+        if missing <= 0:
+            return {"added": 0}
+
+        prompt = build_similar_task_prompt(original_task)
+        original_hash = question_hash(original_task.content.get("question", ""))
+        added = duplicates = 0
+
+        # Дубликаты тоже тратят попытку, чтобы модель, повторяющая один ответ, не крутилась бесконечно
+        for _ in range(missing * 2):
+            if added >= missing:
+                break
+            generated = await request_similar_task(prompt)
+            question = str(generated["question"]).strip()
+            digest = question_hash(question)
+            if not question or digest == original_hash:
+                duplicates += 1
+                continue
+            # Вариант не должен повторять по смыслу ни оригинал, ни другие задачи
+            async with db_helper.session_factory() as session:
+                if (await find_duplicate(session, question)).duplicate_of is not None:
+                    duplicates += 1
+                    continue
+
+            async with db_helper.session_factory() as session:
+                stmt = insert(TaskVariant).values(
+                    original_task_id=task_id,
+                    question=question,
+                    correct_answer=str(generated["correct_answer"]).strip(),
+                    explanation=str(generated["explanation"]).strip(),
+                    question_hash=digest,
+                ).on_conflict_do_nothing(constraint="uq_task_variants_original_hash")
+                result = await session.execute(stmt)
+                await session.commit()
+
+            if result.rowcount:
+                added += 1
+                await report_progress(int(added / missing * 100))
+            else:
+                duplicates += 1
+
+        logger.info(f"🧩 Task {task_id} variant pool: +{added}, duplicates skipped: {duplicates}")
+        return {"added": added, "duplicates": duplicates}
+
+    # === Продюсер ===
+    async def start(self):
+        self._task = asyncio.create_task(self._producer())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _producer(self):
+        while True:
+            try:
+                await self._scan()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Variant pool scan failed: {e}", exc_info=True)
+            await asyncio.sleep(self.refill_interval)
+
+    async def _scan(self):
+        """Находит самые запрашиваемые задачи с неполным пулом и ставит пополнение"""
+        threshold = datetime.now(timezone.utc) - self.demand_window
+        available = (
+            select(TaskVariant.original_task_id, func.count(TaskVariant.id).label("available"))
+            .where(TaskVariant.served_at.is_(None))
+            .group_by(TaskVariant.original_task_id)
+            .subquery()
+        )
+        stmt = (
+            select(TaskVariantDemand.task_id, TaskVariantDemand.requests)
+            .outerjoin(available, available.c.original_task_id == TaskVariantDemand.task_id)
+            .where(
+                and_(
+                    TaskVariantDemand.requests >= self.min_requests,
+                    TaskVariantDemand.last_requested_at >= threshold,
+                    func.coalesce(available.c.available, 0) < self.pool_size,
+                )
+            )
+            .order_by(TaskVariantDemand.requests.desc())
+            .limit(self.max_tasks_per_scan)
+        )
+        async with db_helper.session_factory() as session:
+            rows = (await session.execute(stmt)).all()
+            for task_id, _ in rows:
+                if not await self._refill_scheduled(session, task_id):
+                    await job_queue.enqueue(session, REFILL_JOB, {"task_id": task_id})
+
+
+variant_pool = VariantPool(
+    pool_size=settings.variants.POOL_SIZE,
+    min_requests=settings.variants.MIN_REQUESTS,
+    demand_window_hours=settings.variants.DEMAND_WINDOW_HOURS,
+    refill_interval=settings.variants.REFILL_INTERVAL,
+    max_tasks_per_scan=settings.variants.MAX_TASKS_PER_SCAN,
+)
+job_queue.register(REFILL_JOB, variant_pool.refill_job)
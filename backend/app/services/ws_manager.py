@@ -510,6 +510,7 @@ class PVPGameManager:
         async with db_helper.session_factory() as session:
             # Базовые условия для всех задач
             base_conditions = [
+                Task.duplicate_of_id.is_(None),
                 Task.validation.is_not(None),
                 Task.validation["correct_answer"].astext.is_not(None),
                 Task.validation["correct_answer"].astext != ""
@@ -0,0 +1,52 @@
+# export_data.py
+"""
+Потоковая выгрузка датасетов в файл, минуя HTTP:
+
+    python export_data.py progress progress.parquet [--format parquet] [--course-id 1] [--date-from 2026-09-01]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime
+
+from app.core.database import db_helper
+from app.services.data_export import DATASETS, FORMATS, ExportFilters, export_stream
+
+
+async def main(dataset: str, path: str, fmt: str, filters: ExportFilters) -> int:
+    body = export_stream(dataset, fmt, filters)
+    written = 0
+    try:
+        with open(path, "wb") as f:
+            async for chunk in body:
+                f.write(chunk)
+                written += len(chunk)
+    finally:
+        await db_helper.dispose()
+    print(f"{dataset} -> {path}: {written / 2**20:.1f} MiB")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streaming export of content and progress datasets")
+    parser.add_argument("dataset", choices=list(DATASETS))
+    parser.add_argument("path", help="Файл результата")
+    parser.add_argument("--format", choices=list(FORMATS), help="По умолчанию - по расширению файла")
+    parser.add_argument("--course-id", type=int)
+    parser.add_argument("--topic-id", type=int)
+    parser.add_argument("--date-from", type=datetime.fromisoformat, help="Только для progress")
+    parser.add_argument("--date-to", type=datetime.fromisoformat, help="Только для progress")
+    args = parser.parse_args()
+
+    fmt = args.format or os.path.splitext(args.path)[1].lstrip(".").lower()
+    if fmt not in FORMATS:
+        parser.error(f"Cannot detect format from {args.path!r}, pass --format")
+    filters = ExportFilters(args.course_id, args.topic_id, args.date_from, args.date_to)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    try:
+        sys.exit(asyncio.run(main(args.dataset, args.path, fmt, filters)))
+    except (ValueError, RuntimeError) as e:
+        parser.error(str(e))
@@ -0,0 +1,36 @@
+# import_content.py
+"""
+Массовый импорт контента из файла, минуя HTTP:
+
+    python import_content.py tasks.csv [--format csv|jsonl] [--skip-invalid]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+
+from app.core.database import db_helper
+from app.services.content_import import detect_format, import_content
+
+
+async def main(path: str, fmt: str, skip_invalid: bool) -> int:
+    try:
+        async with db_helper.session_factory() as session:
+            with open(path, "rb") as f:
+                result = await import_content(session, f, fmt, skip_invalid=skip_invalid)
+    finally:
+        await db_helper.dispose()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 1 if result["invalid"] and not skip_invalid else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import of courses, lectures and tasks")
+    parser.add_argument("path", help="tasks.csv парсера или JSONL")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="По умолчанию - по расширению файла")
+    parser.add_argument("--skip-invalid", action="store_true", help="Пропускать ошибочные строки")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    sys.exit(asyncio.run(main(args.path, args.format or detect_format(args.path), args.skip_invalid)))
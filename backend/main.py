@@ -11,6 +11,10 @@ from app.api.v1.routes import api_router
 from app.api.v1.routes import ws 
 from app.core.config import settings
 from app.core.database import db_helper
+from app.services.job_queue import job_queue
+from app.services.variant_pool import variant_pool
+from app.services.lecture_audio import audio_prerenderer
+from app.services.mastery import mastery_engine
 from app.core.exceptions import (
     AppException,
     AuthenticationError,
@@ -55,10 +59,19 @@ async def lifespan(app: FastAPI):
         raise
 
     setup_admin(app, db_helper.engine)
+    await job_queue.start()
+    await variant_pool.start()
+    await mastery_engine.start()
+    if settings.tts.PRERENDER_ENABLED:
+        await audio_prerenderer.start()
     
     yield
     
     # Shutdown
+    await audio_prerenderer.stop()
+    await mastery_engine.stop()
+    await variant_pool.stop()
+    await job_queue.stop()
     await db_helper.dispose()
     logger.info("👋 Application shutdown complete")
 
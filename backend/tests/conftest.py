@@ -0,0 +1,19 @@
+import os
+
+# Настройки без значений по умолчанию: модули импортируют settings, но в БД и S3 тесты не ходят
+for key, value in {
+    "DB__DB_HOST": "localhost",
+    "DB__DB_NAME": "test",
+    "DB__DB_USER": "test",
+    "DB__DB_PASSWORD": "test",
+    "MINIO__MINIO_ENDPOINT": "localhost:9000",
+    "MINIO__MINIO_ACCESS_KEY": "test",
+    "MINIO__MINIO_SECRET_KEY": "test",
+    "AI__AI_API_BASE": "http://localhost:8000",
+    "SECURITY__JWT_SECRET_KEY": "test",
+    "PDF__TEMP_DIR": "/tmp/pdf_processing",
+    "VECTOR__DIMENSION": "1536",
+    "RABBITMQ__HOST": "localhost",
+    "RATE_LIMITS__AI_EXPLANATION_LIMIT": "50",
+}.items():
+    os.environ.setdefault(key, value)
@@ -0,0 +1,43 @@
+import pytest
+
+from app.models.learning import KnowledgeGraph
+from app.services.mastery import PASSED, MasteryEngine
+
+
+@pytest.fixture
+def engine():
+    return MasteryEngine(prior=0.2, learn=0.15, slip=0.1, guess=0.2, pass_threshold=0.85, min_attempts=3)
+
+
+def test_correct_answer_raises_probability(engine):
+    # 0.2 * 0.9 / (0.2 * 0.9 + 0.8 * 0.2) = 0.529..., затем шанс выучить: + 0.471 * 0.15
+    assert engine.update(0.2, True) == pytest.approx(0.6)
+
+
+def test_wrong_answer_lowers_probability(engine):
+    assert engine.update(0.2, False) == pytest.approx(0.02 / 0.66 + (1 - 0.02 / 0.66) * 0.15)
+    assert engine.update(0.6, False) < 0.6
+
+
+def test_update_stays_a_probability(engine):
+    probability = engine.prior
+    for is_correct in [True] * 20 + [False] * 20:
+        probability = engine.update(probability, is_correct)
+        assert 0 < probability < 1
+
+
+def test_passed_after_min_attempts(engine):
+    row = KnowledgeGraph(attempts=0)
+    passed = [engine._apply(row, True) for _ in range(3)]
+    assert passed == [False, False, True]
+    assert row.status == PASSED
+    assert row.attempts == 3
+    assert row.mastery == round(row.probability * 100)
+
+
+def test_mistake_does_not_close_passed_topic(engine):
+    row = KnowledgeGraph(attempts=0)
+    for _ in range(3):
+        engine._apply(row, True)
+    assert engine._apply(row, False) is False
+    assert row.status == PASSED
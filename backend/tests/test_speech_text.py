@@ -0,0 +1,36 @@
+from app.services.speech_text import speakable_text
+
+
+def test_markup_is_dropped():
+    text = speakable_text(
+        "# Введение\n\n"
+        "Это **важный** текст со [ссылкой](https://example.com) и `кодом`.\n\n"
+        "![схема](img.png)\n\n"
+        "```python\nprint('не читаем')\n```\n\n"
+        "- первый пункт\n"
+        "- второй пункт"
+    )
+    assert text == "Введение.\n\nЭто важный текст со ссылкой и кодом.\n\nпервый пункт\nвторой пункт"
+
+
+def test_table_rows_become_phrases():
+    text = speakable_text("| Имя | Балл |\n|---|---|\n| Аня | 5 |")
+    assert text == "Имя, Балл.\n\nАня, 5."
+
+
+def test_powers_are_read_per_token():
+    assert speakable_text("$x^2+y^2=z^2$") == "x в квадрате плюс y в квадрате равно z в квадрате"
+    assert speakable_text("$x^{n+1}$") == "x в степени n плюс 1"
+
+
+def test_indices_are_read_per_token():
+    assert speakable_text("$a_1+a_2$") == "a 1 плюс a 2"
+
+
+def test_fraction():
+    assert speakable_text(r"$\frac{a^2}{b}$") == "a в квадрате делить на b"
+
+
+def test_empty():
+    assert speakable_text("") == ""
+    assert speakable_text(None) == ""
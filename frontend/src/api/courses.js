@@ -36,11 +36,41 @@ export const coursesApi = {
   },
     generateSimilarTask: async (taskId) => {
     try {
+      // Генерация идет в фоне: ставим задачу в очередь и ждем результат
       const response = await axiosClient.post(`/courses/tasks/${taskId}/generate-similar`);
-      return response.data;
+      // Популярные задачи отдаются сразу из пула готовых вариантов
+      if (response.data.status === 'done') return response.data.result;
+      return await coursesApi.waitForJob(response.data.job_id);
     } catch (error) {
       console.error("Generate similar task error:", error);
       throw error;
     }
+  },
+    getLectureAudio: async (lectureId) => {
+    // Озвучка уже есть - сразу ссылка, иначе ждем фоновый синтез
+    const response = await axiosClient.get(`/courses/lectures/${lectureId}/audio`);
+    if (response.data.status === 'done') return response.data.result.url;
+    const result = await coursesApi.waitForJob(response.data.job_id);
+    return result.url;
+  },
+    waitForJob: async (jobId, { intervalMs = 2000, timeoutMs = 10 * 60 * 1000 } = {}) => {
+    // Задача могла зависнуть или уйти на повтор - не ждем бесконечно
+    const deadline = Date.now() + timeoutMs;
+    while (Date.now() < deadline) {
+      let data = null;
+      try {
+        ({ data } = await axiosClient.get(`/jobs/${jobId}`));
+      } catch (error) {
+        // Ответ сервера (404, 401) - окончательный; сетевой сбой переживаем до дедлайна
+        if (error.response) throw error;
+        console.warn(`Job ${jobId} poll failed, retrying:`, error.message);
+      }
+      if (data?.status === 'done') return data.result;
+      if (data?.status === 'error') {
+        throw new Error(data.error_message || 'Job failed');
+      }
+      await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
+    throw new Error('Job timed out');
   }
 };
\ No newline at end of file
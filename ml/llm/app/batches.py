@@ -0,0 +1,229 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Set
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_URLS = {"/v1/chat/completions", "/v1/completions"}
+
+# Статусы, при которых батч после рестарта продолжается с места остановки
+RESUMABLE_STATUSES = {"validating", "in_progress"}
+
+BatchHandler = Callable[[str, dict], Awaitable[dict]]
+
+
+class BatchManager:
+    """Офлайн-обработка JSONL-батчей в формате OpenAI Batch API.
+
+    Каждый батч живет в своей папке:
+        input.jsonl   - исходные запросы
+        output.jsonl  - успешные ответы (дописываются по мере готовности)
+        errors.jsonl  - ошибки
+        batch.json    - метаданные и счетчики
+    Готовые custom_id читаются из output/errors, поэтому после рестарта
+    батч продолжается без повторной генерации.
+    """
+
+    def __init__(self, batches_dir: str, handler: BatchHandler, concurrency: int = 4):
+        self.batches_dir = Path(batches_dir)
+        self.batches_dir.mkdir(parents=True, exist_ok=True)
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.tasks: Dict[str, asyncio.Task] = {}
+
+    # === Метаданные ===
+    def _dir(self, batch_id: str) -> Path:
+        return self.batches_dir / batch_id
+
+    def _save_meta(self, meta: dict):
+        path = self._dir(meta["id"]) / "batch.json"
+        tmp_path = path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def get(self, batch_id: str) -> dict:
+        path = self._dir(batch_id) / "batch.json"
+        if not path.exists():
+            raise ValueError(f"Batch {batch_id} not found")
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def list_batches(self) -> List[dict]:
+        batches = []
+        for path in self.batches_dir.glob("*/batch.json"):
+            with open(path, encoding="utf-8") as f:
+                batches.append(json.load(f))
+        return sorted(batches, key=lambda b: b["created_at"], reverse=True)
+
+    def output_path(self, batch_id: str) -> Path:
+        return self._dir(batch_id) / "output.jsonl"
+
+    def error_path(self, batch_id: str) -> Path:
+        return self._dir(batch_id) / "errors.jsonl"
+
+    # === Создание ===
+    def _parse_input(self, content: bytes) -> List[dict]:
+        requests = []
+        seen: Set[str] = set()
+        for line_no, line in enumerate(content.decode("utf-8").splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Line {line_no}: invalid JSON ({e})")
+
+            custom_id = item.get("custom_id")
+            if not custom_id:
+                raise ValueError(f"Line {line_no}: custom_id is required")
+            if custom_id in seen:
+                raise ValueError(f"Line {line_no}: duplicate custom_id {custom_id}")
+            if item.get("url") not in SUPPORTED_URLS:
+                raise ValueError(f"Line {line_no}: unsupported url {item.get('url')}")
+            if not isinstance(item.get("body"), dict) or "model" not in item["body"]:
+                raise ValueError(f"Line {line_no}: body with model is required")
+
+            seen.add(custom_id)
+            requests.append(item)
+
+        if not requests:
+            raise ValueError("Batch input is empty")
+        return requests
+
+    async def create(self, content: bytes) -> dict:
+        """Сохраняет входной файл на диск и запускает обработку"""
+        requests = self._parse_input(content)
+
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        batch_dir = self._dir(batch_id)
+        batch_dir.mkdir(parents=True)
+        with open(batch_dir / "input.jsonl", "wb") as f:
+            f.write(content)
+
+        meta = {
+            "id": batch_id,
+            "object": "batch",
+            "status": "validating",
+            "created_at": int(time.time()),
+            "completed_at": None,
+            "request_counts": {"total": len(requests), "completed": 0, "failed": 0},
+        }
+        self._save_meta(meta)
+        self._start(batch_id)
+        return meta
+
+    async def cancel(self, batch_id: str) -> dict:
+        meta = self.get(batch_id)
+        task = self.tasks.pop(batch_id, None)
+        if task:
+            task.cancel()
+        if meta["status"] in RESUMABLE_STATUSES:
+            meta["status"] = "cancelled"
+            meta["completed_at"] = int(time.time())
+            self._save_meta(meta)
+        return meta
+
+    # === Жизненный цикл ===
+    async def resume_all(self):
+        """Продолжает батчи, прерванные рестартом"""
+        for meta in self.list_batches():
+            if meta["status"] in RESUMABLE_STATUSES:
+                logger.info(f"📦 Resuming batch {meta['id']}")
+                self._start(meta["id"])
+
+    async def shutdown(self):
+        """Останавливает обработку, не меняя статус (батч продолжится после рестарта)"""
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.tasks.clear()
+
+    def _start(self, batch_id: str):
+        task = asyncio.create_task(self._run(batch_id))
+        self.tasks[batch_id] = task
+        task.add_done_callback(lambda _: self.tasks.pop(batch_id, None))
+
+    # === Обработка ===
+    def _finished_ids(self, batch_id: str) -> Dict[str, int]:
+        """custom_id уже обработанных запросов -> 1 (успех) / 0 (ошибка)"""
+        finished = {}
+        for path, ok in ((self.output_path(batch_id), 1), (self.error_path(batch_id), 0)):
+            if not path.exists():
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        finished[json.loads(line)["custom_id"]] = ok
+                    except (json.JSONDecodeError, KeyError):
+                        # Недописанная строка после аварийного завершения
+                        continue
+        return finished
+
+    def _append(self, path: Path, record: dict):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    async def _run(self, batch_id: str):
+        meta = self.get(batch_id)
+        with open(self._dir(batch_id) / "input.jsonl", "rb") as f:
+            requests = self._parse_input(f.read())
+
+        finished = self._finished_ids(batch_id)
+        meta["status"] = "in_progress"
+        meta["request_counts"]["completed"] = sum(finished.values())
+        meta["request_counts"]["failed"] = len(finished) - sum(finished.values())
+        self._save_meta(meta)
+
+        # Группируем по модели, чтобы не гонять серверы туда-обратно
+        pending = sorted(
+            (item for item in requests if item["custom_id"] not in finished),
+            key=lambda item: item["body"]["model"],
+        )
+        queue: asyncio.Queue = asyncio.Queue()
+        for item in pending:
+            queue.put_nowait(item)
+
+        async def worker():
+            while True:
+                try:
+                    item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await self._process(batch_id, meta, item)
+
+        # Воркеров столько, сколько параллельных слотов у llama-server
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(pending)) or 1)))
+
+        meta["status"] = "completed"
+        meta["completed_at"] = int(time.time())
+        self._save_meta(meta)
+        logger.info(f"📦 Batch {batch_id} completed: {meta['request_counts']}")
+
+    async def _process(self, batch_id: str, meta: dict, item: dict):
+        record = {"id": f"batch_req_{uuid.uuid4().hex}", "custom_id": item["custom_id"]}
+        try:
+            body = await self.handler(item["url"], item["body"])
+            record["response"] = {"status_code": 200, "body": body}
+            record["error"] = None
+            self._append(self.output_path(batch_id), record)
+            meta["request_counts"]["completed"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            status_code = e.status_code if isinstance(e, HTTPException) else 500
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            record["response"] = None
+            record["error"] = {"code": status_code, "message": detail}
+            self._append(self.error_path(batch_id), record)
+            meta["request_counts"]["failed"] += 1
+            logger.warning(f"📦 Batch {batch_id} request {item['custom_id']} failed: {detail}")
+        self._save_meta(meta)
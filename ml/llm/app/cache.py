@@ -0,0 +1,135 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Параметры, которые не влияют на текст ответа и не входят в ключ
+_VOLATILE_PARAMS = {"stream", "id_slot", "cache_prompt"}
+
+
+def is_deterministic(params: Dict) -> bool:
+    """Кэшировать имеет смысл только жадную генерацию"""
+    return params.get("temperature") == 0
+
+
+def cache_key(model_name: str, params: Dict) -> str:
+    """Канонический хэш модели, отрендеренного промпта и параметров сэмплинга"""
+    payload = {k: v for k, v in params.items() if k not in _VOLATILE_PARAMS}
+    canonical = json.dumps(
+        {"model": model_name, "params": payload},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Двухуровневый кэш ответов: LRU в памяти + SQLite на диске.
+
+    Запись хранит список чанков стрима, поэтому одна и та же запись
+    отдается и как обычный ответ (склейка чанков), и как повтор стрима.
+    """
+
+    def __init__(self, cache_dir: str, memory_entries: int = 256, max_disk_bytes: int = 256 * 1024 * 1024):
+        self.memory_entries = memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.memory: "OrderedDict[str, dict]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        path = Path(cache_dir)
+        path.mkdir(parents=True, exist_ok=True)
+        self.db_path = path / "responses.sqlite3"
+        self._db_lock = asyncio.Lock()
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_accessed_at ON responses (accessed_at)")
+
+    def _remember(self, key: str, entry: dict):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[dict]:
+        """Ищет запись сначала в памяти, потом на диске"""
+        entry = self.memory.get(key)
+        if entry is not None:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        async with self._db_lock:
+            entry = await asyncio.to_thread(self._disk_get, key)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._remember(key, entry)
+        self.hits += 1
+        return entry
+
+    async def put(self, key: str, entry: dict):
+        """Сохраняет запись в оба уровня"""
+        self._remember(key, entry)
+        async with self._db_lock:
+            await asyncio.to_thread(self._disk_put, key, entry)
+
+    def _disk_get(self, key: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def _disk_put(self, key: str, entry: dict):
+        value = json.dumps(entry, ensure_ascii=False)
+        size = len(value.encode("utf-8"))
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total <= self.max_disk_bytes:
+                return
+
+            # Вытесняем самые давно прочитанные записи, пока не уложимся в лимит
+            excess = total - self.max_disk_bytes
+            freed = 0
+            stale = []
+            for stale_key, stale_size in conn.execute(
+                "SELECT key, size FROM responses ORDER BY accessed_at ASC"
+            ):
+                if freed >= excess:
+                    break
+                stale.append((stale_key,))
+                freed += stale_size
+            conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+            logger.info(f"Response cache evicted {len(stale)} entries ({freed} bytes)")
@@ -0,0 +1,161 @@
+import logging
+from typing import Dict, List, Optional
+
+from .schemas import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+
+class ChatTemplate:
+    """Формат промпта конкретного семейства моделей.
+
+    turn - шаблон одного сообщения с полями {role} и {content}
+    (role_turns - отдельные шаблоны для ролей, если ходы несимметричны),
+    generation_prompt - начало ответа ассистента, stop - токены конца хода.
+    BOS не добавляется: его вставляет сам llama-server при токенизации.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        turn: str,
+        generation_prompt: str,
+        stop: List[str],
+        roles: Optional[Dict[str, str]] = None,
+        role_turns: Optional[Dict[str, str]] = None,
+        system_in_user: bool = False,
+    ):
+        self.name = name
+        self.turn = turn
+        self.generation_prompt = generation_prompt
+        self.stop = stop
+        self.roles = roles or {}
+        self.role_turns = role_turns or {}
+        # У части моделей (Gemma, Mistral) нет роли system - она приклеивается к первому ходу пользователя
+        self.system_in_user = system_in_user
+
+    def turn_text(self, role: str, content: str) -> str:
+        """Текст одного хода - для подсчета токенов по сообщениям"""
+        return self.role_turns.get(role, self.turn).format(role=self.roles.get(role, role), content=content)
+
+    def render(self, messages: List[ChatMessage]) -> str:
+        """Собирает промпт так, чтобы префикс диалога не менялся между ходами.
+
+        Системные сообщения всегда идут первыми, остальные - в исходном порядке.
+        Тогда каждый следующий ход только дописывает токены в конец, и llama.cpp
+        с cache_prompt переиспользует KV-кэш слота вместо пересчета всей истории.
+        """
+        system = [msg.content for msg in messages if msg.role == "system"]
+        dialog = [(msg.role, msg.content) for msg in messages if msg.role != "system"]
+
+        turns = []
+        if self.system_in_user and system:
+            system_text = "\n\n".join(system)
+            if dialog and dialog[0][0] == "user":
+                dialog[0] = ("user", f"{system_text}\n\n{dialog[0][1]}")
+            else:
+                dialog.insert(0, ("user", system_text))
+        else:
+            turns = [("system", content) for content in system]
+
+        parts = [self.turn_text(role, content) for role, content in turns + dialog]
+        parts.append(self.generation_prompt)
+        return "".join(parts)
+
+
+TEMPLATES: Dict[str, ChatTemplate] = {
+    # Qwen2/Qwen3, а также большинство современных instruct-моделей
+    "chatml": ChatTemplate(
+        name="chatml",
+        turn="<|im_start|>{role}\n{content}<|im_end|>\n",
+        generation_prompt="<|im_start|>assistant\n",
+        stop=["<|im_end|>", "<|im_start|>"],
+    ),
+    "llama3": ChatTemplate(
+        name="llama3",
+        turn="<|start_header_id|>{role}<|end_header_id|>\n\n{content}<|eot_id|>",
+        generation_prompt="<|start_header_id|>assistant<|end_header_id|>\n\n",
+        stop=["<|eot_id|>", "<|end_of_text|>"],
+    ),
+    "gemma": ChatTemplate(
+        name="gemma",
+        turn="<start_of_turn>{role}\n{content}<end_of_turn>\n",
+        generation_prompt="<start_of_turn>model\n",
+        stop=["<end_of_turn>"],
+        roles={"assistant": "model"},
+        system_in_user=True,
+    ),
+    "mistral": ChatTemplate(
+        name="mistral",
+        turn="{content}",
+        generation_prompt="",
+        stop=["</s>", "[INST]"],
+        role_turns={"user": "[INST] {content} [/INST]", "assistant": "{content}</s>"},
+        system_in_user=True,
+    ),
+    # Прежний формат гейтвея - для моделей без шаблона в метаданных
+    "alpaca": ChatTemplate(
+        name="alpaca",
+        turn="### {role}:\n{content}\n\n",
+        generation_prompt="### Assistant:\n",
+        stop=["### User:"],
+        roles={"system": "System", "user": "User", "assistant": "Assistant"},
+    ),
+}
+
+DEFAULT_TEMPLATE = "alpaca"
+
+# Маркеры в jinja-шаблоне tokenizer.chat_template -> наш шаблон
+_JINJA_MARKERS = [
+    ("<|im_start|>", "chatml"),
+    ("<|start_header_id|>", "llama3"),
+    ("<start_of_turn>", "gemma"),
+    ("[INST]", "mistral"),
+]
+
+# Архитектура из general.architecture, если шаблона в файле нет
+_ARCHITECTURES = {
+    "qwen2": "chatml",
+    "qwen3": "chatml",
+    "qwen2moe": "chatml",
+    "qwen3moe": "chatml",
+    "llama": "llama3",
+    "gemma": "gemma",
+    "gemma2": "gemma",
+    "gemma3": "gemma",
+}
+
+
+def detect_template(chat_template: Optional[str], architecture: Optional[str]) -> str:
+    """Определяет шаблон по jinja-шаблону из GGUF, затем по архитектуре"""
+    if chat_template:
+        for marker, name in _JINJA_MARKERS:
+            if marker in chat_template:
+                return name
+    if architecture in _ARCHITECTURES:
+        return _ARCHITECTURES[architecture]
+    return DEFAULT_TEMPLATE
+
+
+class TemplateRegistry:
+    """Шаблон чата для каждой модели: явная настройка, иначе метаданные GGUF"""
+
+    def __init__(self, overrides: Optional[Dict[str, str]] = None):
+        self.overrides = overrides or {}
+        unknown = {name for name in self.overrides.values() if name not in TEMPLATES}
+        if unknown:
+            raise ValueError(f"Unknown chat templates in config: {', '.join(sorted(unknown))}")
+        self._resolved: Dict[str, ChatTemplate] = {}
+
+    def get(self, model_name: str, model_config: Optional[dict] = None) -> ChatTemplate:
+        """model_config - конфиг ProcessManager с chat_template и architecture из заголовка GGUF"""
+        template = self._resolved.get(model_name)
+        if template is None:
+            config = model_config or {}
+            name = self.overrides.get(model_name) or detect_template(
+                config.get("chat_template"), config.get("architecture")
+            )
+            template = TEMPLATES[name]
+            self._resolved[model_name] = template
+            logger.info(f"💬 Chat template for {model_name}: {template.name}")
+        return template
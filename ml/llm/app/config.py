@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, List, Optional
 
 class Settings(BaseSettings):
     # Пути
@@ -9,13 +9,67 @@ class Settings(BaseSettings):
     # Таймауты
     inactivity_timeout: int = 30
     health_check_timeout: int = 30
+    # Перезапуск упавшего llama-server: задержка restart_backoff, 2x, 4x... до restart_backoff_max
+    restart_max_attempts: int = 5
+    restart_backoff: float = 1.0
+    restart_backoff_max: float = 60.0
     
     # Ресурсы
     cpu_threads: Optional[int] = None
     n_gpu_layers: int = 0  
+    # Подбор threads/batch/ubatch через llama-bench перед первым запуском модели
+    auto_tune: bool = True
+    tuning_profiles_path: str = "./cache/launch_profiles.json"
+    # Потолок контекста на слот: контекст из метаданных GGUF (у Qwen3 - 256k) режется до него
+    max_ctx_size: int = 8192
+    # Сводки GGUF-заголовков (ключ - mtime и размер файла), чтобы не разбирать их при каждом старте
+    metadata_cache_path: str = "./cache/gguf_metadata.json"
+    # Прогрев: эти модели запускаются при старте и не останавливаются по неактивности
+    warm_models: List[str] = []
+    # Предзапуск по часам суток: модель стартует за preload_lead_minutes до часа,
+    # в который она обычно получает не меньше preload_threshold запросов
+    preload_enabled: bool = True
+    preload_lead_minutes: int = 10
+    preload_threshold: float = 3.0
+    usage_stats_path: str = "./cache/usage.json"
+    # --mlock: веса не вытесняются в своп, пока сервер работает
+    mlock: bool = False
+    # Токен для административных эндпоинтов (POST /v1/models/{id}/load); пусто - без проверки
+    admin_token: Optional[str] = None
+    # Эмбеддинги (/v1/embeddings): модели, которые нужно запускать с --embedding,
+    # если это не видно по заголовку GGUF, и сколько текстов уходит в llama-server за раз
+    embedding_models: List[str] = []
+    embedding_batch_size: int = 32
+    # Слоты llama-server: каждый держит свой KV-кэш для отдельного диалога
+    parallel_slots: int = 4
+    
+    # Кэш ответов (только для temperature=0)
+    response_cache_enabled: bool = False
+    response_cache_dir: str = "./cache"
+    response_cache_memory_entries: int = 256
+    response_cache_max_bytes: int = 256 * 1024 * 1024
+    
+    # Стриминг: чанки копятся не дольше этого окна и уходят клиенту одной записью
+    stream_flush_window_ms: int = 20
+    
+    # Батчи (/v1/batches)
+    batches_dir: str = "./batches"
+    # Сколько запросов батча выполняется одновременно (по умолчанию = parallel_slots)
+    batch_concurrency: Optional[int] = None
+    
+    # Шаблоны чата: {"имя модели": "chatml"}; для остальных берется из метаданных GGUF
+    chat_templates: Dict[str, str] = {}
+    
+    # Бюджет контекста: токены считаются через /tokenize, старые ходы обрезаются
+    tokenize_cache_entries: int = 4096
+    # После обрезки история занимает не больше этой доли бюджета - запас на следующие ходы
+    context_low_watermark: float = 0.75
+    context_safety_tokens: int = 64
     
     # Логирование
     log_level: str = "INFO"
+    # Доля запросов, для которых пишется структурированный трейс (без тел запросов)
+    trace_sample_rate: float = 0.01
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,242 @@
+import json
+import logging
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+GGUF_MAGIC = b"GGUF"
+
+# Типы значений метаданных GGUF -> формат struct
+_SCALAR_FORMATS = {
+    0: "<B",   # uint8
+    1: "<b",   # int8
+    2: "<H",   # uint16
+    3: "<h",   # int16
+    4: "<I",   # uint32
+    5: "<i",   # int32
+    6: "<f",   # float32
+    7: "<?",   # bool
+    10: "<Q",  # uint64
+    11: "<q",  # int64
+    12: "<d",  # float64
+}
+_STRING = 8
+_ARRAY = 9
+
+# general.file_type (llama_ftype) -> название квантизации
+FILE_TYPES = {
+    0: "F32", 1: "F16", 2: "Q4_0", 3: "Q4_1", 7: "Q8_0", 8: "Q5_0", 9: "Q5_1",
+    10: "Q2_K", 11: "Q3_K_S", 12: "Q3_K_M", 13: "Q3_K_L", 14: "Q4_K_S", 15: "Q4_K_M",
+    16: "Q5_K_S", 17: "Q5_K_M", 18: "Q6_K", 19: "IQ2_XXS", 20: "IQ2_XS", 21: "Q2_K_S",
+    22: "IQ3_XS", 23: "IQ3_XXS", 24: "IQ1_S", 25: "IQ4_NL", 26: "IQ3_S", 27: "IQ3_M",
+    28: "IQ2_S", 29: "IQ2_M", 30: "IQ4_XS", 31: "IQ1_M", 32: "BF16", 36: "TQ1_0", 37: "TQ2_0",
+}
+
+# Архитектура mmproj-файлов (проекторы изображений для VLM)
+PROJECTOR_ARCHITECTURE = "clip"
+
+# Энкодеры без генерации: им нужен llama-server в режиме --embedding
+EMBEDDING_ARCHITECTURES = {"bert", "nomic-bert", "nomic-bert-moe", "jina-bert-v2", "jina-bert-v3", "modern-bert", "t5encoder"}
+
+# Меняется вместе с набором полей inspect_model, чтобы старые записи кэша перечитывались
+INSPECT_VERSION = 2
+
+
+class GGUFReader:
+    """Разбор заголовка GGUF поверх mmap: веса не читаются, пропуск массивов - это сдвиг смещения"""
+
+    def __init__(self, buf):
+        self.buf = buf
+        self.offset = 0
+
+    def _unpack(self, fmt: str):
+        value = struct.unpack_from(fmt, self.buf, self.offset)[0]
+        self.offset += struct.calcsize(fmt)
+        return value
+
+    def read_string(self) -> str:
+        length = self._unpack("<Q")
+        value = bytes(self.buf[self.offset:self.offset + length]).decode("utf-8", errors="replace")
+        self.offset += length
+        return value
+
+    def read_value(self, value_type: int, keep: bool = True):
+        """Читает значение; при keep=False только пропускает его"""
+        if value_type in _SCALAR_FORMATS:
+            return self._unpack(_SCALAR_FORMATS[value_type])
+        if value_type == _STRING:
+            if keep:
+                return self.read_string()
+            length = self._unpack("<Q")
+            self.offset += length
+            return None
+        if value_type == _ARRAY:
+            item_type = self._unpack("<I")
+            count = self._unpack("<Q")
+            if not keep and item_type in _SCALAR_FORMATS:
+                self.offset += struct.calcsize(_SCALAR_FORMATS[item_type]) * count
+                return None
+            items = [self.read_value(item_type, keep) for _ in range(count)]
+            return items if keep else None
+        raise ValueError(f"Unknown GGUF value type {value_type}")
+
+    def read_header(self):
+        if bytes(self.buf[:4]) != GGUF_MAGIC:
+            raise ValueError("Not a GGUF file")
+        self.offset = 4
+        version = self._unpack("<I")
+        if version < 2:
+            raise ValueError(f"Unsupported GGUF version {version}")
+        tensor_count = self._unpack("<Q")
+        kv_count = self._unpack("<Q")
+        return tensor_count, kv_count
+
+    def read_tensor_elements(self, tensor_count: int) -> int:
+        """Сумма элементов всех тензоров = число параметров модели"""
+        total = 0
+        for _ in range(tensor_count):
+            name_length = self._unpack("<Q")
+            self.offset += name_length  # имя тензора
+            n_dims = self._unpack("<I")
+            elements = 1
+            for _ in range(n_dims):
+                elements *= self._unpack("<Q")
+            self.offset += 4 + 8  # тип и смещение данных
+            total += elements
+        return total
+
+
+def _open(path: str):
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def read_metadata(path: str, keys: Optional[Iterable[str]] = None) -> Dict[str, object]:
+    """Читает метаданные GGUF-файла.
+
+    Если передан keys, сохраняются только эти ключи, а остальные (в том
+    числе словарь токенизатора на сотни тысяч строк) пропускаются.
+    """
+    wanted = set(keys) if keys is not None else None
+    metadata: Dict[str, object] = {}
+
+    mm = _open(path)
+    try:
+        reader = GGUFReader(mm)
+        _, kv_count = reader.read_header()
+        for _ in range(kv_count):
+            key = reader.read_string()
+            value_type = reader._unpack("<I")
+            keep = wanted is None or key in wanted
+            value = reader.read_value(value_type, keep)
+            if keep:
+                metadata[key] = value
+            if wanted is not None and wanted.issubset(metadata):
+                break
+    finally:
+        mm.close()
+    return metadata
+
+
+def inspect_model(path: str) -> Dict[str, object]:
+    """Сводка по модели из заголовка: архитектура, контекст, размерности, параметры, квантизация"""
+    mm = _open(path)
+    try:
+        reader = GGUFReader(mm)
+        tensor_count, kv_count = reader.read_header()
+        metadata: Dict[str, object] = {}
+        for _ in range(kv_count):
+            key = reader.read_string()
+            value_type = reader._unpack("<I")
+            # Массивы (словарь токенизатора) не нужны, из строк - только короткие служебные
+            keep = value_type != _ARRAY
+            metadata[key] = reader.read_value(value_type, keep)
+        parameter_count = reader.read_tensor_elements(tensor_count)
+    finally:
+        mm.close()
+
+    arch = metadata.get("general.architecture")
+
+    def arch_key(name: str):
+        return metadata.get(f"{arch}.{name}")
+
+    head_count = arch_key("attention.head_count")
+    embedding_length = arch_key("embedding_length")
+    key_length = arch_key("attention.key_length")
+    if key_length is None and head_count and embedding_length:
+        key_length = embedding_length // head_count
+
+    return {
+        "architecture": arch,
+        "name": metadata.get("general.name"),
+        "basename": metadata.get("general.basename"),
+        "context_length": arch_key("context_length"),
+        "embedding_length": embedding_length,
+        "block_count": arch_key("block_count"),
+        "head_count": head_count,
+        "head_count_kv": arch_key("attention.head_count_kv") or head_count,
+        "key_length": key_length,
+        "value_length": arch_key("attention.value_length") or key_length,
+        "parameter_count": parameter_count,
+        "quantization": FILE_TYPES.get(metadata.get("general.file_type")),
+        "chat_template": metadata.get("tokenizer.chat_template"),
+        "is_projector": arch == PROJECTOR_ARCHITECTURE,
+        # pooling_type пишут только в эмбеддинг-модели (в том числе на базе qwen3/gemma)
+        "is_embedding": arch in EMBEDDING_ARCHITECTURES or arch_key("pooling_type") is not None,
+        "file_size": os.path.getsize(path),
+    }
+
+
+def kv_cache_bytes(info: Dict[str, object], ctx_size: int, bytes_per_value: int = 2) -> int:
+    """Оценка KV-кэша (f16) на ctx_size токенов"""
+    layers = info.get("block_count") or 0
+    heads_kv = info.get("head_count_kv") or 0
+    per_token = heads_kv * ((info.get("key_length") or 0) + (info.get("value_length") or 0))
+    return layers * per_token * ctx_size * bytes_per_value
+
+
+class MetadataCache:
+    """Кэш inspect_model на диске: ключ - путь, mtime и размер файла"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.entries: Dict[str, dict] = {}
+        self.dirty = False
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def inspect(self, model_path: str) -> Dict[str, object]:
+        stat = os.stat(model_path)
+        entry = self.entries.get(model_path)
+        if (
+            entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size
+            and entry.get("version") == INSPECT_VERSION
+        ):
+            return entry["info"]
+
+        info = inspect_model(model_path)
+        self.entries[model_path] = {
+            "mtime": stat.st_mtime, "size": stat.st_size, "version": INSPECT_VERSION, "info": info
+        }
+        self.dirty = True
+        return info
+
+    def save(self):
+        if not self.dirty:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except OSError as e:
+            logger.warning(f"Cannot save GGUF metadata cache {self.path}: {e}")
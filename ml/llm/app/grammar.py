@@ -0,0 +1,20 @@
+from typing import Dict, Optional
+
+from .schemas import ResponseFormat
+
+# Любой JSON-объект: для response_format {"type": "json_object"}
+ANY_OBJECT_SCHEMA = {"type": "object"}
+
+
+def constraint_params(response_format: Optional[ResponseFormat]) -> Dict:
+    """Параметры llama.cpp /completion, ограничивающие вывод JSON-схемой.
+
+    llama-server сам переводит json_schema в GBNF-грамматику: сэмплер
+    не может выдать токен вне схемы, а после закрывающей скобки объекта
+    грамматика допускает только EOS, поэтому генерация останавливается сразу.
+    """
+    if response_format is None or response_format.type == "text":
+        return {}
+    if response_format.type == "json_object":
+        return {"json_schema": ANY_OBJECT_SCHEMA}
+    return {"json_schema": response_format.json_schema["schema"]}
@@ -1,19 +1,33 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, HTTPException, UploadFile, File, Header
+from fastapi.responses import StreamingResponse, FileResponse, PlainTextResponse
 from contextlib import asynccontextmanager
 import asyncio
 import json
 import logging
 import os
 import time
-from typing import Dict
+from typing import Dict, Optional, Tuple
 
+from .batches import BatchManager
+from .cache import ResponseCache, cache_key, is_deterministic
+from .chat_templates import TemplateRegistry
+from .config import settings
+from .grammar import constraint_params
+from .metrics import metrics
+from .preload import Preloader, UsageHistogram
 from .process_manager import ProcessManager
-from .schemas import ChatCompletionRequest, CompletionRequest, ModelListResponse
+from .slots import session_key
+from .tokens import ContextBudget, ContextOverflowError, TokenCounter
+from .streaming import DONE_EVENT, SSETranslator, batched
+from .schemas import (
+    ChatCompletionRequest, CompletionRequest, EmbeddingData, EmbeddingRequest, EmbeddingResponse,
+    EmbeddingUsage, ModelListResponse, TokenizeRequest, TokenizeResponse
+)
 
 # 🔴 ВАЖНО: Настройка логирования с выводом в консоль
+# Тела запросов не логируются: вместо них выборочные трейсы (trace_sample_rate)
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=getattr(logging, settings.log_level.upper(), logging.INFO),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
         logging.StreamHandler()
@@ -23,11 +37,29 @@ logger = logging.getLogger(__name__)
 
 # Глобальный менеджер процессов
 process_manager = None
+# Кэш детерминированных ответов (включается настройкой response_cache_enabled)
+response_cache: Optional[ResponseCache] = None
+# Офлайн-обработка JSONL-батчей
+batch_manager: Optional[BatchManager] = None
+# Прогрев и предзапуск моделей
+preloader: Optional[Preloader] = None
+# Шаблоны чата по моделям
+template_registry: Optional[TemplateRegistry] = None
+# Подсчет токенов и обрезка истории под контекст
+token_counter = TokenCounter(settings.tokenize_cache_entries)
+context_budget = ContextBudget(
+    token_counter,
+    low_watermark=settings.context_low_watermark,
+    safety_tokens=settings.context_safety_tokens
+)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    global process_manager
+    global process_manager, response_cache, batch_manager, template_registry, preloader
+    
+    metrics.trace_sample_rate = settings.trace_sample_rate
+    template_registry = TemplateRegistry(settings.chat_templates)
     
     # Берем пути из переменных окружения или используем дефолтные
     llama_cpp_path = os.getenv("LLAMA_CPP_PATH", "./llama-server")
@@ -46,8 +78,47 @@ async def lifespan(app: FastAPI):
     process_manager = ProcessManager(
         llama_cpp_path=llama_cpp_path,
         models_dir=models_dir,
-        inactivity_timeout=300
+        inactivity_timeout=300,
+        parallel_slots=settings.parallel_slots,
+        metadata_cache_path=settings.metadata_cache_path,
+        max_ctx_size=settings.max_ctx_size,
+        cpu_threads=settings.cpu_threads,
+        n_gpu_layers=settings.n_gpu_layers,
+        auto_tune=settings.auto_tune,
+        tuning_profiles_path=settings.tuning_profiles_path,
+        mlock=settings.mlock,
+        embedding_models=settings.embedding_models,
+        restart_max_attempts=settings.restart_max_attempts,
+        restart_backoff=settings.restart_backoff,
+        restart_backoff_max=settings.restart_backoff_max
+    )
+    
+    # Постоянно прогретые модели стартуют сразу, остальные - по гистограмме использования
+    preloader = Preloader(
+        process_manager,
+        UsageHistogram(settings.usage_stats_path),
+        warm_models=settings.warm_models,
+        lead_minutes=settings.preload_lead_minutes,
+        threshold=settings.preload_threshold,
+        predictive=settings.preload_enabled
+    )
+    await preloader.start()
+    
+    if settings.response_cache_enabled:
+        response_cache = ResponseCache(
+            cache_dir=settings.response_cache_dir,
+            memory_entries=settings.response_cache_memory_entries,
+            max_disk_bytes=settings.response_cache_max_bytes
+        )
+        logger.info(f"🗄️ Response cache enabled: {settings.response_cache_dir}")
+    
+    # Батчи, прерванные прошлым рестартом, продолжаются с места остановки
+    batch_manager = BatchManager(
+        batches_dir=settings.batches_dir,
+        handler=dispatch_batch_request,
+        concurrency=settings.batch_concurrency or settings.parallel_slots
     )
+    await batch_manager.resume_all()
     
     # Запускаем фоновую задачу для очистки
     cleanup_task = asyncio.create_task(cleanup_inactive_servers())
@@ -55,6 +126,8 @@ async def lifespan(app: FastAPI):
     yield
     
     # Shutdown
+    await preloader.stop()
+    await batch_manager.shutdown()
     cleanup_task.cancel()
     try:
         await cleanup_task
@@ -76,11 +149,26 @@ async def cleanup_inactive_servers():
     while True:
         try:
             if process_manager:
-                await process_manager.cleanup_inactive()
+                await process_manager.cleanup_inactive(preloader.keep_warm() if preloader else frozenset())
         except Exception as e:
             logger.error(f"Error in cleanup task: {e}", exc_info=True)
         await asyncio.sleep(5)
 
+async def lookup_cache(model_name: str, params: Dict) -> Tuple[Optional[str], Optional[dict]]:
+    """Возвращает ключ кэша (если запрос кэшируемый) и найденную запись"""
+    if not response_cache or not is_deterministic(params):
+        return None, None
+    key = cache_key(model_name, params)
+    return key, await response_cache.get(key)
+
+def cached_result(entry: dict) -> dict:
+    """Приводит запись кэша к виду ответа llama.cpp /completion"""
+    return {
+        "content": "".join(entry["chunks"]),
+        "tokens_evaluated": entry.get("tokens_evaluated", 0),
+        "tokens_predicted": entry.get("tokens_predicted", 0)
+    }
+
 @app.get("/v1/models")
 async def list_models():
     """Список доступных моделей"""
@@ -98,6 +186,26 @@ async def list_models():
         for model_name in models
     ])
 
+@app.post("/v1/models/{model_id}/load")
+async def load_model(model_id: str, authorization: Optional[str] = Header(None)):
+    """Запускает сервер модели заранее, чтобы первый запрос не ждал холодного старта"""
+    if settings.admin_token and authorization != f"Bearer {settings.admin_token}":
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+    if not process_manager:
+        raise HTTPException(status_code=500, detail="Process manager not initialized")
+    if model_id not in process_manager.get_available_models():
+        raise HTTPException(status_code=404, detail=f"Model {model_id} not found")
+    
+    started = time.perf_counter()
+    already_loaded = model_id in process_manager.active_servers
+    await process_manager.get_server_for_model(model_id)
+    return {
+        "id": model_id,
+        "status": "loaded",
+        "already_loaded": already_loaded,
+        "load_seconds": round(time.perf_counter() - started, 3)
+    }
+
 @app.post("/v1/chat/completions")
 async def create_chat_completion(request: ChatCompletionRequest):
     """Chat completion endpoint (OpenAI compatible)"""
@@ -107,98 +215,99 @@ async def create_chat_completion(request: ChatCompletionRequest):
         raise HTTPException(status_code=500, detail="Process manager not initialized")
     
     try:
-        # 🔴 ИСПРАВЛЕНИЕ: Получаем URL запущенного сервера
-        logger.info(f"🔄 Getting server for model: {request.model}")
-        base_url = await process_manager.get_server_for_model(request.model)
-        logger.info(f"✅ Server URL obtained: {base_url}")
-        
-        # Формируем промпт для llama.cpp из истории диалога
-        prompt = ""
-        for msg in request.messages:
-            role = msg.role
-            content = msg.content
-            
-            if role == "system":
-                prompt += f"### System:\n{content}\n\n"
-            elif role == "user":
-                prompt += f"### User:\n{content}\n\n"
-            elif role == "assistant":
-                prompt += f"### Assistant:\n{content}\n\n"
+        # Формируем промпт в формате модели (шаблон из GGUF или настроек)
+        model_config = process_manager.get_model_config(request.model)
+        template = template_registry.get(request.model, model_config)
+        prompt = template.render(request.messages)
+        n_predict = request.max_tokens or 512
+        conversation = session_key(request.messages, request.session_id)
         
-        prompt += "### Assistant:\n"
-        
-        logger.debug(f"📝 Generated prompt (first 200 chars): {prompt[:200]}...")
+        # Длинную историю считаем в токенах и обрезаем до отправки, а не полагаемся на context shift
+        base_url = None
+        if not context_budget.fits_without_counting(prompt, model_config["ctx_size"], n_predict):
+            base_url = await process_manager.get_server_for_model(request.model)
+            messages = await context_budget.fit(
+                base_url, request.model, template, request.messages,
+                model_config["ctx_size"], n_predict, session=conversation
+            )
+            prompt = template.render(messages)
+        # Стоп-токены шаблона нужны всегда, иначе генерация идет до n_predict
+        user_stop = [request.stop] if isinstance(request.stop, str) else (request.stop or [])
         
         # Подготавливаем параметры для llama.cpp
         params = {
             "prompt": prompt,
             "stream": request.stream,
-            "n_predict": request.max_tokens or 512,
-            "temperature": request.temperature or 0.7,
-            "top_p": request.top_p or 0.95,
-            "stop": request.stop or ["### User:"],
+            "n_predict": n_predict,
+            "temperature": request.temperature if request.temperature is not None else 0.7,
+            "top_p": request.top_p if request.top_p is not None else 0.95,
+            "stop": template.stop + [stop for stop in user_stop if stop not in template.stop],
             "repeat_penalty": 1.1,
-            "top_k": 40
+            "top_k": 40,
+            "cache_prompt": True,
+            **constraint_params(request.response_format)
         }
         
-        logger.debug(f"⚙️ Request params: {params}")
-        
-        if request.stream:
-            logger.info("🌊 Streaming response")
-            return StreamingResponse(
-                stream_completion(base_url, params, request.model),
-                media_type="text/event-stream"
-            )
+        # Попадание в кэш отдается без обращения к ProcessManager
+        key, cached = await lookup_cache(request.model, params)
+        metrics.observe_request(request.model, "chat", cached=bool(cached))
+        preloader.record(request.model)
+        if cached:
+            logger.info(f"🗄️ Response cache hit for model: {request.model}")
+            if request.stream:
+                return StreamingResponse(
+                    replay_stream(cached, request.model),
+                    media_type="text/event-stream"
+                )
+            result = cached_result(cached)
         else:
-            import httpx
-            logger.info(f"📡 Sending request to {base_url}/completion")
+            # 🔴 ИСПРАВЛЕНИЕ: Получаем URL запущенного сервера
+            if base_url is None:
+                logger.info(f"🔄 Getting server for model: {request.model}")
+                base_url = await process_manager.get_server_for_model(request.model)
+                logger.info(f"✅ Server URL obtained: {base_url}")
             
-            async with httpx.AsyncClient(timeout=300.0) as client:
-                response = await client.post(
-                    f"{base_url}/completion",
-                    json=params,
-                    headers={"Content-Type": "application/json"}
+            # Диалог всегда попадает в один и тот же слот, где лежит его KV-кэш
+            slot_id = process_manager.acquire_slot(request.model, conversation)
+            if slot_id is not None:
+                params["id_slot"] = slot_id
+            
+            if request.stream:
+                logger.info("🌊 Streaming response")
+                return StreamingResponse(
+                    stream_completion(base_url, params, request.model, key),
+                    media_type="text/event-stream"
                 )
-                
-                logger.info(f"📨 Response status: {response.status_code}")
-                logger.debug(f"📨 Response body: {response.text[:500]}")
-                
-                if response.status_code != 200:
-                    error_detail = response.text
-                    logger.error(f"❌ llama.cpp server error: {error_detail}")
-                    raise HTTPException(
-                        status_code=response.status_code,
-                        detail=error_detail
-                    )
-                
-                result = response.json()
-                logger.debug(f"✅ Got result from llama.cpp: {result}")
-                
-                await process_manager.update_activity(request.model)
-                
-                response_data = {
-                    "id": f"chatcmpl-{hash(prompt)}",
-                    "object": "chat.completion",
-                    "created": int(time.time()),
-                    "model": request.model,
-                    "choices": [{
-                        "index": 0,
-                        "message": {
-                            "role": "assistant",
-                            "content": result.get("content", "")
-                        },
-                        "finish_reason": "stop"
-                    }],
-                    "usage": {
-                        "prompt_tokens": result.get("tokens_evaluated", 0),
-                        "completion_tokens": result.get("tokens_predicted", 0),
-                        "total_tokens": result.get("tokens_evaluated", 0) + result.get("tokens_predicted", 0)
-                    }
-                }
-                
-                logger.info(f"✅ Returning chat completion response")
-                return response_data
             
+            result = await fetch_completion(base_url, params, request.model, key, timeout=300.0)
+        
+        response_data = {
+            "id": f"chatcmpl-{hash(prompt)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.model,
+            "choices": [{
+                "index": 0,
+                "message": {
+                    "role": "assistant",
+                    "content": result.get("content", "")
+                },
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": result.get("tokens_evaluated", 0),
+                "completion_tokens": result.get("tokens_predicted", 0),
+                "total_tokens": result.get("tokens_evaluated", 0) + result.get("tokens_predicted", 0)
+            }
+        }
+        
+        logger.info(f"✅ Returning chat completion response")
+        return response_data
+            
+    except HTTPException:
+        raise
+    except ContextOverflowError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except ValueError as e:
         logger.error(f"❌ ValueError: {e}")
         raise HTTPException(status_code=404, detail=str(e))
@@ -215,76 +324,67 @@ async def create_completion(request: CompletionRequest):
         raise HTTPException(status_code=500, detail="Process manager not initialized")
     
     try:
-        # 🔴 КРИТИЧЕСКАЯ ОШИБКА: Было update_activity вместо get_server_for_model!
-        logger.info(f"🔄 Getting server for model: {request.model}")
-        base_url = await process_manager.get_server_for_model(request.model)  # ← ИСПРАВЛЕНО!
-        logger.info(f"✅ Server URL obtained: {base_url}")
-        
         params = {
             "prompt": request.prompt if isinstance(request.prompt, str) else "\n".join(request.prompt),
             "stream": request.stream,
             "n_predict": request.max_tokens or 512,
-            "temperature": request.temperature or 0.7,
-            "top_p": request.top_p or 0.95,
+            "temperature": request.temperature if request.temperature is not None else 0.7,
+            "top_p": request.top_p if request.top_p is not None else 0.95,
             "stop": request.stop,
-            "repeat_penalty": 1.1
+            "repeat_penalty": 1.1,
+            "cache_prompt": True,
+            **constraint_params(request.response_format)
         }
         
-        logger.debug(f"⚙️ Request params: {params}")
-        
-        if request.stream:
-            logger.info("🌊 Streaming response")
-            return StreamingResponse(
-                stream_completion(base_url, params, request.model),
-                media_type="text/event-stream"
-            )
+        # Попадание в кэш отдается без обращения к ProcessManager
+        key, cached = await lookup_cache(request.model, params)
+        metrics.observe_request(request.model, "completion", cached=bool(cached))
+        preloader.record(request.model)
+        if cached:
+            logger.info(f"🗄️ Response cache hit for model: {request.model}")
+            if request.stream:
+                return StreamingResponse(
+                    replay_stream(cached, request.model),
+                    media_type="text/event-stream"
+                )
+            result = cached_result(cached)
         else:
-            import httpx
-            logger.info(f"📡 Sending request to {base_url}/completion")
+            # 🔴 КРИТИЧЕСКАЯ ОШИБКА: Было update_activity вместо get_server_for_model!
+            logger.info(f"🔄 Getting server for model: {request.model}")
+            base_url = await process_manager.get_server_for_model(request.model)  # ← ИСПРАВЛЕНО!
+            logger.info(f"✅ Server URL obtained: {base_url}")
             
-            async with httpx.AsyncClient(timeout=120.0) as client:
-                response = await client.post(
-                    f"{base_url}/completion",
-                    json=params,
-                    headers={"Content-Type": "application/json"}
+            if request.stream:
+                logger.info("🌊 Streaming response")
+                return StreamingResponse(
+                    stream_completion(base_url, params, request.model, key),
+                    media_type="text/event-stream"
                 )
-                
-                logger.info(f"📨 Response status: {response.status_code}")
-                logger.debug(f"📨 Response body: {response.text[:500]}")
-                
-                if response.status_code != 200:
-                    error_detail = response.text
-                    logger.error(f"❌ llama.cpp server error: {error_detail}")
-                    raise HTTPException(
-                        status_code=response.status_code,
-                        detail=error_detail
-                    )
-                
-                result = response.json()
-                logger.debug(f"✅ Got result from llama.cpp: {result}")
-                
-                await process_manager.update_activity(request.model)
-                
-                response_data = {
-                    "id": f"cmpl-{hash(str(request.prompt))}",
-                    "object": "text_completion",
-                    "created": int(time.time()),
-                    "model": request.model,
-                    "choices": [{
-                        "text": result.get("content", ""),
-                        "index": 0,
-                        "finish_reason": "stop"
-                    }],
-                    "usage": {
-                        "prompt_tokens": result.get("tokens_evaluated", 0),
-                        "completion_tokens": result.get("tokens_predicted", 0),
-                        "total_tokens": result.get("tokens_evaluated", 0) + result.get("tokens_predicted", 0)
-                    }
-                }
-                
-                logger.info(f"✅ Returning completion response")
-                return response_data
             
+            result = await fetch_completion(base_url, params, request.model, key, timeout=120.0)
+        
+        response_data = {
+            "id": f"cmpl-{hash(str(request.prompt))}",
+            "object": "text_completion",
+            "created": int(time.time()),
+            "model": request.model,
+            "choices": [{
+                "text": result.get("content", ""),
+                "index": 0,
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": result.get("tokens_evaluated", 0),
+                "completion_tokens": result.get("tokens_predicted", 0),
+                "total_tokens": result.get("tokens_evaluated", 0) + result.get("tokens_predicted", 0)
+            }
+        }
+        
+        logger.info(f"✅ Returning completion response")
+        return response_data
+            
+    except HTTPException:
+        raise
     except ValueError as e:
         logger.error(f"❌ ValueError: {e}")
         raise HTTPException(status_code=404, detail=str(e))
@@ -292,62 +392,271 @@ async def create_completion(request: CompletionRequest):
         logger.error(f"❌ Error in completion: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-async def stream_completion(base_url: str, params: Dict, model_name: str):
-    """Stream ответ"""
+@app.post("/v1/tokenize", response_model=TokenizeResponse)
+async def tokenize(request: TokenizeRequest):
+    """Число токенов текста или отрендеренного диалога для модели"""
+    if not process_manager:
+        raise HTTPException(status_code=500, detail="Process manager not initialized")
+    
+    try:
+        model_config = process_manager.get_model_config(request.model)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    text = request.content
+    if request.messages is not None:
+        template = template_registry.get(request.model, model_config)
+        text = template.render(request.messages)
+    
+    base_url = await process_manager.get_server_for_model(request.model)
+    count, = await token_counter.count_many(base_url, request.model, [text])
+    return TokenizeResponse(model=request.model, count=count, context_size=model_config["ctx_size"])
+
+@app.post("/v1/embeddings", response_model=EmbeddingResponse)
+async def create_embeddings(request: EmbeddingRequest):
+    """Эмбеддинги в формате OpenAI; вход режется на батчи, батчи идут в слоты параллельно"""
+    import httpx
+    if not process_manager:
+        raise HTTPException(status_code=500, detail="Process manager not initialized")
+    
+    try:
+        model_config = process_manager.get_model_config(request.model)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if not model_config["embedding"]:
+        raise HTTPException(status_code=400, detail=f"Model {request.model} is not an embedding model")
+    
+    metrics.observe_request(request.model, "embeddings")
+    preloader.record(request.model)
+    
+    inputs = [request.input] if isinstance(request.input, str) else request.input
+    size = max(1, settings.embedding_batch_size)
+    batches = [inputs[i:i + size] for i in range(0, len(inputs), size)]
+    base_url = await process_manager.get_server_for_model(request.model)
+    semaphore = asyncio.Semaphore(settings.parallel_slots)
+    
+    async def embed(client: httpx.AsyncClient, batch: list) -> dict:
+        async with semaphore:
+            response = await client.post(f"{base_url}/v1/embeddings", json={"input": batch})
+        if response.status_code != 200:
+            logger.error(f"❌ llama.cpp embeddings error: {response.text}")
+            raise HTTPException(status_code=response.status_code, detail=response.text)
+        return response.json()
+    
+    metrics.in_flight[request.model] += 1
+    try:
+        async with httpx.AsyncClient(timeout=120.0) as client:
+            results = await asyncio.gather(*(embed(client, batch) for batch in batches))
+    finally:
+        metrics.in_flight[request.model] -= 1
+    await process_manager.update_activity(request.model)
+    
+    data, prompt_tokens = [], 0
+    for offset, result in zip(range(0, len(inputs), size), results):
+        for item in result["data"]:
+            data.append(EmbeddingData(index=offset + item["index"], embedding=item["embedding"]))
+        prompt_tokens += result.get("usage", {}).get("prompt_tokens", 0)
+    data.sort(key=lambda item: item.index)
+    
+    return EmbeddingResponse(
+        data=data,
+        model=request.model,
+        usage=EmbeddingUsage(prompt_tokens=prompt_tokens, total_tokens=prompt_tokens)
+    )
+
+async def fetch_completion(base_url: str, params: Dict, model_name: str,
+                           key: Optional[str] = None, timeout: float = 120.0) -> dict:
+    """Обычный (не потоковый) запрос к llama.cpp /completion"""
+    import httpx
+    logger.info(f"📡 Sending request to {base_url}/completion")
+    
+    metrics.in_flight[model_name] += 1
+    try:
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            response = await client.post(
+                f"{base_url}/completion",
+                json=params,
+                headers={"Content-Type": "application/json"}
+            )
+    finally:
+        metrics.in_flight[model_name] -= 1
+    
+    logger.info(f"📨 Response status: {response.status_code}")
+    
+    if response.status_code != 200:
+        error_detail = response.text
+        logger.error(f"❌ llama.cpp server error: {error_detail}")
+        raise HTTPException(
+            status_code=response.status_code,
+            detail=error_detail
+        )
+    
+    result = response.json()
+    
+    await process_manager.update_activity(model_name)
+    
+    timings = result.get("timings")
+    metrics.observe_timings(model_name, timings)
+    if timings:
+        # Без стрима первый токен появляется сразу после обработки промпта
+        metrics.ttft[model_name].observe(timings.get("prompt_ms", 0.0) / 1000)
+    metrics.trace(
+        "completion",
+        model=model_name,
+        prompt_chars=len(params["prompt"]),
+        tokens_evaluated=result.get("tokens_evaluated", 0),
+        tokens_predicted=result.get("tokens_predicted", 0),
+        timings=timings
+    )
+    
+    if key and response_cache:
+        await response_cache.put(key, {
+            "chunks": [result.get("content", "")],
+            "tokens_evaluated": result.get("tokens_evaluated", 0),
+            "tokens_predicted": result.get("tokens_predicted", 0)
+        })
+    
+    return result
+
+async def replay_stream(entry: dict, model_name: str):
+    """Повторяет сохраненный в кэше стрим"""
+    translator = SSETranslator(f"chatcmpl-{int(time.time())}", model_name)
+    for content in entry["chunks"]:
+        yield translator.chunk(json.dumps(content, ensure_ascii=False).encode("utf-8"))
+    yield DONE_EVENT
+
+async def stream_completion(base_url: str, params: Dict, model_name: str, key: Optional[str] = None):
+    """Stream ответ: сырые байты llama.cpp переводятся в чанки OpenAI без json.loads/dumps на токен"""
     import httpx
-    import time
     
     logger.info(f"🌊 Starting stream to {base_url}/completion")
     
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        async with client.stream(
-            "POST",
-            f"{base_url}/completion",
-            json={**params, "stream": True},
-            headers={"Content-Type": "application/json"}
-        ) as response:
-            
-            request_id = f"chatcmpl-{int(time.time())}"
-            logger.debug(f"🌊 Stream request ID: {request_id}")
-            
-            async for line in response.aiter_lines():
-                if line.startswith("data: "):
-                    data = line[6:]
-                    
-                    # [DONE] marker
-                    if data.strip() == "[DONE]":
-                        logger.debug("🌊 Stream completed")
-                        yield "data: [DONE]\n\n"
-                        break
-                    
-                    try:
-                        json_data = json.loads(data)
-                        content = json_data.get("content", "")
-                        
-                        # Формируем чанк в формате OpenAI
-                        chunk = {
-                            "id": request_id,
-                            "object": "chat.completion.chunk",
-                            "created": int(time.time()),
-                            "model": model_name,
-                            "choices": [{
-                                "index": 0,
-                                "delta": {"content": content} if content else {},
-                                "finish_reason": None
-                            }]
-                        }
-                        
-                        # ВАЖНО: используем ensure_ascii=False для кириллицы и спецсимволов!
-                        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
-                        
-                    except json.JSONDecodeError as e:
-                        logger.warning(f"⚠️ Failed to parse line: {line} | Error: {e}")
-                        continue
-            
-            # Обновляем активность ПОСЛЕ завершения стрима
-            if process_manager:
-                await process_manager.update_activity(model_name)
-                logger.debug(f"✅ Updated activity for model: {model_name}")
+    request_id = f"chatcmpl-{int(time.time())}"
+    logger.debug(f"🌊 Stream request ID: {request_id}")
+    
+    # Чанки декодируем только если ответ потом пойдет в кэш
+    translator = SSETranslator(request_id, model_name, collect=bool(key and response_cache))
+    
+    started = time.perf_counter()
+    first_token = True
+    metrics.in_flight[model_name] += 1
+    try:
+        async with httpx.AsyncClient(timeout=120.0) as client:
+            async with client.stream(
+                "POST",
+                f"{base_url}/completion",
+                json={**params, "stream": True},
+                headers={"Content-Type": "application/json"}
+            ) as response:
+                
+                window = settings.stream_flush_window_ms / 1000
+                async for data in batched(response.aiter_raw(), translator, window):
+                    if first_token:
+                        metrics.ttft[model_name].observe(time.perf_counter() - started)
+                        first_token = False
+                    yield data
+                
+                logger.debug("🌊 Stream completed")
+                
+                # Обновляем активность ПОСЛЕ завершения стрима
+                if process_manager:
+                    await process_manager.update_activity(model_name)
+                    logger.debug(f"✅ Updated activity for model: {model_name}")
+    finally:
+        metrics.in_flight[model_name] -= 1
+    
+    final = translator.final or {}
+    metrics.observe_timings(model_name, final.get("timings"))
+    metrics.trace(
+        "stream",
+        model=model_name,
+        prompt_chars=len(params["prompt"]),
+        tokens_evaluated=final.get("tokens_evaluated", 0),
+        tokens_predicted=final.get("tokens_predicted", 0),
+        timings=final.get("timings")
+    )
+    
+    # В кэш попадают только полностью доигранные стримы
+    if translator.chunks is not None and translator.done:
+        await response_cache.put(key, {
+            "chunks": translator.chunks,
+            "tokens_evaluated": final.get("tokens_evaluated", 0),
+            "tokens_predicted": final.get("tokens_predicted", 0)
+        })
+
+async def dispatch_batch_request(url: str, body: dict) -> dict:
+    """Выполняет одну строку батча через обычные эндпоинты (с кэшем и слотами)"""
+    body = {**body, "stream": False}
+    if url == "/v1/chat/completions":
+        return await create_chat_completion(ChatCompletionRequest(**body))
+    if url == "/v1/completions":
+        return await create_completion(CompletionRequest(**body))
+    raise ValueError(f"Unsupported batch url: {url}")
+
+@app.post("/v1/batches")
+async def create_batch(file: UploadFile = File(...)):
+    """Создает батч из JSONL-файла (формат OpenAI Batch API)"""
+    if not batch_manager:
+        raise HTTPException(status_code=500, detail="Batch manager not initialized")
+    
+    content = await file.read()
+    try:
+        batch = await batch_manager.create(content)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    logger.info(f"📦 Created batch {batch['id']} with {batch['request_counts']['total']} requests")
+    return batch
+
+@app.get("/v1/batches")
+async def list_batches():
+    """Список батчей"""
+    if not batch_manager:
+        raise HTTPException(status_code=500, detail="Batch manager not initialized")
+    return {"object": "list", "data": batch_manager.list_batches()}
+
+@app.get("/v1/batches/{batch_id}")
+async def get_batch(batch_id: str):
+    """Статус батча и счетчики"""
+    if not batch_manager:
+        raise HTTPException(status_code=500, detail="Batch manager not initialized")
+    try:
+        return batch_manager.get(batch_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.post("/v1/batches/{batch_id}/cancel")
+async def cancel_batch(batch_id: str):
+    """Отменяет батч (уже готовые результаты сохраняются)"""
+    if not batch_manager:
+        raise HTTPException(status_code=500, detail="Batch manager not initialized")
+    try:
+        return await batch_manager.cancel(batch_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.get("/v1/batches/{batch_id}/output")
+async def get_batch_output(batch_id: str, errors: bool = False):
+    """Файл результатов батча (или файл ошибок при errors=true)"""
+    if not batch_manager:
+        raise HTTPException(status_code=500, detail="Batch manager not initialized")
+    try:
+        batch_manager.get(batch_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    path = batch_manager.error_path(batch_id) if errors else batch_manager.output_path(batch_id)
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="No results yet")
+    return FileResponse(path=path, media_type="application/jsonl", filename=path.name)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Метрики гейтвея в формате Prometheus"""
+    return PlainTextResponse(
+        metrics.render(process_manager, response_cache, context_budget),
+        media_type="text/plain; version=0.0.4"
+    )
 
 @app.get("/health")
 async def health_check():
@@ -0,0 +1,173 @@
+import json
+import logging
+import random
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+
+trace_logger = logging.getLogger("app.trace")
+
+
+class Summary:
+    """Сумма и количество наблюдений (тип summary в Prometheus)"""
+
+    __slots__ = ("count", "total")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+
+
+def _labels(**labels) -> str:
+    inner = ",".join(f'{k}="{str(v).replace(chr(34), "")}"' for k, v in labels.items())
+    return "{" + inner + "}"
+
+
+def read_rss_bytes(pid: int) -> Optional[int]:
+    """Резидентная память процесса из /proc (только Linux)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        return None
+    return None
+
+
+def read_available_memory() -> Optional[int]:
+    """MemAvailable из /proc/meminfo (только Linux)"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        return None
+    return None
+
+
+class Metrics:
+    """Счетчики гейтвея в памяти процесса, отдаются в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self.trace_sample_rate = 0.0
+        self.requests: Dict[Tuple[str, str, str], int] = defaultdict(int)
+        self.in_flight: Dict[str, int] = defaultdict(int)
+        self.ttft: Dict[str, Summary] = defaultdict(Summary)
+        self.queue_wait: Dict[str, Summary] = defaultdict(Summary)
+        self.cold_start: Dict[str, Summary] = defaultdict(Summary)
+        self.crashes: Dict[str, int] = defaultdict(int)
+        self.prompt_tokens: Dict[str, int] = defaultdict(int)
+        self.prompt_seconds: Dict[str, float] = defaultdict(float)
+        self.generated_tokens: Dict[str, int] = defaultdict(int)
+        self.generation_seconds: Dict[str, float] = defaultdict(float)
+
+    # === Наблюдения ===
+    def observe_request(self, model: str, endpoint: str, cached: bool = False):
+        self.requests[(model, endpoint, "true" if cached else "false")] += 1
+
+    def observe_timings(self, model: str, timings: Optional[dict]):
+        """Учитывает timings из ответа llama.cpp"""
+        if not timings:
+            return
+        self.prompt_tokens[model] += timings.get("prompt_n", 0)
+        self.prompt_seconds[model] += timings.get("prompt_ms", 0.0) / 1000
+        self.generated_tokens[model] += timings.get("predicted_n", 0)
+        self.generation_seconds[model] += timings.get("predicted_ms", 0.0) / 1000
+
+    # === Трейсы ===
+    def trace(self, event: str, **fields):
+        """Структурированная запись без тел запросов; пишется только для доли запросов"""
+        if self.trace_sample_rate <= 0 or random.random() >= self.trace_sample_rate:
+            return
+        trace_logger.info(json.dumps({"event": event, **fields}, ensure_ascii=False, default=str))
+
+    # === Экспорт ===
+    def render(self, process_manager=None, response_cache=None, context_budget=None) -> str:
+        lines = []
+
+        def family(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        family("llm_requests_total", "counter", "Completion requests by model, endpoint and cache hit")
+        for (model, endpoint, cached), value in self.requests.items():
+            lines.append(f"llm_requests_total{_labels(model=model, endpoint=endpoint, cached=cached)} {value}")
+
+        family("llm_requests_in_flight", "gauge", "Requests currently generating on llama-server slots")
+        for model, value in self.in_flight.items():
+            lines.append(f"llm_requests_in_flight{_labels(model=model)} {value}")
+
+        for name, summaries, help_text in (
+            ("llm_time_to_first_token_seconds", self.ttft, "Time to first token"),
+            ("llm_queue_wait_seconds", self.queue_wait, "Time waiting for the process manager lock"),
+            ("llm_cold_start_seconds", self.cold_start, "llama-server startup duration"),
+        ):
+            family(name, "summary", help_text)
+            for model, summary in summaries.items():
+                lines.append(f"{name}_sum{_labels(model=model)} {summary.total:.6f}")
+                lines.append(f"{name}_count{_labels(model=model)} {summary.count}")
+
+        for name, values, help_text in (
+            ("llm_prompt_tokens_total", self.prompt_tokens, "Prompt tokens evaluated by llama.cpp"),
+            ("llm_prompt_seconds_total", self.prompt_seconds, "Time spent on prompt evaluation"),
+            ("llm_generated_tokens_total", self.generated_tokens, "Tokens generated by llama.cpp"),
+            ("llm_generation_seconds_total", self.generation_seconds, "Time spent on generation"),
+        ):
+            family(name, "counter", help_text)
+            for model, value in values.items():
+                lines.append(f"{name}{_labels(model=model)} {value}")
+
+        # Скорости считаем тут же, чтобы их было видно и без PromQL
+        family("llm_tokens_per_second", "gauge", "Average tokens/sec by phase (prompt or generation)")
+        for model in set(self.prompt_seconds) | set(self.generation_seconds):
+            if self.prompt_seconds[model] > 0:
+                rate = self.prompt_tokens[model] / self.prompt_seconds[model]
+                lines.append(f"llm_tokens_per_second{_labels(model=model, phase='prompt')} {rate:.3f}")
+            if self.generation_seconds[model] > 0:
+                rate = self.generated_tokens[model] / self.generation_seconds[model]
+                lines.append(f"llm_tokens_per_second{_labels(model=model, phase='generation')} {rate:.3f}")
+
+        if process_manager is not None:
+            family("llm_active_servers", "gauge", "Running llama-server processes")
+            lines.append(f"llm_active_servers {len(process_manager.active_servers)}")
+
+            servers = list(process_manager.active_servers.items())
+            family("llm_server_crashes_total", "counter", "llama-server processes that exited without being stopped")
+            for model, value in self.crashes.items():
+                lines.append(f"llm_server_crashes_total{_labels(model=model)} {value}")
+
+            family("llm_server_slots", "gauge", "Parallel slots per running llama-server")
+            for model, info in servers:
+                lines.append(f"llm_server_slots{_labels(model=model)} {info['slots'].n_slots}")
+
+            family("llm_server_resident_memory_bytes", "gauge", "Resident memory of llama-server")
+            for model, info in servers:
+                rss = read_rss_bytes(info["process"].pid)
+                if rss is not None:
+                    lines.append(f"llm_server_resident_memory_bytes{_labels(model=model)} {rss}")
+
+        if response_cache is not None:
+            family("llm_response_cache_lookups_total", "counter", "Response cache lookups by result")
+            lines.append(f'llm_response_cache_lookups_total{{result="hit"}} {response_cache.hits}')
+            lines.append(f'llm_response_cache_lookups_total{{result="miss"}} {response_cache.misses}')
+            lookups = response_cache.hits + response_cache.misses
+            family("llm_response_cache_hit_ratio", "gauge", "Share of response cache hits")
+            lines.append(f"llm_response_cache_hit_ratio {response_cache.hits / lookups if lookups else 0:.4f}")
+
+        if context_budget is not None:
+            counter = context_budget.counter
+            family("llm_tokenize_cache_lookups_total", "counter", "Token count cache lookups by result")
+            lines.append(f'llm_tokenize_cache_lookups_total{{result="hit"}} {counter.hits}')
+            lines.append(f'llm_tokenize_cache_lookups_total{{result="miss"}} {counter.misses}')
+            family("llm_context_trimmed_requests_total", "counter", "Chat requests whose history was trimmed to fit the context")
+            lines.append(f"llm_context_trimmed_requests_total {context_budget.trimmed_requests}")
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
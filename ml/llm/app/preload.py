@@ -0,0 +1,143 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Set
+
+logger = logging.getLogger(__name__)
+
+HOURS = 24
+
+
+class UsageHistogram:
+    """Запросы к моделям по часам суток с затуханием.
+
+    Каждый день без обновления старые счетчики умножаются на decay,
+    поэтому гистограмма следит за текущим расписанием, а не за всей историей.
+    """
+
+    def __init__(self, path: str, decay: float = 0.9):
+        self.path = Path(path)
+        self.decay = decay
+        self.models: Dict[str, dict] = {}
+        self.dirty = False
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.models = json.load(f)
+        except (OSError, ValueError):
+            self.models = {}
+
+    def _entry(self, model_name: str, now: float) -> dict:
+        entry = self.models.setdefault(model_name, {"hours": [0.0] * HOURS, "updated": now})
+        days = (now - entry["updated"]) / 86400
+        if days >= 1:
+            factor = self.decay ** int(days)
+            entry["hours"] = [count * factor for count in entry["hours"]]
+            entry["updated"] = now
+        return entry
+
+    def record(self, model_name: str, when: datetime = None):
+        when = when or datetime.now()
+        entry = self._entry(model_name, when.timestamp())
+        entry["hours"][when.hour] += 1
+        self.dirty = True
+
+    def expected(self, model_name: str, hour: int) -> float:
+        """Сколько запросов модель обычно получает в этот час (со скользящим затуханием)"""
+        entry = self.models.get(model_name)
+        if not entry:
+            return 0.0
+        return entry["hours"][hour % HOURS]
+
+    def save(self):
+        if not self.dirty:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.models, f)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except OSError as e:
+            logger.warning(f"Cannot save usage histogram {self.path}: {e}")
+
+
+class Preloader:
+    """Держит модели прогретыми: постоянно (warm_models) и заранее по расписанию.
+
+    За lead_minutes до часа, в который модель обычно получает не меньше
+    threshold запросов, сервер стартует заранее; пока длится такой час,
+    модель не останавливается по неактивности.
+    """
+
+    def __init__(
+        self,
+        process_manager,
+        histogram: UsageHistogram,
+        warm_models: Iterable[str] = (),
+        lead_minutes: int = 10,
+        threshold: float = 3.0,
+        interval: float = 60.0,
+        predictive: bool = True,
+    ):
+        self.process_manager = process_manager
+        self.histogram = histogram
+        self.warm_models: Set[str] = set(warm_models)
+        self.lead = timedelta(minutes=lead_minutes)
+        self.threshold = threshold
+        self.interval = interval
+        self.predictive = predictive
+        self._task: asyncio.Task = None
+
+    def record(self, model_name: str):
+        self.histogram.record(model_name)
+
+    def keep_warm(self, now: datetime = None) -> Set[str]:
+        """Модели, которые сейчас нельзя останавливать по неактивности"""
+        if not self.predictive:
+            return set(self.warm_models)
+        now = now or datetime.now()
+        hours = {now.hour, (now + self.lead).hour}
+        predicted = {
+            model for model in self.histogram.models
+            if any(self.histogram.expected(model, hour) >= self.threshold for hour in hours)
+        }
+        return self.warm_models | predicted
+
+    def due(self, now: datetime = None) -> List[str]:
+        """Модели, которые должны быть запущены, но еще не запущены"""
+        available = set(self.process_manager.get_available_models())
+        active = set(self.process_manager.active_servers)
+        return sorted((self.keep_warm(now) & available) - active)
+
+    async def start(self):
+        unknown = self.warm_models - set(self.process_manager.get_available_models())
+        if unknown:
+            logger.warning(f"Warm models not found: {', '.join(sorted(unknown))}")
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.histogram.save()
+
+    async def _loop(self):
+        while True:
+            try:
+                for model_name in self.due():
+                    started = time.perf_counter()
+                    logger.info(f"🔥 Preloading {model_name}")
+                    await self.process_manager.get_server_for_model(model_name)
+                    logger.info(f"🔥 {model_name} preloaded in {time.perf_counter() - started:.1f}s")
+                self.histogram.save()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Preload failed: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
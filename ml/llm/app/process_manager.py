@@ -2,13 +2,20 @@ import asyncio
 import logging
 import httpx
 import os
-import subprocess
+import re
+import struct
 import time
+from collections import deque
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Set
 import socket
 
+from .gguf import MetadataCache, kv_cache_bytes
+from .metrics import metrics, read_available_memory
+from .slots import SlotAffinity
+from .tuning import LaunchTuner
+
 logger = logging.getLogger(__name__)
 
 class ProcessManager:
@@ -16,7 +23,19 @@ class ProcessManager:
         self,
         llama_cpp_path: str = None,
         models_dir: str = None,
-        inactivity_timeout: int = 60
+        inactivity_timeout: int = 60,
+        parallel_slots: int = 1,
+        metadata_cache_path: str = "./cache/gguf_metadata.json",
+        max_ctx_size: int = 8192,
+        cpu_threads: Optional[int] = None,
+        n_gpu_layers: int = 0,
+        auto_tune: bool = True,
+        tuning_profiles_path: str = "./cache/launch_profiles.json",
+        mlock: bool = False,
+        embedding_models: Optional[List[str]] = None,
+        restart_max_attempts: int = 5,
+        restart_backoff: float = 1.0,
+        restart_backoff_max: float = 60.0
     ):
         # Берем из переменных окружения, если не передано
         self.llama_cpp_path = Path(llama_cpp_path or os.getenv("LLAMA_CPP_PATH", "./llama-server"))
@@ -36,64 +55,111 @@ class ProcessManager:
         self.active_servers: Dict[str, dict] = {}
         self.lock = asyncio.Lock()
         self.inactivity_timeout = inactivity_timeout
+        self.parallel_slots = max(1, parallel_slots)
+        self.max_ctx_size = max_ctx_size
+        self.cpu_threads = cpu_threads
+        self.metadata_cache = MetadataCache(metadata_cache_path)
+        self.n_gpu_layers = n_gpu_layers
+        self.mlock = mlock
+        # Модели, которые запускаются с --embedding, даже если заголовок GGUF этого не говорит
+        self.embedding_models = set(embedding_models or [])
+        # Перезапуск упавших серверов: задержка растет вдвое после каждого падения подряд
+        self.restart_max_attempts = restart_max_attempts
+        self.restart_backoff = restart_backoff
+        self.restart_backoff_max = restart_backoff_max
+        self.crash_counts: Dict[str, int] = {}
+        self.closing = False
+        self.auto_tune = auto_tune
+        # llama-bench лежит рядом с llama-server в той же сборке llama.cpp
+        self.tuner = LaunchTuner(
+            bench_path=self.llama_cpp_path.parent / "llama-bench",
+            profiles_path=tuning_profiles_path,
+            n_gpu_layers=n_gpu_layers
+        )
+        if auto_tune and not self.tuner.available:
+            logger.warning(f"llama-bench not found at {self.tuner.bench_path}, launch tuning disabled")
         
         # Автоматически обнаруживаем модели
         self.model_configs = self._discover_models()
         logger.info(f"Discovered {len(self.model_configs)} models")
     
     def _discover_models(self) -> Dict[str, dict]:
-        """Автоматическое обнаружение моделей в папке models"""
+        """Обнаружение моделей в папке models по заголовкам GGUF"""
         configs = {}
         
         if not self.models_dir.exists():
             logger.warning(f"Models directory {self.models_dir} does not exist")
             return configs
         
-        # Ищем все .gguf файлы
-        for file in self.models_dir.glob("*.gguf"):
+        models, projectors = [], []
+        for file in sorted(self.models_dir.glob("*.gguf")) + sorted(self.models_dir.glob("*.mmproj")):
+            try:
+                info = self.metadata_cache.inspect(str(file.absolute()))
+            except (OSError, ValueError, struct.error) as e:
+                logger.warning(f"Skipping {file.name}: cannot read GGUF header ({e})")
+                continue
+            # mmproj - это тоже GGUF, но с архитектурой clip; моделью он не считается
+            if info["is_projector"] or file.suffix == ".mmproj":
+                projectors.append((file, info))
+            else:
+                models.append((file, info))
+        self.metadata_cache.save()
+        
+        for file, info in models:
             model_name = file.stem
-            mmproj = self._find_mmproj(model_name)
+            ctx_size = min(info["context_length"] or 4096, self.max_ctx_size)
+            parameter_count = info["parameter_count"] or 0
+            embedding = info["is_embedding"] or model_name in self.embedding_models
             
             configs[model_name] = {
                 "model_path": str(file.absolute()),
                 "model_file": file.name,
-                "ctx_size": 4096,
-                "n_gpu_layers": 0,
-                "mmproj": mmproj
+                "ctx_size": ctx_size,
+                "n_gpu_layers": self.n_gpu_layers,
+                "mmproj": self._find_mmproj(file, info, projectors),
+                "architecture": info["architecture"],
+                "chat_template": info["chat_template"],
+                "parameter_count": parameter_count,
+                "quantization": info["quantization"],
+                "embedding": embedding,
+                "embedding_length": info["embedding_length"],
+                # Веса + KV-кэш всех слотов
+                "memory_bytes": info["file_size"] + kv_cache_bytes(info, ctx_size * self.parallel_slots),
+                # Маленьким моделям много потоков не помогают: упираются в синхронизацию, а не в compute
+                "threads": self.cpu_threads or min(os.cpu_count() or 4, 4 if parameter_count < 2e9 else 8),
+                # Энкодер обрабатывает вход целиком за один ubatch, поэтому он не меньше контекста слота
+                "batch_size": ctx_size if embedding else (1024 if parameter_count < 3e9 else 512),
+                "ubatch_size": ctx_size if embedding else 512,
             }
             
-            # Пытаемся определить оптимальный размер контекста по имени файла
-            if "32k" in model_name.lower():
-                configs[model_name]["ctx_size"] = 32768
-            elif "16k" in model_name.lower():
-                configs[model_name]["ctx_size"] = 16384
-            elif "8k" in model_name.lower():
-                configs[model_name]["ctx_size"] = 8192
-            elif "4k" in model_name.lower():
-                configs[model_name]["ctx_size"] = 4096
-            
-            logger.info(f"Discovered model: {model_name} (ctx: {configs[model_name]['ctx_size']})")
+            config = configs[model_name]
+            logger.info(
+                f"Discovered model: {model_name} ({info['architecture']}, "
+                f"{parameter_count / 1e9:.2f}B params, {info['quantization']}, ctx: {ctx_size}, "
+                f"{'embedding, ' if embedding else ''}"
+                f"~{config['memory_bytes'] / 2**30:.1f} GiB, mmproj: {Path(config['mmproj']).name if config['mmproj'] else None})"
+            )
         
         return configs
     
-    def _find_mmproj(self, model_name: str) -> Optional[str]:
-        """Находит mmproj файл для VLM моделей"""
-        # Варианты имен mmproj файлов
-        candidates = [
-            f"{model_name}.mmproj",
-            f"{model_name.replace('-f16', '').replace('-Q4_K_M', '')}.mmproj",
-            f"{model_name.split('-')[0]}.mmproj",
-        ]
-        
-        for candidate in candidates:
-            mmproj_path = self.models_dir / candidate
-            if mmproj_path.exists():
-                return str(mmproj_path.absolute())
-        
-        # Ищем любой mmproj файл
-        for file in self.models_dir.glob("*.mmproj"):
-            return str(file.absolute())
-        
+    @staticmethod
+    def _pairing_key(stem: str, quantization: Optional[str]) -> str:
+        """Имя файла без квантизации, точности и слова mmproj - для сопоставления модели и проектора"""
+        key = stem.lower()
+        for token in filter(None, [quantization, "mmproj", "f16", "bf16", "f32"]):
+            key = key.replace(token.lower(), "")
+        return re.sub(r"[-_.]+", "-", key).strip("-")
+    
+    def _find_mmproj(self, file: Path, info: dict, projectors: list) -> Optional[str]:
+        """Находит mmproj, относящийся именно к этой модели: по имени файла, затем по general.basename"""
+        model_key = self._pairing_key(file.stem, info["quantization"])
+        for projector, projector_info in projectors:
+            if model_key and self._pairing_key(projector.stem, projector_info.get("quantization")) == model_key:
+                return str(projector.absolute())
+        for projector, projector_info in projectors:
+            if info["basename"] and info["basename"] == projector_info.get("basename"):
+                return str(projector.absolute())
+        # Чужой проектор хуже, чем никакого: модель без mmproj просто работает как текстовая
         return None
     
     def get_available_models(self) -> List[str]:
@@ -109,7 +175,16 @@ class ProcessManager:
     
     async def get_server_for_model(self, model_name: str) -> str:
         """Запускает сервер для модели или возвращает существующий"""
+        if self.auto_tune and model_name not in self.active_servers:
+            config = self.get_model_config(model_name)
+            # Бенчмарк до запуска и вне self.lock: запросы к уже работающим моделям его не ждут
+            if not config["embedding"]:
+                await self.tuner.ensure_profile(model_name, config)
+        
+        wait_started = time.perf_counter()
         async with self.lock:
+            metrics.queue_wait[model_name].observe(time.perf_counter() - wait_started)
+            
             # Если сервер уже запущен, обновляем активность и возвращаем URL
             if model_name in self.active_servers:
                 self.active_servers[model_name]["last_activity"] = datetime.now()
@@ -122,6 +197,13 @@ class ProcessManager:
             
             return f"http://127.0.0.1:{port}"
     
+    def acquire_slot(self, model_name: str, key: str) -> Optional[int]:
+        """Возвращает слот llama-server, закрепленный за диалогом"""
+        info = self.active_servers.get(model_name)
+        if not info:
+            return None
+        return info["slots"].acquire(key)
+    
     async def _find_free_port(self) -> int:
         """Находит свободный порт"""
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
@@ -133,89 +215,137 @@ class ProcessManager:
         """Запускает llama.cpp сервер для модели"""
         config = self.get_model_config(model_name)
         
+        # Подобранный профиль, если модель уже тюнили на этом хосте, иначе эвристика по GGUF.
+        # Тюнер меряет генерацию, для эмбеддинг-моделей его профиль не подходит
+        profile = (None if config["embedding"] else self.tuner.profile_for(config)) or config
+        if self.cpu_threads:
+            threads = self.cpu_threads
+        else:
+            # Ядра делятся между всеми серверами, которые будут работать одновременно
+            threads = self.tuner.threads_for(profile["threads"], len(self.active_servers) + 1)
+        
         # Формируем команду с базовыми параметрами
         cmd = [
             str(self.llama_cpp_path.absolute()),
             "-m", config["model_path"],
             "--port", str(port),
             "--host", "127.0.0.1",
-            "--ctx-size", str(config["ctx_size"]),
+            # Контекст делится между слотами поровну, поэтому умножаем на их число
+            "--ctx-size", str(config["ctx_size"] * self.parallel_slots),
+            "--parallel", str(self.parallel_slots),
             "--n-predict", "-1",
-            "--threads", str(min(os.cpu_count() or 4, 8)),
-            "--batch-size", "512",
-            "--keep", "0",
+            "--threads", str(threads),
+            "--batch-size", str(profile["batch_size"]),
+            "--ubatch-size", str(profile["ubatch_size"]),
+            # Переиспользуем совпадающие куски KV-кэша, даже если они сдвинулись
+            "--cache-reuse", "256",
             # Используем настройку из конфига вместо жесткого значения
             "--n-gpu-layers", str(config.get("n_gpu_layers", 0)),
         ]
         
+        # Веса читаются через mmap (по умолчанию в llama.cpp), поэтому после остановки
+        # они остаются в page cache и повторный старт не читает файл с диска.
+        # mlock дополнительно не дает системе вытеснить их в своп, пока сервер жив.
+        if self.mlock:
+            cmd.append("--mlock")
+        
+        if config["embedding"]:
+            cmd.append("--embedding")
+        
         # Добавляем mmproj если есть (для VLM)
         if config["mmproj"]:
             cmd.extend(["--mmproj", config["mmproj"]])
         
+        available = read_available_memory()
+        if available is not None and config["memory_bytes"] > available:
+            logger.warning(
+                f"⚠️ {model_name} needs ~{config['memory_bytes'] / 2**30:.1f} GiB, "
+                f"only {available / 2**30:.1f} GiB available"
+            )
+        
         logger.info(f"Starting llama.cpp server for {model_name} on port {port}")
+        started = time.perf_counter()
         logger.debug(f"Command: {' '.join(cmd)}")
         
-        # Запускаем процесс
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1,
-            universal_newlines=True
+        # Запускаем процесс: пайпы читаются циклом событий, без потоков из executor
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
         )
         
-        # Запускаем задачи для логирования stdout/stderr
-        asyncio.create_task(self._log_output(process.stdout, f"{model_name}-stdout"))
-        asyncio.create_task(self._log_output(process.stderr, f"{model_name}-stderr"))
+        # Последние строки stderr - чтобы было что показать, если сервер упадет
+        tail = deque(maxlen=20)
+        log_tasks = [
+            asyncio.create_task(self._log_output(process.stdout, f"{model_name}-stdout")),
+            asyncio.create_task(self._log_output(process.stderr, f"{model_name}-stderr", tail)),
+        ]
         
-        # Ждем готовности сервера (увеличиваем таймаут)
-        await self._wait_for_server(port)
+        try:
+            await self._wait_for_server(port, process)
+        except BaseException:
+            await self._terminate(process)
+            if tail:
+                logger.error(f"[{model_name}-stderr] last lines:\n" + "\n".join(tail))
+            raise
+        metrics.cold_start[model_name].observe(time.perf_counter() - started)
         
-        return {
+        info = {
             "process": process,
             "port": port,
             "model_name": model_name,
-            "last_activity": datetime.now()
+            "slots": SlotAffinity(self.parallel_slots),
+            "last_activity": datetime.now(),
+            "started_at": time.monotonic(),
+            "stderr_tail": tail,
+            "log_tasks": log_tasks,
+            "stopping": False
         }
+        info["watcher"] = asyncio.create_task(self._watch(model_name, info))
+        return info
     
-    async def _log_output(self, pipe, prefix: str):
+    async def _log_output(self, stream: asyncio.StreamReader, prefix: str, tail: Optional[deque] = None):
         """Логирует вывод процесса"""
         try:
             while True:
-                line = await asyncio.get_event_loop().run_in_executor(
-                    None, pipe.readline
-                )
-                if not line:
+                raw = await stream.readline()
+                if not raw:
                     break
-                line = line.strip()
+                line = raw.decode("utf-8", errors="replace").strip()
                 if line:
+                    if tail is not None:
+                        tail.append(line)
                     # Логируем только важные сообщения
                     if "error" in line.lower() or "warning" in line.lower() or "ready" in line.lower():
                         logger.info(f"[{prefix}] {line}")
                     else:
-                        logger.debug(f"[{prefix}] {line}")
+                        logger.debug("[%s] %s", prefix, line)
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             logger.error(f"Error logging output for {prefix}: {e}")
     
-    async def _wait_for_server(self, port: int, timeout: int = 120):
-        """Ожидает готовности сервера с увеличенным таймаутом"""
+    async def _wait_for_server(self, port: int, process: asyncio.subprocess.Process, timeout: int = 120):
+        """Ожидает готовности сервера; если процесс умер при загрузке - сразу ошибка"""
         url = f"http://127.0.0.1:{port}/health"
         start_time = time.time()
         
         async with httpx.AsyncClient() as client:
             while time.time() - start_time < timeout:
+                if process.returncode is not None:
+                    raise RuntimeError(f"Server on port {port} exited with code {process.returncode} during startup")
                 try:
                     response = await client.get(url, timeout=5.0)
                     if response.status_code == 200:
                         logger.info(f"Server on port {port} is ready")
                         return
                 except (httpx.ConnectError, httpx.TimeoutException):
-                    # Ждем перед следующей попыткой
-                    await asyncio.sleep(1)
+                    pass
                 except Exception as e:
                     logger.warning(f"Health check error: {e}")
-                    await asyncio.sleep(1)
+                # Пока модель грузится, /health отвечает 503 - ждем и в этом случае.
+                # Короткий интервал: веса из page cache поднимаются за секунды
+                await asyncio.sleep(0.25)
             
             # Если не дождались, пытаемся получить логи ошибок
             logger.error(f"Server failed to start within {timeout} seconds")
@@ -223,54 +353,115 @@ class ProcessManager:
     
     async def update_activity(self, model_name: str) -> str:
         """Обновляет время активности модели и возвращает URL сервера"""
+        info = self.active_servers.get(model_name)
+        if info:
+            info["last_activity"] = datetime.now()
+            return f"http://127.0.0.1:{info['port']}"
+        # Сервер не запущен: get_server_for_model сам берет lock (повторный захват здесь - дедлок)
+        return await self.get_server_for_model(model_name)
+    
+    # === Надзор за процессами ===
+    async def _watch(self, model_name: str, info: dict):
+        """Ждет завершения процесса; если его никто не останавливал - это падение"""
+        returncode = await info["process"].wait()
+        await asyncio.gather(*info["log_tasks"], return_exceptions=True)
+        if info["stopping"]:
+            return
+        
+        uptime = time.monotonic() - info["started_at"]
+        metrics.crashes[model_name] += 1
+        logger.error(f"💥 Server for {model_name} crashed with code {returncode} after {uptime:.0f}s")
+        if info["stderr_tail"]:
+            logger.error(f"[{model_name}-stderr] last lines:\n" + "\n".join(info["stderr_tail"]))
+        
         async with self.lock:
-            if model_name in self.active_servers:
-                self.active_servers[model_name]["last_activity"] = datetime.now()
-                return f"http://127.0.0.1:{self.active_servers[model_name]['port']}"
-            else:
-                # Если сервер не запущен, запускаем его
-                return await self.get_server_for_model(model_name)
+            # Сервер уже сняли с учета (остановка по неактивности или завершение) - не поднимаем
+            if self.active_servers.get(model_name) is not info:
+                return
+            del self.active_servers[model_name]
+        await self._restart(model_name, uptime)
+    
+    async def _restart(self, model_name: str, uptime: float):
+        """Перезапуск с экспоненциальной задержкой; после restart_max_attempts падений подряд сдаемся"""
+        # Сервер, проработавший дольше максимальной задержки, считаем стабильным - счет начинается заново
+        if uptime > self.restart_backoff_max:
+            self.crash_counts[model_name] = 0
+        
+        while True:
+            attempt = self.crash_counts.get(model_name, 0) + 1
+            self.crash_counts[model_name] = attempt
+            if attempt > self.restart_max_attempts:
+                logger.error(
+                    f"Giving up restarting {model_name} after {attempt - 1} crashes; "
+                    f"it will be started again on the next request"
+                )
+                self.crash_counts[model_name] = 0
+                return
+            
+            delay = min(self.restart_backoff * 2 ** (attempt - 1), self.restart_backoff_max)
+            logger.info(f"🔁 Restarting {model_name} in {delay:.1f}s (attempt {attempt}/{self.restart_max_attempts})")
+            await asyncio.sleep(delay)
+            
+            async with self.lock:
+                # Пока ждали, сервер мог поднять очередной запрос, а гейтвей - начать завершение
+                if self.closing or model_name in self.active_servers:
+                    return
+                try:
+                    port = await self._find_free_port()
+                    self.active_servers[model_name] = await self._start_server(model_name, port)
+                    return
+                except Exception as e:
+                    logger.error(f"Restart of {model_name} failed: {e}")
+    
+    async def _terminate(self, process: asyncio.subprocess.Process, timeout: float = 10.0):
+        """SIGTERM, затем SIGKILL, если процесс не завершился за timeout"""
+        if process.returncode is not None:
+            return
+        try:
+            process.terminate()
+            try:
+                await asyncio.wait_for(process.wait(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Process {process.pid} did not exit in {timeout:.0f}s, killing")
+                process.kill()
+                await process.wait()
+        except ProcessLookupError:
+            pass
     
-    async def cleanup_inactive(self):
-        """Останавливает неактивные серверы"""
+    async def cleanup_inactive(self, keep: Set[str] = frozenset()):
+        """Останавливает неактивные серверы, кроме моделей из keep (прогретые)"""
         async with self.lock:
             now = datetime.now()
             servers_to_remove = []
             
             for model_name, info in self.active_servers.items():
+                if model_name in keep:
+                    continue
                 inactive_time = (now - info["last_activity"]).total_seconds()
                 
                 if inactive_time > self.inactivity_timeout:
                     logger.info(f"Stopping inactive server for {model_name} "
                               f"(inactive for {inactive_time:.1f}s)")
-                    await self._stop_server(info["process"])
                     servers_to_remove.append(model_name)
             
-            for model_name in servers_to_remove:
-                if model_name in self.active_servers:
-                    del self.active_servers[model_name]
+            # Серверы останавливаются параллельно: каждый может ждать SIGKILL до 10 секунд
+            await asyncio.gather(*(self._stop_server(self.active_servers.pop(name)) for name in servers_to_remove))
     
-    async def _stop_server(self, process: subprocess.Popen):
+    async def _stop_server(self, info: dict):
         """Останавливает процесс сервера"""
+        # Флаг до сигнала: иначе наблюдатель примет штатную остановку за падение
+        info["stopping"] = True
         try:
-            # Отправляем SIGTERM
-            process.terminate()
-            
-            # Ждем завершения
-            try:
-                process.wait(timeout=10)
-            except subprocess.TimeoutExpired:
-                # Принудительно завершаем
-                process.kill()
-                process.wait()
-                    
+            await self._terminate(info["process"])
         except Exception as e:
             logger.error(f"Error stopping process: {e}")
     
     async def cleanup_all(self):
         """Останавливает все серверы при завершении"""
+        self.closing = True
+        await self.tuner.shutdown()
         async with self.lock:
-            for model_name, info in self.active_servers.items():
+            for model_name in self.active_servers:
                 logger.info(f"Stopping server for {model_name}")
-                await self._stop_server(info["process"])
+            await asyncio.gather(*(self._stop_server(info) for info in self.active_servers.values()))
             self.active_servers.clear()
\ No newline at end of file
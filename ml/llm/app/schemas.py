@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional, Union, Literal
+from pydantic import BaseModel, Field, model_validator
+from typing import Any, Dict, List, Optional, Union, Literal
 from datetime import datetime
 
 # Chat completions
@@ -7,6 +7,18 @@ class ChatMessage(BaseModel):
     role: Literal["system", "user", "assistant"]
     content: str
 
+# Structured output (OpenAI response_format)
+class ResponseFormat(BaseModel):
+    type: Literal["text", "json_object", "json_schema"] = "text"
+    # {"name": ..., "schema": {...}, "strict": true} - как в OpenAI
+    json_schema: Optional[Dict[str, Any]] = None
+
+    @model_validator(mode="after")
+    def check_schema(self):
+        if self.type == "json_schema" and not isinstance((self.json_schema or {}).get("schema"), dict):
+            raise ValueError("response_format.json_schema.schema is required for type json_schema")
+        return self
+
 class ChatCompletionRequest(BaseModel):
     model: str
     messages: List[ChatMessage]
@@ -15,6 +27,9 @@ class ChatCompletionRequest(BaseModel):
     top_p: Optional[float] = Field(0.95, ge=0.0, le=1.0)
     max_tokens: Optional[int] = Field(None, gt=0)
     stop: Optional[Union[str, List[str]]] = None
+    # Идентификатор диалога для привязки к слоту llama-server (переиспользование KV-кэша)
+    session_id: Optional[str] = None
+    response_format: Optional[ResponseFormat] = None
 
 class ChatCompletionChoice(BaseModel):
     index: int
@@ -43,6 +58,51 @@ class CompletionRequest(BaseModel):
     top_p: Optional[float] = Field(0.95, ge=0.0, le=1.0)
     max_tokens: Optional[int] = Field(512, gt=0)
     stop: Optional[Union[str, List[str]]] = None
+    response_format: Optional[ResponseFormat] = None
+
+# Tokenization
+class TokenizeRequest(BaseModel):
+    model: str
+    content: Optional[str] = None
+    messages: Optional[List[ChatMessage]] = None
+
+    @model_validator(mode="after")
+    def check_input(self):
+        if (self.content is None) == (self.messages is None):
+            raise ValueError("Exactly one of content or messages is required")
+        return self
+
+class TokenizeResponse(BaseModel):
+    model: str
+    count: int
+    context_size: int
+
+# Embeddings
+class EmbeddingRequest(BaseModel):
+    model: str
+    input: Union[str, List[str]]
+    encoding_format: Literal["float"] = "float"
+
+    @model_validator(mode="after")
+    def check_input(self):
+        if isinstance(self.input, list) and not self.input:
+            raise ValueError("input must not be empty")
+        return self
+
+class EmbeddingData(BaseModel):
+    object: str = "embedding"
+    index: int
+    embedding: List[float]
+
+class EmbeddingUsage(BaseModel):
+    prompt_tokens: int = 0
+    total_tokens: int = 0
+
+class EmbeddingResponse(BaseModel):
+    object: str = "list"
+    data: List[EmbeddingData]
+    model: str
+    usage: EmbeddingUsage
 
 # Models list
 class ModelData(BaseModel):
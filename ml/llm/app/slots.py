@@ -0,0 +1,53 @@
+import hashlib
+from collections import OrderedDict
+from typing import List, Optional
+
+from .schemas import ChatMessage
+
+
+def session_key(messages: List[ChatMessage], session_id: Optional[str] = None) -> str:
+    """Ключ диалога: явный session_id или отпечаток стабильного префикса (system + первый user)"""
+    if session_id:
+        return session_id
+
+    digest = hashlib.sha1()
+    for msg in messages:
+        digest.update(msg.role.encode())
+        digest.update(b"\x00")
+        digest.update(msg.content.encode())
+        digest.update(b"\x00")
+        if msg.role == "user":
+            break
+    return digest.hexdigest()
+
+
+class SlotAffinity:
+    """Привязка диалогов к слотам llama-server, чтобы переиспользовать KV-кэш слота"""
+
+    def __init__(self, n_slots: int):
+        self.n_slots = max(1, n_slots)
+        # session_key -> id слота (порядок = давность использования)
+        self.sessions: "OrderedDict[str, int]" = OrderedDict()
+        # id слота -> session_key последнего владельца (порядок = давность использования)
+        self.slot_owners: "OrderedDict[int, Optional[str]]" = OrderedDict(
+            (slot, None) for slot in range(self.n_slots)
+        )
+
+    def acquire(self, key: str) -> int:
+        """Возвращает слот для диалога, при необходимости вытесняя самый старый"""
+        slot = self.sessions.get(key)
+        if slot is not None and self.slot_owners.get(slot) == key:
+            self.sessions.move_to_end(key)
+            self.slot_owners.move_to_end(slot)
+            return slot
+
+        # Берем слот, которым дольше всего никто не пользовался
+        slot, previous_owner = next(iter(self.slot_owners.items()))
+        if previous_owner is not None:
+            self.sessions.pop(previous_owner, None)
+
+        self.slot_owners[slot] = key
+        self.slot_owners.move_to_end(slot)
+        self.sessions[key] = slot
+        self.sessions.move_to_end(key)
+        return slot
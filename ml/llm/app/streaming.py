@@ -0,0 +1,148 @@
+import asyncio
+import json
+import time
+from typing import AsyncIterator, List, Optional
+
+DATA_PREFIX = b"data: "
+DONE_EVENT = b"data: [DONE]\n\n"
+
+_CONTENT_KEY = b'"content":'
+_STOP_TRUE = b'"stop":true'
+
+
+def _scan_string(buf: bytes, start: int) -> int:
+    """Возвращает индекс закрывающей кавычки JSON-строки, открытой в позиции start"""
+    pos = start + 1
+    while True:
+        pos = buf.index(b'"', pos)
+        # Кавычка экранирована, если перед ней нечетное число обратных слэшей
+        backslashes = 0
+        while buf[pos - 1 - backslashes] == 0x5C:
+            backslashes += 1
+        if backslashes % 2 == 0:
+            return pos
+        pos += 1
+
+
+def extract_content(event: bytes) -> bytes:
+    """Достает значение поля content как есть - уже экранированную JSON-строку с кавычками"""
+    pos = event.find(_CONTENT_KEY)
+    while pos > 0 and event[pos - 1] == 0x5C:
+        pos = event.find(_CONTENT_KEY, pos + 1)
+    if pos == -1:
+        return b'""'
+    start = pos + len(_CONTENT_KEY)
+    while event[start] in b" \t":
+        start += 1
+    if event[start] != 0x22:
+        return b'""'
+    return event[start:_scan_string(event, start) + 1]
+
+
+class SSETranslator:
+    """Переводит SSE-поток llama.cpp /completion в чанки OpenAI без полного разбора JSON.
+
+    Префикс и суффикс чанка собираются один раз на стрим, а экранированная
+    строка content копируется из входного буфера в выходной без декодирования.
+    Целиком разбирается только финальное событие (stop=true) ради timings.
+    """
+
+    def __init__(self, request_id: str, model_name: str, collect: bool = False):
+        head = json.dumps(
+            {"id": request_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model_name},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode("utf-8")[:-1]
+        self._content_prefix = DATA_PREFIX + head + b',"choices":[{"index":0,"delta":{"content":'
+        self._content_suffix = b'},"finish_reason":null}]}\n\n'
+        self._empty_chunk = DATA_PREFIX + head + b',"choices":[{"index":0,"delta":{},"finish_reason":null}]}\n\n'
+
+        self._pending = b""
+        # Декодированные куски текста нужны только для кэша ответов
+        self.chunks: Optional[List[str]] = [] if collect else None
+        self.final: Optional[dict] = None
+        self.done = False
+
+    def chunk(self, content: bytes) -> bytes:
+        """SSE-чанк OpenAI для уже экранированной JSON-строки content"""
+        if content == b'""':
+            return self._empty_chunk
+        return self._content_prefix + content + self._content_suffix
+
+    def feed(self, data: bytes) -> bytes:
+        """Принимает сырые байты от llama.cpp и возвращает готовые байты для клиента"""
+        buf = self._pending + data if self._pending else data
+        out = []
+        start = 0
+        while True:
+            end = buf.find(b"\n", start)
+            if end == -1:
+                break
+            line = buf[start:end]
+            start = end + 1
+            if line.startswith(DATA_PREFIX):
+                out.append(self._event(line[len(DATA_PREFIX):]))
+        self._pending = buf[start:]
+        return b"".join(out)
+
+    def _event(self, event: bytes) -> bytes:
+        if event.strip() == b"[DONE]":
+            self.done = True
+            return DONE_EVENT
+
+        content = extract_content(event)
+        if self.chunks is not None and content != b'""':
+            self.chunks.append(json.loads(content))
+        if _STOP_TRUE in event:
+            # Одно полное декодирование на стрим: токены и timings
+            self.final = json.loads(event)
+            self.done = True
+        return self.chunk(content)
+
+
+async def batched(source: AsyncIterator[bytes], translator: SSETranslator, window: float) -> AsyncIterator[bytes]:
+    """Отдает переведенные байты пачками не чаще, чем раз в window секунд.
+
+    Данные не задерживаются дольше окна: если следующий кусок от llama.cpp
+    не пришел до дедлайна, накопленное отправляется сразу.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = source.__aiter__()
+    out = bytearray()
+    deadline = 0.0
+    read: Optional[asyncio.Future] = None
+
+    try:
+        while True:
+            if read is None:
+                read = asyncio.ensure_future(iterator.__anext__())
+
+            if out:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    yield bytes(out)
+                    out.clear()
+                    continue
+                done, _ = await asyncio.wait({read}, timeout=timeout)
+                if not done:
+                    yield bytes(out)
+                    out.clear()
+                    continue
+
+            try:
+                data = await read
+            except StopAsyncIteration:
+                break
+            read = None
+
+            translated = translator.feed(data)
+            if translated:
+                if not out:
+                    deadline = loop.time() + window
+                out += translated
+    finally:
+        if read is not None and not read.done():
+            read.cancel()
+
+    if out:
+        yield bytes(out)
@@ -0,0 +1,149 @@
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import List, Optional
+
+import httpx
+
+from .chat_templates import ChatTemplate
+from .schemas import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+
+class ContextOverflowError(Exception):
+    """Даже system + последнее сообщение не помещаются в контекст"""
+
+
+class TokenCounter:
+    """Подсчет токенов через /tokenize llama-server с LRU-кэшем.
+
+    Ключ кэша - модель и текст, поэтому в диалоге токенизируются
+    только новые ходы, а вся история берется из кэша.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, int]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, model_name: str, text: str) -> str:
+        return hashlib.sha1(f"{model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+    async def count(self, client: httpx.AsyncClient, base_url: str, model_name: str, text: str) -> int:
+        key = self._key(model_name, text)
+        cached = self.entries.get(key)
+        if cached is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        response = await client.post(
+            f"{base_url}/tokenize",
+            # BOS не считаем: он один на весь промпт и входит в safety_tokens
+            json={"content": text, "add_special": False},
+        )
+        response.raise_for_status()
+        count = len(response.json().get("tokens", []))
+
+        self.entries[key] = count
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return count
+
+    async def count_many(self, base_url: str, model_name: str, texts: List[str]) -> List[int]:
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            return list(await asyncio.gather(
+                *(self.count(client, base_url, model_name, text) for text in texts)
+            ))
+
+
+class ContextBudget:
+    """Обрезка старых ходов диалога, чтобы промпт + ответ влезали в контекст слота.
+
+    Когда история перестает помещаться, удаляются самые старые ходы
+    (system и последнее сообщение остаются всегда) с запасом - до
+    low_watermark от бюджета. Точка обрезки запоминается для диалога и
+    переиспользуется, пока влезает, поэтому префикс промпта не меняется
+    на каждом ходе и KV-кэш слота не пересчитывается заново.
+    """
+
+    def __init__(
+        self,
+        counter: TokenCounter,
+        low_watermark: float = 0.75,
+        safety_tokens: int = 64,
+        max_sessions: int = 1024,
+    ):
+        self.counter = counter
+        self.low_watermark = low_watermark
+        self.safety_tokens = safety_tokens
+        self.max_sessions = max_sessions
+        # session_key -> индекс первого оставленного хода диалога
+        self.trim_points: "OrderedDict[str, int]" = OrderedDict()
+        self.trimmed_requests = 0
+
+    def fits_without_counting(self, prompt: str, ctx_size: int, n_predict: int) -> bool:
+        """Токен не короче байта, поэтому короткие промпты не нужно даже токенизировать"""
+        return len(prompt.encode("utf-8")) + n_predict + self.safety_tokens <= ctx_size
+
+    async def fit(
+        self,
+        base_url: str,
+        model_name: str,
+        template: ChatTemplate,
+        messages: List[ChatMessage],
+        ctx_size: int,
+        n_predict: int,
+        session: Optional[str] = None,
+    ) -> List[ChatMessage]:
+        """Возвращает сообщения, которые помещаются в ctx_size вместе с n_predict токенами ответа"""
+        system = [msg for msg in messages if msg.role == "system"]
+        dialog = [msg for msg in messages if msg.role != "system"]
+        budget = ctx_size - n_predict - self.safety_tokens
+
+        counts = await self.counter.count_many(
+            base_url, model_name, [template.turn_text(msg.role, msg.content) for msg in system + dialog]
+        )
+        fixed = sum(counts[:len(system)])
+        turns = counts[len(system):]
+
+        def total(start: int) -> int:
+            return fixed + sum(turns[start:])
+
+        if total(0) <= budget:
+            return messages
+
+        start = self.trim_points.get(session) if session else None
+        if start is None or start >= len(dialog) or total(start) > budget:
+            start = self._trim_start(dialog, turns, fixed, budget)
+        if total(start) > budget:
+            raise ContextOverflowError(
+                f"Prompt needs {total(start)} tokens, but only {budget} fit in context of {ctx_size}"
+            )
+
+        if session:
+            self.trim_points[session] = start
+            self.trim_points.move_to_end(session)
+            while len(self.trim_points) > self.max_sessions:
+                self.trim_points.popitem(last=False)
+
+        self.trimmed_requests += 1
+        logger.info(f"✂️ Trimmed {start} old turns for {model_name} ({total(0)} -> {total(start)} tokens)")
+        return system + dialog[start:]
+
+    def _trim_start(self, dialog: List[ChatMessage], turns: List[int], fixed: int, budget: int) -> int:
+        target = budget * self.low_watermark
+        last = len(dialog) - 1
+        start = 0
+        remaining = fixed + sum(turns)
+        while start < last and remaining > target:
+            remaining -= turns[start]
+            start += 1
+        # Диалог должен начинаться с хода пользователя
+        while start < last and dialog[start].role != "user":
+            start += 1
+        return start
@@ -0,0 +1,169 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZES = [512, 1024, 2048]
+UBATCH_SIZES = [256, 512]
+
+
+def thread_candidates(cores: int) -> List[int]:
+    """Четверть, половина и все ядра - дальше по числу потоков выигрыша обычно нет"""
+    return sorted({max(1, cores // 4), max(1, cores // 2), cores})
+
+
+class LaunchTuner:
+    """Подбор --threads / --batch-size / --ubatch-size для модели на этом хосте.
+
+    При первом запуске модели на хосте llama-bench прогоняется до старта
+    llama-server - иначе сервер этой же модели делил бы с бенчмарком ядра и GPU
+    и профиль был бы снят под нагрузкой:
+      1. генерация при разном числе потоков - выбираем лучшие потоки;
+      2. обработка промпта с этими потоками при разных batch/ubatch.
+    Профиль сохраняется на диск и используется при следующих запусках, так что
+    холодный старт удлиняется только один раз. Если подбор не удался, сервер
+    стартует с эвристикой из заголовка GGUF.
+    """
+
+    def __init__(
+        self,
+        bench_path: Path,
+        profiles_path: str,
+        n_gpu_layers: int = 0,
+        cores: Optional[int] = None,
+    ):
+        self.bench_path = bench_path
+        self.profiles_path = Path(profiles_path)
+        self.n_gpu_layers = n_gpu_layers
+        self.cores = cores or os.cpu_count() or 4
+        self.profiles: Dict[str, dict] = self._load()
+        self.tasks: Dict[str, asyncio.Task] = {}
+        # Ключи профилей, подбор которых упал: не повторяем его при каждом холодном старте
+        self.failed: Set[str] = set()
+        # Бенчмарки идут строго по одному, иначе они меряют друг друга
+        self._bench_lock = asyncio.Lock()
+
+    @property
+    def available(self) -> bool:
+        return self.bench_path.exists() and os.access(self.bench_path, os.X_OK)
+
+    # === Профили ===
+    def _load(self) -> Dict[str, dict]:
+        try:
+            with open(self.profiles_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        try:
+            self.profiles_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.profiles_path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.profiles, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.profiles_path)
+        except OSError as e:
+            logger.warning(f"Cannot save launch profiles {self.profiles_path}: {e}")
+
+    def _key(self, config: dict) -> str:
+        """Профиль зависит от файла модели, числа ядер и выгрузки на GPU"""
+        size = os.path.getsize(config["model_path"])
+        return f"{config['model_file']}:{size}:{self.cores}:{self.n_gpu_layers}"
+
+    def profile_for(self, config: dict) -> Optional[dict]:
+        return self.profiles.get(self._key(config))
+
+    def threads_for(self, best_threads: int, servers: int) -> int:
+        """Делит ядра между одновременно работающими серверами"""
+        share = max(1, self.cores // max(1, servers))
+        return max(1, min(best_threads, share))
+
+    # === Бенчмарк ===
+    async def ensure_profile(self, model_name: str, config: dict):
+        """Подбирает профиль перед запуском сервера, если его еще нет; одновременные запуски ждут один прогон"""
+        if not self.available or self.profile_for(config) or self._key(config) in self.failed:
+            return
+        task = self.tasks.get(model_name)
+        if task is None:
+            task = asyncio.create_task(self._tune(model_name, config))
+            self.tasks[model_name] = task
+            task.add_done_callback(lambda _: self.tasks.pop(model_name, None))
+        # Отмененный запрос не должен обрывать бенчмарк, который ждут другие
+        await asyncio.shield(task)
+
+    async def shutdown(self):
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _bench(self, model_path: str, args: List[str]) -> List[dict]:
+        cmd = [
+            str(self.bench_path), "-m", model_path,
+            "-ngl", str(self.n_gpu_layers),
+            "-r", "2", "-o", "json", *args,
+        ]
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            # Серверы других моделей могут в это время отвечать - живые запросы важнее бенчмарка
+            preexec_fn=lambda: os.nice(10),
+        )
+        try:
+            stdout, _ = await process.communicate()
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+        if process.returncode != 0:
+            raise RuntimeError(f"llama-bench exited with code {process.returncode}")
+        return json.loads(stdout)
+
+    async def _tune(self, model_name: str, config: dict):
+        async with self._bench_lock:
+            started = time.perf_counter()
+            logger.info(f"🎛️ Tuning launch profile for {model_name}")
+            try:
+                threads = thread_candidates(self.cores)
+                gen = await self._bench(config["model_path"], [
+                    "-t", ",".join(map(str, threads)), "-p", "0", "-n", "32",
+                ])
+                best_gen = max(gen, key=lambda r: r["avg_ts"])
+
+                prompt = await self._bench(config["model_path"], [
+                    "-t", str(best_gen["n_threads"]),
+                    "-b", ",".join(map(str, BATCH_SIZES)),
+                    "-ub", ",".join(map(str, UBATCH_SIZES)),
+                    "-p", "512", "-n", "0",
+                ])
+                # ubatch больше batch llama.cpp все равно урежет - такие комбинации не сравниваем
+                prompt = [r for r in prompt if r["n_ubatch"] <= r["n_batch"]]
+                best_prompt = max(prompt, key=lambda r: r["avg_ts"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Tuning {model_name} failed, using GGUF heuristics: {e}")
+                self.failed.add(self._key(config))
+                return
+
+            profile = {
+                "threads": best_gen["n_threads"],
+                "batch_size": best_prompt["n_batch"],
+                "ubatch_size": best_prompt["n_ubatch"],
+                "generation_tps": round(best_gen["avg_ts"], 2),
+                "prompt_tps": round(best_prompt["avg_ts"], 2),
+                "tuned_at": int(time.time()),
+            }
+            self.profiles[self._key(config)] = profile
+            self._save()
+            logger.info(
+                f"🎛️ {model_name} tuned in {time.perf_counter() - started:.0f}s: "
+                f"threads={profile['threads']} batch={profile['batch_size']} ubatch={profile['ubatch_size']} "
+                f"({profile['prompt_tps']} pp tok/s, {profile['generation_tps']} tg tok/s)"
+            )
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк перевода SSE-потока llama.cpp в чанки OpenAI.
+
+Сравнивает прежний путь (json.loads + сборка dict + json.dumps + time.time()
+на каждый токен) с SSETranslator, который работает на сырых байтах.
+
+Запуск из ml/llm:
+    python benchmarks/bench_streaming.py --tokens 20000
+"""
+import argparse
+import codecs
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.streaming import SSETranslator  # noqa: E402
+
+WORDS = ["Пусть", " n", " —", " натуральное", " число", ",", " тогда", " \\frac{a}{b}", " \"кавычки\"", "\n"]
+
+
+def make_stream(n_tokens: int, read_size: int) -> list[bytes]:
+    """Синтетический ответ llama.cpp, порезанный на куски как при чтении из сокета"""
+    events = []
+    for i in range(n_tokens):
+        events.append({
+            "index": 0,
+            "content": WORDS[i % len(WORDS)],
+            "tokens": [i],
+            "stop": False,
+            "id_slot": 0,
+            "tokens_predicted": i + 1,
+            "tokens_evaluated": 128,
+        })
+    events.append({
+        "index": 0, "content": "", "stop": True, "id_slot": 0,
+        "tokens_predicted": n_tokens, "tokens_evaluated": 128,
+        "timings": {"prompt_per_second": 250.0, "predicted_per_second": 12.5},
+    })
+    raw = b"".join(
+        b"data: " + json.dumps(e, ensure_ascii=False).encode("utf-8") + b"\n\n" for e in events
+    )
+    return [raw[i:i + read_size] for i in range(0, len(raw), read_size)]
+
+
+def legacy(chunks: list[bytes], model_name: str) -> list[str]:
+    """Прежняя реализация stream_completion (без сети)"""
+    out = []
+    request_id = f"chatcmpl-{int(time.time())}"
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    for data in chunks:
+        pending += decoder.decode(data)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            if not line.startswith("data: "):
+                continue
+            json_data = json.loads(line[6:])
+            content = json_data.get("content", "")
+            chunk = {
+                "id": request_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model_name,
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": content} if content else {},
+                    "finish_reason": None
+                }]
+            }
+            out.append(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+    return out
+
+
+def translated(chunks: list[bytes], model_name: str) -> list[bytes]:
+    translator = SSETranslator(f"chatcmpl-{int(time.time())}", model_name)
+    return [translator.feed(data) for data in chunks]
+
+
+def contents(payload: str) -> list[str]:
+    result = []
+    for line in payload.split("\n"):
+        if line.startswith("data: "):
+            result.append(json.loads(line[6:])["choices"][0]["delta"].get("content", ""))
+    return result
+
+
+def bench(fn, chunks, model_name, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(chunks, model_name)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=20000)
+    parser.add_argument("--read-size", type=int, default=4096)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    model_name = "Qwen3-4B-Instruct-2507-Q4_K_M"
+    chunks = make_stream(args.tokens, args.read_size)
+
+    # Оба пути должны отдавать одинаковый текст
+    old_text = contents("".join(legacy(chunks, model_name)))
+    new_text = contents(b"".join(translated(chunks, model_name)).decode("utf-8"))
+    assert old_text == new_text, "translator output differs from legacy path"
+
+    old = bench(legacy, chunks, model_name, args.repeat)
+    new = bench(translated, chunks, model_name, args.repeat)
+
+    n = args.tokens + 1
+    print(f"tokens:      {args.tokens}")
+    print(f"legacy:      {old * 1e6 / n:8.2f} us/token")
+    print(f"translator:  {new * 1e6 / n:8.2f} us/token")
+    print(f"speedup:     {old / new:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
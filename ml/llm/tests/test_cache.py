@@ -0,0 +1,20 @@
+from app.cache import cache_key, is_deterministic
+
+
+def test_only_greedy_generation_is_cached():
+    assert is_deterministic({"temperature": 0})
+    assert is_deterministic({"temperature": 0.0})
+    assert not is_deterministic({"temperature": 0.7})
+    assert not is_deterministic({})
+
+
+def test_key_ignores_order_and_transport_params():
+    params = {"prompt": "Привет", "temperature": 0, "n_predict": 64}
+    same = {"n_predict": 64, "temperature": 0, "prompt": "Привет", "stream": True, "id_slot": 2, "cache_prompt": True}
+    assert cache_key("qwen", params) == cache_key("qwen", same)
+
+
+def test_key_depends_on_model_and_sampling():
+    params = {"prompt": "Привет", "temperature": 0, "n_predict": 64}
+    assert cache_key("qwen", params) != cache_key("llama", params)
+    assert cache_key("qwen", params) != cache_key("qwen", {**params, "n_predict": 128})
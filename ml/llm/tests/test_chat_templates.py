@@ -0,0 +1,45 @@
+from app.chat_templates import TEMPLATES, detect_template
+from app.schemas import ChatMessage
+
+
+def _messages(*pairs):
+    return [ChatMessage(role=role, content=content) for role, content in pairs]
+
+
+def test_system_goes_first():
+    prompt = TEMPLATES["chatml"].render(_messages(("user", "hi"), ("system", "S")))
+    assert prompt == (
+        "<|im_start|>system\nS<|im_end|>\n"
+        "<|im_start|>user\nhi<|im_end|>\n"
+        "<|im_start|>assistant\n"
+    )
+
+
+def test_next_turn_only_appends():
+    template = TEMPLATES["llama3"]
+    history = _messages(("system", "S"), ("user", "q1"), ("assistant", "a1"))
+    first = template.render(history[:2])
+    second = template.render(history + _messages(("user", "q2")))
+    assert second.startswith(first)
+
+
+def test_system_merged_into_first_user_turn():
+    prompt = TEMPLATES["gemma"].render(_messages(("system", "S"), ("user", "hi"), ("assistant", "ok")))
+    assert prompt == (
+        "<start_of_turn>user\nS\n\nhi<end_of_turn>\n"
+        "<start_of_turn>model\nok<end_of_turn>\n"
+        "<start_of_turn>model\n"
+    )
+
+
+def test_role_turns():
+    prompt = TEMPLATES["mistral"].render(
+        _messages(("system", "S"), ("user", "q1"), ("assistant", "a1"), ("user", "q2"))
+    )
+    assert prompt == "[INST] S\n\nq1 [/INST]a1</s>[INST] q2 [/INST]"
+
+
+def test_detect_template():
+    assert detect_template("{{ '<|im_start|>' + role }}", "llama") == "chatml"
+    assert detect_template(None, "gemma2") == "gemma"
+    assert detect_template(None, "unknown") == "alpaca"
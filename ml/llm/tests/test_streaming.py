@@ -0,0 +1,52 @@
+import json
+
+from app.streaming import DONE_EVENT, SSETranslator, extract_content
+
+
+def test_extract_content_keeps_escapes():
+    assert extract_content(b'{"content":"a\\"b\\n","stop":false}') == b'"a\\"b\\n"'
+
+
+def test_extract_content_ends_after_escaped_backslash():
+    assert extract_content(b'{"content":"a\\\\","stop":true}') == b'"a\\\\"'
+
+
+def test_extract_content_skips_key_inside_string():
+    event = b'{"prompt":"\\"content\\": x","content":"y"}'
+    assert extract_content(event) == b'"y"'
+
+
+def test_extract_content_without_text():
+    assert extract_content(b'{"stop":false}') == b'""'
+    assert extract_content(b'{"content":null}') == b'""'
+
+
+def _chunks(data: bytes):
+    events = [line[len(b"data: "):] for line in data.split(b"\n") if line.startswith(b"data: ")]
+    return [event for event in events if event != b"[DONE]"]
+
+
+def test_translator_joins_split_lines():
+    translator = SSETranslator("req-1", "qwen", collect=True)
+    source = (
+        'data: {"content":"При","stop":false}\n\n'
+        'data: {"content":"вет","stop":false}\n\n'
+        'data: {"content":"","stop":true,"timings":{"predicted_n":2}}\n\n'
+    ).encode("utf-8")
+    # Границы сетевых пакетов приходятся на середину строк и даже символов
+    out = b"".join(translator.feed(source[i:i + 7]) for i in range(0, len(source), 7))
+
+    chunks = [json.loads(event) for event in _chunks(out)]
+    assert [chunk["choices"][0]["delta"].get("content") for chunk in chunks] == ["При", "вет", None]
+    assert {chunk["id"] for chunk in chunks} == {"req-1"}
+    assert {chunk["model"] for chunk in chunks} == {"qwen"}
+    assert translator.chunks == ["При", "вет"]
+    assert translator.final["timings"] == {"predicted_n": 2}
+    assert translator.done
+
+
+def test_translator_passes_done():
+    translator = SSETranslator("req-1", "qwen")
+    assert translator.feed(b"data: [DONE]\n") == DONE_EVENT
+    assert translator.done
+    assert translator.chunks is None
@@ -0,0 +1,25 @@
+from app.schemas import ChatMessage
+from app.tokens import ContextBudget, TokenCounter
+
+
+def _dialog(*roles):
+    return [ChatMessage(role=role, content=str(index)) for index, role in enumerate(roles)]
+
+
+def test_trim_to_low_watermark():
+    budget = ContextBudget(TokenCounter(), low_watermark=0.75)
+    dialog = _dialog("user", "assistant", "user", "assistant", "user")
+    # Цель 0.75 * 60 = 45: старые ходы уходят, пока остаток не станет не больше цели
+    assert budget._trim_start(dialog, [10, 10, 10, 10, 10], fixed=5, budget=60) == 2
+
+
+def test_trim_starts_with_user_turn():
+    budget = ContextBudget(TokenCounter(), low_watermark=0.75)
+    dialog = _dialog("user", "assistant", "user", "assistant", "user")
+    assert budget._trim_start(dialog, [20, 5, 5, 5, 5], fixed=0, budget=40) == 2
+
+
+def test_last_message_always_kept():
+    budget = ContextBudget(TokenCounter())
+    dialog = _dialog("user", "assistant", "user")
+    assert budget._trim_start(dialog, [100, 100, 100], fixed=50, budget=10) == 2
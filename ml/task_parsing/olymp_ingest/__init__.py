@@ -0,0 +1,4 @@
+"""Разбор олимпиадных PDF в задачи: скачивание, извлечение текста, разбор LLM, импорт в БД.
+
+Переписанный в пайплайн ноутбук ../main.ipynb; запуск - python -m olymp_ingest.
+"""
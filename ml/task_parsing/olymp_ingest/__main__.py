@@ -0,0 +1,57 @@
+import argparse
+import json
+import logging
+import os
+from pathlib import Path
+
+from . import pipeline
+from .manifest import Manifest
+from .parse import DEFAULT_MODEL
+from .sources import default_sources, load_sources
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="olymp_ingest", description="Олимпиадные PDF -> задачи в БД")
+    parser.add_argument("--workdir", default="./ingest_data", help="Кэш PDF, промежуточные файлы и манифест")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Прогнать пайплайн (продолжает с места остановки)")
+    run.add_argument("--sources", help="JSON-список источников; по умолчанию - архив финала ВсОШ по математике")
+    run.add_argument("--stages", default=",".join(pipeline.ALL_STAGES), help="Стадии через запятую")
+    run.add_argument("--gateway", default=os.getenv("LLM_GATEWAY_URL", "http://localhost:8080"))
+    run.add_argument("--model", default=DEFAULT_MODEL)
+    run.add_argument("--dsn", default=os.getenv("DATABASE_URL"), help="Postgres бэкенда (для стадии import)")
+    run.add_argument("--download-concurrency", type=int, default=8)
+    run.add_argument("--extract-workers", type=int, default=None, help="Процессов извлечения (по умолчанию - ядра)")
+    run.add_argument("--pages-per-task", type=int, default=2)
+    run.add_argument("--poll-interval", type=float, default=10.0)
+
+    sub.add_parser("status", help="Сколько источников на каждой стадии")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    workdir = Path(args.workdir)
+
+    if args.command == "status":
+        print(json.dumps(Manifest(workdir / "manifest.json").summary(), ensure_ascii=False, indent=2))
+        return
+
+    unknown = set(args.stages.split(",")) - set(pipeline.ALL_STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+    pipeline.run(
+        sources=load_sources(args.sources) if args.sources else default_sources(),
+        workdir=workdir,
+        gateway_url=args.gateway,
+        model=args.model,
+        dsn=args.dsn,
+        stages=args.stages.split(","),
+        download_concurrency=args.download_concurrency,
+        extract_workers=args.extract_workers,
+        pages_per_task=args.pages_per_task,
+        poll_interval=args.poll_interval,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import asyncio
+import logging
+import os
+from pathlib import Path
+from typing import List
+
+import httpx
+
+from .manifest import Manifest
+from .sources import Source
+
+logger = logging.getLogger(__name__)
+
+
+def pdf_path(workdir: Path, source: Source) -> Path:
+    """PDF кэшируется по хэшу URL: повторный запуск не качает файл заново"""
+    return workdir / "pdf" / f"{source.id}.pdf"
+
+
+async def _download(client: httpx.AsyncClient, source: Source, path: Path, retries: int = 3) -> bool:
+    """Скачивает PDF; False - файла по ссылке нет (404)"""
+    tmp_path = path.with_suffix(".part")
+    for attempt in range(1, retries + 1):
+        try:
+            async with client.stream("GET", source.url) as response:
+                if response.status_code == 404:
+                    return False
+                response.raise_for_status()
+                with open(tmp_path, "wb") as f:
+                    async for chunk in response.aiter_bytes():
+                        f.write(chunk)
+            os.replace(tmp_path, path)
+            return True
+        except (httpx.HTTPError, OSError) as e:
+            tmp_path.unlink(missing_ok=True)
+            if attempt == retries:
+                raise
+            logger.warning(f"Download {source.url} attempt {attempt} failed: {e}")
+            await asyncio.sleep(2 ** attempt)
+
+
+async def download_all(manifest: Manifest, sources: List[Source], workdir: Path, concurrency: int = 8):
+    """Стадия download: new -> downloaded (или missing, если ссылки нет)"""
+    (workdir / "pdf").mkdir(parents=True, exist_ok=True)
+    by_id = {source.id: source for source in sources}
+    pending = [by_id[source_id] for source_id in manifest.at_stage("new") if source_id in by_id]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(client: httpx.AsyncClient, source: Source):
+        path = pdf_path(workdir, source)
+        async with semaphore:
+            try:
+                found = path.exists() or await _download(client, source, path)
+            except Exception as e:
+                logger.error(f"❌ {source.url}: {e}")
+                manifest.update(source.id, error=f"download: {e}")
+                return
+        if found:
+            manifest.update(source.id, stage="downloaded", pdf=str(path), error=None)
+            logger.info(f"📥 {source.filename}")
+        else:
+            manifest.update(source.id, missing=True)
+            logger.info(f"⚠️ Not found: {source.url}")
+
+    async with httpx.AsyncClient(timeout=60.0, follow_redirects=True) as client:
+        await asyncio.gather(*(fetch(client, source) for source in pending))
@@ -0,0 +1,110 @@
+import json
+import logging
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import pdfplumber
+
+from .manifest import Manifest
+
+logger = logging.getLogger(__name__)
+
+# Меньше символов - не задача, а обрывок (колонтитул, номер страницы)
+MIN_PROBLEM_CHARS = 80
+
+
+def clean_text(text: str) -> str:
+    if not text:
+        return ""
+    text = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F-\x9F]', '', text)
+    text = re.sub(r'\(cid:\d+\)', '', text)
+    text = re.sub(r'emdash\.cyr|guillemot(left|right)\.cyr', '—', text)
+    text = re.sub(r'«|»|„|“', '"', text)
+    text = re.sub(r'–|—', '-', text)
+    text = re.sub(r'·', '.', text)
+    text = text.replace('◦', '°')
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text
+
+
+def split_into_problems(full_text: str) -> List[Tuple[str, str]]:
+    """Делит текст варианта на задачи по номерам вида "9.1." (как в ноутбуке)"""
+    problems = []
+    parts = re.split(r'(\d+\.\d+\.)', full_text)
+    for i in range(1, len(parts), 2):
+        content = parts[i + 1].strip()
+        if len(content) > MIN_PROBLEM_CHARS:
+            problems.append((parts[i].strip(), content))
+    if not problems:
+        paragraphs = [p.strip() for p in re.split(r'\n\s*\n', full_text) if len(p.strip()) > 200]
+        problems = [(f"Auto_{i + 1}", p) for i, p in enumerate(paragraphs)]
+    return problems
+
+
+def _page_count(path: str) -> int:
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def _extract_pages(path: str, start: int, end: int) -> str:
+    """Выполняется в процессе пула: текст страниц [start, end) одного PDF"""
+    with pdfplumber.open(path) as pdf:
+        return "\n".join(pdf.pages[i].extract_text() or "" for i in range(start, end))
+
+
+def problems_path(workdir: Path, source_id: str) -> Path:
+    return workdir / "problems" / f"{source_id}.jsonl"
+
+
+def extract_all(manifest: Manifest, workdir: Path, workers: int = None, pages_per_task: int = 2):
+    """Стадия extract: downloaded -> extracted.
+
+    Страницы всех PDF режутся на диапазоны и разбираются параллельно в пуле процессов
+    (pdfplumber упирается в CPU), затем текст собирается по порядку страниц.
+    """
+    (workdir / "problems").mkdir(parents=True, exist_ok=True)
+    pending = manifest.at_stage("downloaded")
+    if not pending:
+        return
+
+    pages: Dict[str, Dict[int, str]] = {source_id: {} for source_id in pending}
+    failed: Dict[str, str] = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        counts = {}
+        for source_id, future in [
+            (source_id, pool.submit(_page_count, manifest.data["sources"][source_id]["pdf"]))
+            for source_id in pending
+        ]:
+            try:
+                counts[source_id] = future.result()
+            except Exception as e:
+                failed[source_id] = f"extract: {e}"
+
+        futures = {}
+        for source_id, count in counts.items():
+            path = manifest.data["sources"][source_id]["pdf"]
+            for start in range(0, count, pages_per_task):
+                end = min(start + pages_per_task, count)
+                futures[pool.submit(_extract_pages, path, start, end)] = (source_id, start)
+        for future in as_completed(futures):
+            source_id, start = futures[future]
+            try:
+                pages[source_id][start] = future.result()
+            except Exception as e:
+                failed[source_id] = f"extract: {e}"
+
+    for source_id in pending:
+        if source_id in failed:
+            logger.error(f"❌ {source_id}: {failed[source_id]}")
+            manifest.update(source_id, error=failed[source_id])
+            continue
+        text = clean_text("\n".join(pages[source_id][start] for start in sorted(pages[source_id])))
+        problems = split_into_problems(text)
+        path = problems_path(workdir, source_id)
+        with open(path, "w", encoding="utf-8") as f:
+            for number, content in problems:
+                f.write(json.dumps({"number": number, "text": content}, ensure_ascii=False) + "\n")
+        manifest.update(source_id, stage="extracted", problems=str(path), problem_count=len(problems), error=None)
+        logger.info(f"🔍 {source_id}: {len(problems)} problems")
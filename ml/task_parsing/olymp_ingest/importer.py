@@ -0,0 +1,121 @@
+import csv
+import json
+import logging
+from pathlib import Path
+from typing import Iterator, List
+
+import asyncpg
+
+from .manifest import Manifest
+
+logger = logging.getLogger(__name__)
+
+CSV_COLUMNS = [
+    "subject", "profile", "grade", "hardness",
+    "task_text", "task_answer", "task_solution", "source_pdf", "has_answer",
+]
+
+STAGING_COLUMNS = ["question", "answer", "solution", "difficulty", "tags", "requires_ai_check"]
+
+# Задачи без привязки к юниту - общий пул (PVP, подборки). Повторы нормализованного
+# условия отбрасываются и внутри загрузки, и относительно уже существующих задач;
+# смысловые дубликаты размечает фоновая задача бэкенда (см. EMBED_JOB_SQL).
+MERGE_SQL = """
+    INSERT INTO tasks (type, content, validation, difficulty, explanation, tags, requires_ai_check, file_upload_allowed)
+    SELECT 'quiz', jsonb_build_object('question', s.question), jsonb_build_object('correct_answer', s.answer),
+           s.difficulty, s.solution, s.tags, s.requires_ai_check, false
+    FROM (
+        SELECT DISTINCT ON (norm) *
+        FROM (
+            SELECT *, lower(regexp_replace(trim(question), '\\s+', ' ', 'g')) AS norm
+            FROM ingest_tasks
+        ) n
+        ORDER BY norm
+    ) s
+    WHERE NOT EXISTS (
+        SELECT 1 FROM tasks t
+        WHERE lower(regexp_replace(trim(t.content->>'question'), '\\s+', ' ', 'g')) = s.norm
+    )
+"""
+
+# Задача для очереди бэкенда (background_jobs): посчитать эмбеддинги задач и затем
+# запустить dedup_tasks. Воркеры бэкенда подхватят ее сами, отдельный вызов API не нужен.
+EMBED_JOB_SQL = """
+    INSERT INTO background_jobs (type, status, payload, progress, retry_count, max_retries, queue_name)
+    VALUES ('embed_content', 'pending', $1::jsonb, 0, 0, 3, 'default')
+"""
+EMBED_JOB_PAYLOAD = {"kinds": ["task"], "force": False, "then": "dedup_tasks"}
+
+
+def iter_rows(manifest: Manifest, stage: str = "parsed") -> Iterator[dict]:
+    for source_id in manifest.at_stage(stage):
+        path = manifest.data["sources"][source_id].get("parsed")
+        if not path:
+            continue
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+
+def export_csv(manifest: Manifest, path: Path) -> int:
+    """tasks.csv в формате ноутбука (для ручной проверки и старых скриптов)"""
+    count = 0
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS, quoting=csv.QUOTE_NONNUMERIC)
+        writer.writeheader()
+        for stage in ("parsed", "imported"):
+            for row in iter_rows(manifest, stage):
+                writer.writerow(row)
+                count += 1
+    return count
+
+
+def staging_record(row: dict) -> tuple:
+    hardness = row["hardness"]
+    tags = [row["subject"], f"{row['grade']} класс", row["source_pdf"]]
+    return (
+        row["task_text"],
+        row["task_answer"] if row["has_answer"] else "",
+        None if row["task_solution"] == "Нет" else row["task_solution"],
+        hardness if isinstance(hardness, int) else None,
+        tags,
+        not row["has_answer"],
+    )
+
+
+async def import_all(manifest: Manifest, dsn: str) -> int:
+    """Стадия import: parsed -> imported.
+
+    Все строки одной загрузкой COPY уходят во временную таблицу, затем одним
+    INSERT ... SELECT переносятся в tasks - в одной транзакции, так что при
+    ошибке в БД не остается половины загрузки. Если задачи добавились, в той же
+    транзакции ставится задача бэкенда на эмбеддинги и поиск дубликатов.
+    """
+    pending: List[str] = manifest.at_stage("parsed")
+    if not pending:
+        return 0
+    records = [staging_record(row) for row in iter_rows(manifest)]
+
+    # URL в формате SQLAlchemy (postgresql+asyncpg://) тоже подходит
+    conn = await asyncpg.connect(dsn.replace("postgresql+asyncpg://", "postgresql://"))
+    try:
+        async with conn.transaction():
+            await conn.execute("""
+                CREATE TEMP TABLE ingest_tasks (
+                    question text, answer text, solution text,
+                    difficulty integer, tags text[], requires_ai_check boolean
+                ) ON COMMIT DROP
+            """)
+            if records:
+                await conn.copy_records_to_table("ingest_tasks", records=records, columns=STAGING_COLUMNS)
+            status = await conn.execute(MERGE_SQL)
+            inserted = int(status.split()[-1])
+            if inserted:
+                await conn.execute(EMBED_JOB_SQL, json.dumps(EMBED_JOB_PAYLOAD))
+    finally:
+        await conn.close()
+
+    for source_id in pending:
+        manifest.update(source_id, stage="imported")
+    logger.info(f"💾 Imported {inserted} of {len(records)} tasks ({len(records) - inserted} already present)")
+    return inserted
@@ -0,0 +1,66 @@
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Порядок стадий: источник продолжает с той, на которой остановился
+STAGES = ["new", "downloaded", "extracted", "parsed", "imported"]
+
+
+class Manifest:
+    """Чекпоинт пайплайна: стадия и артефакты каждого источника.
+
+    Пишется атомарно (временный файл + rename) после каждого шага,
+    поэтому после падения повторный запуск продолжает с места остановки.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.data: Dict = {"sources": {}, "batch": None}
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                self.data = json.load(f)
+
+    def save(self):
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def entry(self, source) -> dict:
+        entry = self.data["sources"].setdefault(source.id, {"stage": "new"})
+        entry["source"] = source.to_dict()
+        return entry
+
+    def update(self, source_id: str, **fields):
+        self.data["sources"][source_id].update(fields)
+        self.save()
+
+    def at_stage(self, stage: str) -> List[str]:
+        """Источники, дошедшие ровно до stage и без ошибки на следующей стадии"""
+        return [
+            source_id for source_id, entry in self.data["sources"].items()
+            if entry["stage"] == stage and not entry.get("missing")
+        ]
+
+    @property
+    def batch(self) -> Optional[dict]:
+        return self.data.get("batch")
+
+    @batch.setter
+    def batch(self, value: Optional[dict]):
+        self.data["batch"] = value
+        self.save()
+
+    def summary(self) -> Dict[str, int]:
+        counts = {stage: 0 for stage in STAGES}
+        counts["missing"] = 0
+        counts["failed"] = 0
+        for entry in self.data["sources"].values():
+            if entry.get("missing"):
+                counts["missing"] += 1
+            else:
+                counts[entry["stage"]] += 1
+            if entry.get("error"):
+                counts["failed"] += 1
+        return counts
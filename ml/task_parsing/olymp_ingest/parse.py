@@ -0,0 +1,220 @@
+import asyncio
+import json
+import logging
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from .extract import problems_path
+from .manifest import Manifest
+from .sources import Source
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "Qwen3-4B-Instruct-2507-Q4_K_M"
+# Короче - после отрезания критериев оценивания разбирать нечего
+MIN_PARSE_CHARS = 50
+NO = "Нет"
+
+SYSTEM_PROMPT = """Ты — эксперт по олимпиадным задачам. Раздели текст строго на ТРИ блока в указанном порядке:
+
+1. УСЛОВИЕ: Весь текст ДО первого вхождения слов "Ответ" или "Решение" (в любом регистре). Включай все данные задачи.
+2. РЕШЕНИЕ: Текст, начинающийся со слов "Решение", "Первое решение", "Второе решение" и т.д. Если таких слов нет — "Нет".
+3. ОТВЕТ: ТОЛЬКО если в тексте есть слово "Ответ" (с точкой, двоеточием или пробелом после), то первое законченное предложение после него.
+
+ФОРМАТ ВЫВОДА (обязательно соблюдать):
+- УСЛОВИЕ: [текст]
+- РЕШЕНИЕ: [текст или "Нет"]
+- ОТВЕТ: [текст или "Нет"]
+
+ПРАВИЛА:
+- НИКАКИХ пояснений, комментариев, замечаний после трёх блоков
+- НИКАКИХ дополнительных строк после блока "ОТВЕТ"
+- Если ответ состоит ТОЛЬКО из слова "Нет" — замени на "не может"
+- Если в предложенном тебе тексте нет слова Ответ, то в поле ОТВЕТ необходимо указать "Нет"."""
+
+
+def strip_grading(text: str) -> str:
+    """Отрезает критерии оценивания, идущие после решения"""
+    return re.split(
+        r'\s(?:Комментарий\.|Баллы[,.]|Замечание\.|Только ответ)',
+        text,
+        maxsplit=1,
+        flags=re.IGNORECASE,
+    )[0].strip()
+
+
+def build_request(custom_id: str, text: str, model: str) -> dict:
+    """Строка батча в формате OpenAI Batch API для гейтвея ml/llm"""
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": f"Текст для разбора:\n{text}"},
+            ],
+            "temperature": 0.0,
+            "max_tokens": 2048,
+        },
+    }
+
+
+def parse_blocks(result: str) -> Tuple[str, str, str]:
+    """Ответ модели -> (условие, ответ, решение)"""
+    if "- ОТВЕТ:" in result:
+        head, tail = result.split("- ОТВЕТ:", 1)
+        result = head + "- ОТВЕТ:" + tail.split("\n\n")[0]
+    task_match = re.search(r'УСЛОВИЕ:\s*(.*?)(?=\s*-?\s*РЕШЕНИЕ:|$)', result, re.DOTALL | re.IGNORECASE)
+    solution_match = re.search(r'РЕШЕНИЕ:\s*(.*?)(?=\s*-?\s*ОТВЕТ:|$)', result, re.DOTALL | re.IGNORECASE)
+    answer_match = re.search(
+        r'ОТВЕТ:\s*(.*?)(?=\s*-?\s*УСЛОВИЕ:|\s*-?\s*РЕШЕНИЕ:|\n\n|$)', result, re.DOTALL | re.IGNORECASE
+    )
+
+    def block(match) -> str:
+        return (match.group(1).strip() if match else NO).replace("\n", " ") or NO
+
+    return block(task_match), block(answer_match), block(solution_match)
+
+
+def task_row(source: Source, index: int, task: str, answer: str, solution: str) -> dict:
+    """Строка tasks.csv (колонки как у ноутбука) + has_answer"""
+    return {
+        "subject": source.subject,
+        "profile": source.profile,
+        "grade": source.grade,
+        "hardness": source.hardness_for(index),
+        "task_text": task,
+        "task_answer": answer,
+        "task_solution": solution,
+        "source_pdf": source.filename,
+        "has_answer": answer != NO and bool(answer),
+    }
+
+
+def sendable_problems(workdir: Path, source_id: str) -> List[Tuple[int, str]]:
+    """(номер задачи в PDF, текст без критериев) для задач, которые стоит разбирать"""
+    problems = []
+    with open(problems_path(workdir, source_id), encoding="utf-8") as f:
+        for index, line in enumerate(f):
+            text = strip_grading(json.loads(line)["text"])
+            if len(text) >= MIN_PARSE_CHARS:
+                problems.append((index, text))
+    return problems
+
+
+def parsed_path(workdir: Path, source_id: str) -> Path:
+    return workdir / "parsed" / f"{source_id}.jsonl"
+
+
+class GatewayBatch:
+    """Батч в LLM-гейтвее: загрузка, ожидание, результаты"""
+
+    def __init__(self, client: httpx.AsyncClient, poll_interval: float = 10.0):
+        self.client = client
+        self.poll_interval = poll_interval
+
+    async def submit(self, requests: List[dict]) -> str:
+        content = "\n".join(json.dumps(item, ensure_ascii=False) for item in requests).encode("utf-8")
+        response = await self.client.post("/v1/batches", files={"file": ("input.jsonl", content)})
+        response.raise_for_status()
+        return response.json()["id"]
+
+    async def wait(self, batch_id: str) -> dict:
+        while True:
+            response = await self.client.get(f"/v1/batches/{batch_id}")
+            response.raise_for_status()
+            batch = response.json()
+            counts = batch["request_counts"]
+            logger.info(
+                f"🧠 Batch {batch_id} {batch['status']}: "
+                f"{counts['completed'] + counts['failed']}/{counts['total']}"
+            )
+            if batch["status"] not in ("validating", "in_progress"):
+                return batch
+            await asyncio.sleep(self.poll_interval)
+
+    async def results(self, batch_id: str) -> Dict[str, Optional[str]]:
+        """custom_id -> текст ответа модели (None - запрос завершился ошибкой)"""
+        results: Dict[str, Optional[str]] = {}
+        for errors in (False, True):
+            response = await self.client.get(f"/v1/batches/{batch_id}/output", params={"errors": errors})
+            if response.status_code == 404:
+                continue
+            response.raise_for_status()
+            for line in response.text.splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                body = (record.get("response") or {}).get("body")
+                results[record["custom_id"]] = body["choices"][0]["message"]["content"] if body else None
+        return results
+
+
+async def parse_all(
+    manifest: Manifest,
+    sources: List[Source],
+    workdir: Path,
+    gateway_url: str,
+    model: str = DEFAULT_MODEL,
+    poll_interval: float = 10.0,
+):
+    """Стадия parse: extracted -> parsed.
+
+    Задачи всех извлеченных PDF уходят в гейтвей одним батчем: он раскладывает
+    запросы по параллельным слотам llama-server и переживает свой рестарт.
+    id батча хранится в манифесте, поэтому после падения пайплайн ждет тот же батч.
+    """
+    (workdir / "parsed").mkdir(parents=True, exist_ok=True)
+    by_id = {source.id: source for source in sources}
+
+    async with httpx.AsyncClient(base_url=gateway_url.rstrip("/"), timeout=120.0) as client:
+        gateway = GatewayBatch(client, poll_interval)
+        batch = manifest.batch
+        if batch is None:
+            requests = [
+                build_request(f"{source_id}:{index}", text, model)
+                for source_id in manifest.at_stage("extracted")
+                for index, text in sendable_problems(workdir, source_id)
+            ]
+            if not requests:
+                for source_id in manifest.at_stage("extracted"):
+                    manifest.update(source_id, stage="parsed", parsed=None, task_count=0)
+                return
+            batch_id = await gateway.submit(requests)
+            batch = {"id": batch_id, "sources": manifest.at_stage("extracted")}
+            manifest.batch = batch
+            logger.info(f"🧠 Submitted batch {batch_id}: {len(requests)} problems")
+
+        await gateway.wait(batch["id"])
+        results = await gateway.results(batch["id"])
+
+    for source_id in batch["sources"]:
+        source = by_id.get(source_id) or Source(**manifest.data["sources"][source_id]["source"])
+        rows = []
+        failed = 0
+        for index, _ in sendable_problems(workdir, source_id):
+            # Нет результата - батч отменили или он упал, не дойдя до запроса
+            result = results.get(f"{source_id}:{index}")
+            if result is None:
+                failed += 1
+                continue
+            task, answer, solution = parse_blocks(result)
+            if task != NO:
+                rows.append(task_row(source, index, task, answer, solution))
+
+        if failed:
+            # Источник останется extracted и уйдет в следующий батч целиком
+            manifest.update(source_id, error=f"parse: {failed} requests failed")
+            continue
+        path = parsed_path(workdir, source_id)
+        with open(path, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        manifest.update(source_id, stage="parsed", parsed=str(path), task_count=len(rows), error=None)
+
+    manifest.batch = None
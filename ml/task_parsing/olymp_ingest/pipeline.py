@@ -0,0 +1,55 @@
+import asyncio
+import logging
+from pathlib import Path
+from typing import List, Optional
+
+from .download import download_all
+from .extract import extract_all
+from .importer import export_csv, import_all
+from .manifest import Manifest
+from .parse import DEFAULT_MODEL, parse_all
+from .sources import Source
+
+logger = logging.getLogger(__name__)
+
+ALL_STAGES = ["download", "extract", "parse", "export", "import"]
+
+
+def run(
+    sources: List[Source],
+    workdir: Path,
+    gateway_url: str,
+    model: str = DEFAULT_MODEL,
+    dsn: Optional[str] = None,
+    stages: Optional[List[str]] = None,
+    download_concurrency: int = 8,
+    extract_workers: Optional[int] = None,
+    pages_per_task: int = 2,
+    poll_interval: float = 10.0,
+) -> dict:
+    """Прогоняет источники через стадии; уже пройденные по манифесту пропускаются"""
+    stages = stages or ALL_STAGES
+    workdir.mkdir(parents=True, exist_ok=True)
+    manifest = Manifest(workdir / "manifest.json")
+    for source in sources:
+        manifest.entry(source)
+    manifest.save()
+
+    if "download" in stages:
+        asyncio.run(download_all(manifest, sources, workdir, concurrency=download_concurrency))
+    if "extract" in stages:
+        extract_all(manifest, workdir, workers=extract_workers, pages_per_task=pages_per_task)
+    if "parse" in stages:
+        asyncio.run(parse_all(manifest, sources, workdir, gateway_url, model=model, poll_interval=poll_interval))
+    if "export" in stages:
+        count = export_csv(manifest, workdir / "tasks.csv")
+        logger.info(f"📄 {workdir / 'tasks.csv'}: {count} tasks")
+    if "import" in stages:
+        if dsn:
+            asyncio.run(import_all(manifest, dsn))
+        else:
+            logger.warning("No --dsn given, import stage skipped")
+
+    summary = manifest.summary()
+    logger.info(f"✅ Sources by stage: {summary}")
+    return summary
@@ -0,0 +1,74 @@
+import hashlib
+import json
+from dataclasses import asdict, dataclass, field
+from typing import List
+
+# Сложность n-й задачи варианта (последняя - для всех задач дальше)
+DEFAULT_HARDNESS = [6, 7, 8, 9, 7, 8, 9, 10]
+
+VOS_ARCHIVE = "https://vos.olimpiada.ru/upload/files/Arhive_tasks"
+
+
+@dataclass
+class Source:
+    url: str
+    subject: str = "Математика"
+    profile: str = "Математика"
+    grade: int = 9
+    hardness: List[int] = field(default_factory=lambda: list(DEFAULT_HARDNESS))
+
+    @property
+    def id(self) -> str:
+        """Ключ источника в манифесте и имена его файлов"""
+        return hashlib.sha256(self.url.encode("utf-8")).hexdigest()[:16]
+
+    @property
+    def filename(self) -> str:
+        return self.url.rstrip("/").split("/")[-1]
+
+    def hardness_for(self, index: int):
+        if not self.hardness:
+            return "Неизвестно"
+        return self.hardness[min(index, len(self.hardness) - 1)]
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def vos_math_final_urls(grade: int, year: int) -> List[str]:
+    """Ссылки на решения заключительного этапа ВсОШ по математике (год - окончание сезона, 16..25).
+
+    Схема имен файлов в архиве менялась от года к году - как в ноутбуке.
+    """
+    prev = year - 1
+    base = f"{VOS_ARCHIVE}/20{prev}-{year}/final/math"
+    if year == 25:
+        return [f"{base}/sol-math-{grade}-final-24-25.pdf"]
+    if year in (21, 23, 24):
+        return [f"{base}/sol-math-{grade}-day{day}-final-{prev}-{year}.pdf" for day in (1, 2)]
+    if year == 22:
+        return [f"{base}/sol-math-{grade}-tur{day}-final-21-22.pdf" for day in (1, 2)]
+    if year in (18, 19):
+        return [f"{base}/72-ans-math-{grade}-final-{prev}-{year % 10}.pdf"]
+    if year == 17:
+        return [f"{base}/ans-math-{grade}-tur{day}-final-16-7.pdf" for day in (1, 2)]
+    if year == 16:
+        return [f"{base}/ans-math-{grade}-day{day}-final-15-6.pdf" for day in (1, 2)]
+    return []
+
+
+def default_sources() -> List[Source]:
+    """Архив заключительного этапа по математике, 9-11 классы, сезоны 2015/16 - 2024/25"""
+    return [
+        Source(url=url, grade=grade)
+        for grade in range(9, 12)
+        for year in range(16, 26)
+        for url in vos_math_final_urls(grade, year)
+    ]
+
+
+def load_sources(path: str) -> List[Source]:
+    """JSON-список объектов с полями Source (url обязателен)"""
+    with open(path, encoding="utf-8") as f:
+        items = json.load(f)
+    return [Source(**item) for item in items]
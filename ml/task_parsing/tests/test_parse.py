@@ -0,0 +1,30 @@
+from olymp_ingest.importer import staging_record
+from olymp_ingest.parse import NO, parse_blocks, strip_grading
+
+
+def test_three_blocks():
+    result = "- УСЛОВИЕ: Найдите x,\nесли 2x = 4.\n- РЕШЕНИЕ: Делим на 2.\n- ОТВЕТ: 2"
+    assert parse_blocks(result) == ("Найдите x, если 2x = 4.", "2", "Делим на 2.")
+
+
+def test_text_after_answer_is_dropped():
+    result = "- УСЛОВИЕ: Условие.\n- РЕШЕНИЕ: Нет\n- ОТВЕТ: 5\n\nЗамечание: модель добавила лишнее."
+    assert parse_blocks(result) == ("Условие.", "5", NO)
+
+
+def test_missing_blocks():
+    assert parse_blocks("УСЛОВИЕ: Только условие") == ("Только условие", NO, NO)
+    assert parse_blocks("") == (NO, NO, NO)
+
+
+def test_strip_grading():
+    assert strip_grading("Решение задачи. Баллы, которые ставятся: 7") == "Решение задачи."
+    assert strip_grading("Решение без критериев") == "Решение без критериев"
+
+
+def test_staging_record():
+    row = {
+        "subject": "Математика", "grade": 9, "hardness": 3, "source_pdf": "olymp.pdf",
+        "task_text": "Условие", "task_answer": NO, "task_solution": NO, "has_answer": False,
+    }
+    assert staging_record(row) == ("Условие", "", None, 3, ["Математика", "9 класс", "olymp.pdf"], True)
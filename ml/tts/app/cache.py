@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def audio_key(text: str, voice: str, rate: str) -> str:
+    """Адрес аудио в кэше: один и тот же текст тем же голосом и темпом - один файл.
+
+    Бэкенд считает ключ так же (app/services/lecture_audio.py), чтобы находить
+    уже озвученные лекции без обращения к сервису.
+    """
+    return hashlib.sha256(f"{voice}\x00{rate}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """Кэш синтезированных MP3 на диске с вытеснением давно не слушанных файлов.
+
+    Файл лежит по пути <dir>/<ключ[:2]>/<ключ>.mp3; время последнего обращения
+    хранится в mtime, поэтому порядок LRU восстанавливается после перезапуска.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 2 * 1024 ** 3):
+        self.dir = Path(cache_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, int]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        # Один синтез на ключ: одновременные запросы одного текста ждут первый.
+        # Блокировка живет, пока ее кто-то держит или ждет, - словарь не растет с числом ключей
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self._load()
+
+    def _load(self):
+        files = []
+        for path in self.dir.glob("*/*.mp3"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, path.stem, stat.st_size))
+        for _, key, size in sorted(files):
+            self.entries[key] = size
+            self.total_bytes += size
+        logger.info(f"Audio cache: {len(self.entries)} files, {self.total_bytes / 2**20:.1f} MiB")
+
+    def path_for(self, key: str) -> Path:
+        return self.dir / key[:2] / f"{key}.mp3"
+
+    def tmp_path_for(self, key: str) -> Path:
+        """Недописанный файл лежит в том же каталоге кэша, чтобы put был атомарным rename"""
+        tmp_dir = self.dir / "tmp"
+        tmp_dir.mkdir(exist_ok=True)
+        return tmp_dir / f"{key}.{os.getpid()}.{id(asyncio.current_task())}.part"
+
+    def lock(self, key: str) -> asyncio.Lock:
+        return self._locks.setdefault(key, asyncio.Lock())
+
+    def get(self, key: str) -> Optional[Path]:
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except OSError:
+            # Файл удалили снаружи - забываем запись
+            self.total_bytes -= self.entries.pop(key)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return path
+
+    def put(self, key: str, tmp_path: str) -> Path:
+        """Переносит готовый файл в кэш (rename в пределах одного диска) и вытесняет лишнее"""
+        path = self.path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, path)
+        size = path.stat().st_size
+        self.total_bytes += size - self.entries.pop(key, 0)
+        self.entries[key] = size
+        self._evict(keep=key)
+        return path
+
+    async def put_buffer(self, key: str, buffer: BinaryIO) -> Path:
+        """Сохраняет синтезированный буфер в кэш; запись на диск идет в потоке, буфер перематывается в начало"""
+        tmp_path = self.tmp_path_for(key)
+        
+        def write():
+            buffer.seek(0)
+            with open(tmp_path, "wb") as f:
+                shutil.copyfileobj(buffer, f)
+            buffer.seek(0)
+        
+        try:
+            await asyncio.to_thread(write)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        return self.put(key, tmp_path)
+
+    def _evict(self, keep: str):
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            key, size = next(iter(self.entries.items()))
+            if key == keep:
+                break
+            self.entries.pop(key)
+            self.total_bytes -= size
+            try:
+                self.path_for(key).unlink()
+            except OSError:
+                pass
+            logger.debug(f"Evicted {key} ({size} bytes)")
+
+    def stats(self) -> dict:
+        return {
+            "files": len(self.entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -1,15 +1,43 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
+import codecs
 import os
-import tempfile
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Tuple, Union
 from . import tts
+from .cache import AudioCache, audio_key
 import re
 
-app = FastAPI(title="TTS Service", version="1.0.0")
+# Локальные голоса: "имя=/models/voice.onnx,..."; запросы с этими голосами синтезируются без сети
+tts.local_engine.configure(
+    voices=tts.parse_voice_models(os.getenv("TTS_LOCAL_VOICES", "")),
+    workers=int(os.getenv("TTS_LOCAL_WORKERS", "0")) or os.cpu_count() or 1
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await tts.local_engine.warm_up()
+    yield
+    tts.local_engine.shutdown()
+
+app = FastAPI(title="TTS Service", version="1.0.0", lifespan=lifespan)
 templates = Jinja2Templates(directory="app/templates")
 
+# Кэш готового аудио: повторная озвучка того же текста не синтезируется заново
+audio_cache = AudioCache(
+    cache_dir=os.getenv("TTS_CACHE_DIR", "./cache/audio"),
+    max_bytes=int(os.getenv("TTS_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+)
+# Сколько кусков текста синтезируется одновременно при потоковой озвучке
+STREAM_CONCURRENCY = int(os.getenv("TTS_STREAM_CONCURRENCY", "3"))
+# Синтезированное аудио держится в памяти до этого размера, дальше буфер уходит на диск
+SPOOL_MAX_BYTES = int(os.getenv("TTS_SPOOL_MAX_BYTES", str(8 * 1024 ** 2)))
+# Предел размера загружаемого текстового файла
+MAX_UPLOAD_BYTES = int(os.getenv("TTS_MAX_UPLOAD_BYTES", str(1024 ** 2)))
+READ_CHUNK = 64 * 1024
+
 def validate_rate(rate: str) -> str:
     """
     Validate and format rate parameter for edge-tts
@@ -26,6 +54,74 @@ def validate_rate(rate: str) -> str:
     except (ValueError, TypeError):
         return "+0%"
 
+async def synthesize_cached(text: str, voice: str, rate: str) -> Tuple[str, Union[Path, BinaryIO], bool]:
+    """Возвращает (ключ, путь к MP3 в кэше или буфер со свежим синтезом, был ли он в кэше)"""
+    key = audio_key(text, voice, rate)
+    path = audio_cache.get(key)
+    if path:
+        return key, path, True
+    
+    async with audio_cache.lock(key):
+        # Пока ждали блокировку, этот же текст мог озвучить соседний запрос
+        if key in audio_cache.entries:
+            return key, audio_cache.path_for(key), True
+        buffer = await tts.text_to_speech(text, voice, rate, max_memory=SPOOL_MAX_BYTES)
+        try:
+            await audio_cache.put_buffer(key, buffer)
+        except BaseException:
+            buffer.close()
+            raise
+        # Ответ отдается из буфера, а не перечитывается из только что записанного файла
+        return key, buffer, False
+
+async def iter_buffer(buffer: BinaryIO) -> AsyncIterator[bytes]:
+    try:
+        while True:
+            chunk = buffer.read(READ_CHUNK)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        buffer.close()
+
+def audio_response(key: str, source: Union[Path, BinaryIO], cached: bool, filename: str):
+    headers = {
+        "Content-Disposition": f"attachment; filename={filename}",
+        "X-Audio-Key": key,
+        "X-Cache": "hit" if cached else "miss",
+        # Содержимое по ключу никогда не меняется
+        "ETag": f'"{key}"',
+        "Cache-Control": "public, max-age=31536000, immutable"
+    }
+    if isinstance(source, Path):
+        return FileResponse(path=source, media_type="audio/mpeg", filename=filename, headers=headers)
+    
+    source.seek(0, os.SEEK_END)
+    headers["Content-Length"] = str(source.tell())
+    source.seek(0)
+    return StreamingResponse(iter_buffer(source), media_type="audio/mpeg", headers=headers)
+
+async def read_upload_text(file: UploadFile) -> str:
+    """Читает загруженный файл кусками с ограничением размера и декодирует UTF-8 по ходу"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    parts = []
+    size = 0
+    try:
+        while True:
+            chunk = await file.read(READ_CHUNK)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail=f"File is larger than {MAX_UPLOAD_BYTES} bytes")
+            parts.append(decoder.decode(chunk))
+        parts.append(decoder.decode(b"", final=True))
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="File must be UTF-8 encoded")
+    finally:
+        await file.close()
+    return "".join(parts)
+
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     """Main web page"""
@@ -47,19 +143,65 @@ async def tts_from_text(
     rate = validate_rate(rate)
     
     try:
-        audio_path = await tts.text_to_speech(text, voice, rate)
-        
-        return FileResponse(
-            path=audio_path,
-            media_type="audio/mpeg",
-            filename="speech.mp3",
-            headers={"Content-Disposition": "attachment; filename=speech.mp3"}
-        )
-        
+        key, audio, cached = await synthesize_cached(text, voice, rate)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    return audio_response(key, audio, cached, "speech.mp3")
+
+@app.post("/tts/stream")
+async def tts_stream(
+    request: Request
+):
+    """Convert text to speech and stream MP3 as sentences are synthesized"""
+    data = await request.json()
+    text = data.get("text", "").strip()
+    voice = data.get("voice", "ru-RU-SvetlanaNeural")
+    rate = validate_rate(data.get("rate", "+0%"))
+    
+    if not text:
+        raise HTTPException(status_code=400, detail="Text cannot be empty")
+    
+    key = audio_key(text, voice, rate)
+    cached_path = audio_cache.get(key)
+    if cached_path:
+        return audio_response(key, cached_path, True, "speech.mp3")
+    
+    frames = stream_and_cache(key, text, voice, rate)
+    # Первый кусок ждем до ответа: ошибка синтеза в начале - это 500, а не оборванный 200
+    try:
+        first = await frames.__anext__()
+    except StopAsyncIteration:
+        raise HTTPException(status_code=500, detail="TTS produced no audio")
     except Exception as e:
-        if 'audio_path' in locals() and os.path.exists(audio_path):
-            os.unlink(audio_path)
         raise HTTPException(status_code=500, detail=str(e))
+    
+    async def body() -> AsyncIterator[bytes]:
+        yield first
+        async for frame in frames:
+            yield frame
+    
+    return StreamingResponse(
+        body(),
+        media_type="audio/mpeg",
+        headers={"X-Audio-Key": key, "X-Cache": "miss"}
+    )
+
+async def stream_and_cache(key: str, text: str, voice: str, rate: str) -> AsyncIterator[bytes]:
+    """Отдает MP3 по мере синтеза и параллельно пишет его в кэш; недослушанный поток в кэш не попадает"""
+    tmp_path = audio_cache.tmp_path_for(key)
+    complete = False
+    try:
+        with open(tmp_path, "wb") as f:
+            async for frame in tts.stream_speech(text, voice, rate, concurrency=STREAM_CONCURRENCY):
+                f.write(frame)
+                yield frame
+        complete = True
+    finally:
+        if complete and key not in audio_cache.entries:
+            audio_cache.put(key, tmp_path)
+        elif tmp_path.exists():
+            tmp_path.unlink()
 
 @app.post("/tts/file")
 async def tts_from_file(
@@ -73,28 +215,26 @@ async def tts_from_file(
     
     rate = validate_rate(rate)
     
+    text = (await read_upload_text(file)).strip()
+    if not text:
+        raise HTTPException(status_code=400, detail="File is empty")
+    
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".txt") as temp_file:
-            content = await file.read()
-            temp_file.write(content)
-            temp_file_path = temp_file.name
-        
-        audio_path = await tts.file_to_speech(temp_file_path, voice, rate)
-        
-        return FileResponse(
-            path=audio_path,
-            media_type="audio/mpeg",
-            filename=f"{Path(file.filename).stem}_speech.mp3",
-            headers={"Content-Disposition": f"attachment; filename={Path(file.filename).stem}_speech.mp3"}
-        )
-        
+        key, audio, cached = await synthesize_cached(text, voice, rate)
     except Exception as e:
-        # Cleanup temp files
-        if 'temp_file_path' in locals() and os.path.exists(temp_file_path):
-            os.unlink(temp_file_path)
-        if 'audio_path' in locals() and os.path.exists(audio_path):
-            os.unlink(audio_path)
         raise HTTPException(status_code=500, detail=str(e))
+    
+    return audio_response(key, audio, cached, f"{Path(file.filename).stem}_speech.mp3")
+
+@app.get("/tts/audio/{key}")
+async def get_cached_audio(key: str):
+    """Готовое аудио по ключу из X-Audio-Key, без синтеза"""
+    if not re.fullmatch(r"[0-9a-f]{64}", key):
+        raise HTTPException(status_code=400, detail="Invalid audio key")
+    audio_path = audio_cache.get(key)
+    if not audio_path:
+        raise HTTPException(status_code=404, detail="Audio not in cache")
+    return audio_response(key, audio_path, True, f"{key}.mp3")
 
 @app.get("/voices")
 async def list_voices():
@@ -105,8 +245,14 @@ async def list_voices():
         "de-DE-KatjaNeural", "de-DE-ConradNeural",
         "fr-FR-DeniseNeural", "fr-FR-HenriNeural"
     ]
-    return {"voices": voices}
+    return {"voices": voices + sorted(tts.local_engine.voices)}
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "tts-api"}
\ No newline at end of file
+    return {
+        "status": "healthy",
+        "service": "tts-api",
+        "cache": audio_cache.stats(),
+        "local_voices": sorted(tts.local_engine.voices),
+        "local_workers": tts.local_engine.workers
+    }
\ No newline at end of file
@@ -1,31 +1,230 @@
+import asyncio
 import edge_tts
-import tempfile
+import re
 import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterator, BinaryIO, Dict, List, Optional
 
-async def text_to_speech(text: str, voice: str = "ru-RU-DmitryNeural", rate: str = "+0%") -> str:
-    """Convert text to speech and return path to audio file"""
-    communicate = edge_tts.Communicate(
-        text=text,
-        voice=voice,
-        rate=rate
-    )
+# Конец предложения: знак препинания и пробел, либо перевод строки (абзацы, пункты списков)
+_SENTENCE_END = re.compile(r"(?<=[.!?…;:])\s+|\n+")
+
+class EdgeEngine:
+    """Edge TTS: голоса Microsoft, синтез на их стороне (нужна сеть)"""
+    name = "edge"
+    
+    async def stream(self, text: str, voice: str, rate: str) -> AsyncIterator[bytes]:
+        communicate = edge_tts.Communicate(text=text, voice=voice, rate=rate)
+        async for message in communicate.stream():
+            if message["type"] == "audio":
+                yield message["data"]
+    
+    async def write(self, text: str, voice: str, rate: str, out: BinaryIO):
+        async for data in self.stream(text, voice, rate):
+            out.write(data)
+
+# Модели, загруженные в процессе-воркере локального движка: грузятся один раз на процесс
+_worker_voices: Dict[str, object] = {}
+
+def _load_local_voice(model_path: str):
+    voice = _worker_voices.get(model_path)
+    if voice is None:
+        from piper.voice import PiperVoice
+        voice = PiperVoice.load(model_path, use_cuda=False)
+        _worker_voices[model_path] = voice
+    return voice
+
+def _init_local_worker(model_paths: List[str]):
+    for model_path in model_paths:
+        _load_local_voice(model_path)
+
+def _local_ready() -> int:
+    return os.getpid()
+
+def _local_synthesize(model_path: str, text: str, length_scale: float) -> bytes:
+    """Выполняется в процессе пула: ONNX-модель -> PCM -> MP3"""
+    import lameenc
+    voice = _load_local_voice(model_path)
+    encoder = lameenc.Encoder()
+    encoder.set_bit_rate(64)
+    encoder.set_in_sample_rate(voice.config.sample_rate)
+    encoder.set_channels(1)
+    encoder.set_quality(2)
+    mp3 = bytearray()
+    for pcm in voice.synthesize_stream_raw(text, length_scale=length_scale):
+        mp3 += encoder.encode(pcm)
+    mp3 += encoder.flush()
+    return bytes(mp3)
+
+def rate_to_length_scale(rate: str) -> float:
+    """Темп в формате edge ("+20%") -> length_scale Piper (меньше - быстрее)"""
+    try:
+        percent = int(rate.strip().rstrip("%"))
+    except ValueError:
+        return 1.0
+    return 1 / min(max(1 + percent / 100, 0.5), 2.0)
+
+def parse_voice_models(spec: str) -> Dict[str, str]:
+    """ "голос=/путь/к/model.onnx,голос2=..." -> {голос: путь} """
+    voices = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, path = item.split("=", 1)
+            voices[name.strip()] = path.strip()
+    return voices
+
+class LocalEngine:
+    """Локальный синтез на CPU (Piper, ONNX) без сети.
+
+    Модели держатся загруженными в процессах пула, поэтому запрос не платит
+    за загрузку; предложения длинного текста расходятся по процессам, и
+    пропускная способность растет с числом ядер.
+    """
+    name = "local"
+    
+    def __init__(self):
+        self.voices: Dict[str, str] = {}
+        self.workers = 1
+        self._pool: Optional[ProcessPoolExecutor] = None
+    
+    def configure(self, voices: Dict[str, str], workers: int):
+        self.voices = voices
+        self.workers = max(1, workers)
     
-    with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as temp_file:
-        temp_path = temp_file.name
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: форк процесса с работающим event loop и потоками uvicorn небезопасен
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=get_context("spawn"),
+                initializer=_init_local_worker,
+                initargs=(sorted(set(self.voices.values())),)
+            )
+        return self._pool
     
+    async def warm_up(self):
+        """Поднимает процессы пула и грузит в них модели до первого запроса"""
+        if not self.voices:
+            return
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        await asyncio.gather(*(loop.run_in_executor(pool, _local_ready) for _ in range(self.workers)))
+    
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+    
+    async def _synthesize(self, text: str, voice: str, rate: str) -> bytes:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self._get_pool(), _local_synthesize, self.voices[voice], text, rate_to_length_scale(rate)
+            )
+        except BrokenProcessPool:
+            # Воркер упал (например, OOM) - следующий запрос поднимет пул заново
+            self.shutdown()
+            raise
+    
+    async def stream(self, text: str, voice: str, rate: str) -> AsyncIterator[bytes]:
+        yield await self._synthesize(text, voice, rate)
+    
+    async def write(self, text: str, voice: str, rate: str, out: BinaryIO):
+        # Независимые MP3-куски склеиваются подряд, как в stream_speech
+        chunks = split_sentences(text, first_chars=400, max_chars=400)
+        parts = await asyncio.gather(*(self._synthesize(chunk, voice, rate) for chunk in chunks))
+        for part in parts:
+            out.write(part)
+
+edge_engine = EdgeEngine()
+local_engine = LocalEngine()
+
+def engine_for(voice: str):
+    """Голоса из TTS_LOCAL_VOICES синтезируются локально, остальные - через Edge"""
+    return local_engine if voice in local_engine.voices else edge_engine
+
+async def text_to_speech(text: str, voice: str = "ru-RU-DmitryNeural", rate: str = "+0%",
+                         max_memory: int = 8 * 1024 ** 2) -> SpooledTemporaryFile:
+    """Синтезирует текст в буфер: в памяти до max_memory байт, дальше - на диске.
+
+    Буфер возвращается перемотанным в начало; закрывает его вызывающий.
+    """
+    buffer = SpooledTemporaryFile(max_size=max_memory, suffix=".mp3")
     try:
-        await communicate.save(temp_path)
-        return temp_path
+        await engine_for(voice).write(text, voice, rate, buffer)
     except Exception as e:
-        if os.path.exists(temp_path):
-            os.unlink(temp_path)
+        buffer.close()
         raise RuntimeError(f"TTS generation failed: {str(e)}")
+    buffer.seek(0)
+    return buffer
 
-async def file_to_speech(file_path: str, voice: str = "ru-RU-DmitryNeural", rate: str = "+0%") -> str:
-    """Read text file and convert to speech"""
+def split_sentences(text: str, first_chars: int = 120, max_chars: int = 400) -> List[str]:
+    """Режет текст на куски по границам предложений.
+
+    Первый кусок короткий - от него зависит время до первого звука; остальные
+    набираются предложениями до max_chars, чтобы не платить за лишние запросы
+    к синтезу. Предложение длиннее лимита не режется.
+    """
+    sentences = [part.strip() for part in _SENTENCE_END.split(text) if part and part.strip()]
+    chunks: List[str] = []
+    current = ""
+    for sentence in sentences:
+        limit = first_chars if not chunks else max_chars
+        if current and len(current) + 1 + len(sentence) > limit:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+async def _synthesize_into(queue: asyncio.Queue, text: str, voice: str, rate: str):
+    """Кладет MP3-фрагменты одного куска в очередь по мере получения; None - конец куска"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            text = f.read()
-        return await text_to_speech(text, voice, rate)
+        async for data in engine_for(voice).stream(text, voice, rate):
+            await queue.put(data)
+        await queue.put(None)
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
-        raise RuntimeError(f"File processing failed: {str(e)}")
\ No newline at end of file
+        await queue.put(RuntimeError(f"TTS generation failed: {str(e)}"))
+
+async def stream_speech(text: str, voice: str = "ru-RU-DmitryNeural", rate: str = "+0%",
+                        concurrency: int = 3) -> AsyncIterator[bytes]:
+    """Синтезирует текст по кускам и отдает MP3 по порядку.
+
+    Одновременно синтезируется не больше concurrency кусков: текущий отдается
+    клиенту сразу по мере синтеза, следующие копятся в своих очередях.
+    MP3 состоит из независимых фреймов, поэтому куски просто идут подряд.
+    """
+    chunks = iter(split_sentences(text))
+    window = deque()
+    
+    def fill():
+        while len(window) < max(1, concurrency):
+            chunk = next(chunks, None)
+            if chunk is None:
+                return
+            queue = asyncio.Queue()
+            window.append((queue, asyncio.create_task(_synthesize_into(queue, chunk, voice, rate))))
+    
+    fill()
+    try:
+        while window:
+            queue, _ = window[0]
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+            window.popleft()
+            fill()
+    finally:
+        for _, task in window:
+            task.cancel()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Время до первого байта и полное время озвучки: /tts/text против /tts/stream.
+
+К тексту каждого прогона дописывается уникальная фраза, чтобы запросы
+не попадали в кэш аудио и оба пути честно синтезировали текст.
+
+Запуск при работающем сервисе:
+    python benchmarks/bench_ttfb.py --url http://localhost:8000 --file lecture.md --runs 3
+"""
+import argparse
+import http.client
+import json
+import statistics
+import time
+import uuid
+from urllib.parse import urlparse
+
+DEFAULT_TEXT = (
+    "Теорема Пифагора утверждает, что в прямоугольном треугольнике квадрат гипотенузы равен "
+    "сумме квадратов катетов. Докажем ее с помощью подобия треугольников. Опустим высоту из "
+    "вершины прямого угла на гипотенузу. Получим два треугольника, подобных исходному. "
+) * 8
+
+
+def measure(url: str, path: str, text: str, voice: str) -> tuple[float, float, int]:
+    parsed = urlparse(url)
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=600)
+    body = json.dumps({"text": text, "voice": voice}).encode("utf-8")
+    started = time.perf_counter()
+    conn.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    if response.status != 200:
+        raise RuntimeError(f"{path}: HTTP {response.status} {response.read()[:200]!r}")
+    first = response.read(1)
+    ttfb = time.perf_counter() - started
+    size = len(first) + len(response.read())
+    total = time.perf_counter() - started
+    conn.close()
+    return ttfb, total, size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--file", help="текст для озвучки (по умолчанию - встроенный абзац)")
+    parser.add_argument("--voice", default="ru-RU-SvetlanaNeural")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    text = open(args.file, encoding="utf-8").read() if args.file else DEFAULT_TEXT
+    print(f"Текст: {len(text)} символов, прогонов: {args.runs}")
+
+    for path in ("/tts/text", "/tts/stream"):
+        ttfbs, totals = [], []
+        for _ in range(args.runs):
+            ttfb, total, size = measure(args.url, path, f"{text}\nПрогон {uuid.uuid4().hex[:8]}.", args.voice)
+            ttfbs.append(ttfb)
+            totals.append(total)
+        print(
+            f"{path:12} TTFB median {statistics.median(ttfbs):6.2f}s | "
+            f"total median {statistics.median(totals):6.2f}s | {size / 1024:.0f} KiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
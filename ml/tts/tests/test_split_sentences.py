@@ -0,0 +1,24 @@
+from app.tts import split_sentences
+
+
+def test_first_chunk_is_short():
+    text = "Первое предложение. " + " ".join(f"Предложение номер {i}." for i in range(30))
+    chunks = split_sentences(text, first_chars=30, max_chars=200)
+    assert chunks[0] == "Первое предложение."
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    assert " ".join(chunks) == text.strip()
+
+
+def test_sentences_are_not_cut():
+    long_sentence = "Очень " * 50 + "длинное предложение."
+    chunks = split_sentences(f"Начало. {long_sentence} Конец.", first_chars=10, max_chars=40)
+    assert chunks == ["Начало.", long_sentence.strip(), "Конец."]
+
+
+def test_paragraphs_and_punctuation_split():
+    assert split_sentences("Раз!\n\nДва?\nТри…", first_chars=1, max_chars=1) == ["Раз!", "Два?", "Три…"]
+
+
+def test_short_text_is_one_chunk():
+    assert split_sentences("Привет. Как дела?") == ["Привет. Как дела?"]
+    assert split_sentences("   ") == []